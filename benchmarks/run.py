@@ -0,0 +1,302 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allow running as a script as well as with ``python -m benchmarks.run``
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.synthetic import make_table, make_upload, parse_scale
+from src import operations
+from src.data_handler import DataHandler
+from src.filter_engine import FilterEngine
+from src.schema import optimize_dtypes
+from src.sort_index import compute_permutation
+from src.undo_manager import UndoManager
+
+# Appended/uploaded rows as a fraction of the table
+UPLOAD_FRACTION = 0.1
+# Edits recorded by the undo benchmark
+UNDO_EDITS = 20
+# Slowdown over the baseline (median time) reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# {name: setup(df, workdir) -> {"run": callable, "rows": int, "reset": callable}}
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@case("read_csv")
+def _read_csv(df, workdir):
+    handler = DataHandler(workdir, use_cache=False)
+    handler.write_file(df, "table.csv")
+    return {"run": lambda: handler.read_file("table.csv"), "rows": len(df)}
+
+
+@case("read_cached")
+def _read_cached(df, workdir):
+    handler = DataHandler(workdir, use_cache=True)
+    handler.write_file(df, "table.csv")
+    handler.read_file("table.csv")
+    return {"run": lambda: handler.read_file("table.csv"), "rows": len(df)}
+
+
+@case("read_columnar")
+def _read_columnar(df, workdir):
+    handler = DataHandler(workdir)
+    handler.write_file(df, "table.arrow")
+    return {"run": lambda: handler.read_file("table.arrow"), "rows": len(df)}
+
+
+@case("write_csv")
+def _write_csv(df, workdir):
+    handler = DataHandler(workdir, use_cache=False)
+    return {"run": lambda: handler.write_file(df, "table.csv"), "rows": len(df)}
+
+
+@case("write_columnar")
+def _write_columnar(df, workdir):
+    handler = DataHandler(workdir)
+    return {"run": lambda: handler.write_file(df, "table.arrow"), "rows": len(df)}
+
+
+@case("append_csv")
+def _append_csv(df, workdir):
+    handler = DataHandler(workdir, use_cache=False)
+    upload = make_upload(df, max(1, int(len(df) * UPLOAD_FRACTION))).drop(columns=["source"])
+    upload["discount"] = np.nan
+    upload = upload[list(df.columns)]
+    return {
+        "run": lambda: handler.append_data(upload, "table.csv"),
+        "rows": len(upload),
+        "reset": lambda: handler.write_file(df, "table.csv"),
+    }
+
+
+@case("filter")
+def _filter(df, workdir):
+    filters = {"category": ["Electronics", "Books", "Toys"], "price": (20.0, 150.0)}
+    return {"run": lambda: FilterEngine.compile_mask(df, filters), "rows": len(df)}
+
+
+@case("sort")
+def _sort(df, workdir):
+    keys = [("category", True), ("price", False)]
+    return {"run": lambda: compute_permutation(df, keys), "rows": len(df)}
+
+
+@case("upload_align")
+def _upload_align(df, workdir):
+    upload = make_upload(df, max(1, int(len(df) * UPLOAD_FRACTION)))
+    path = os.path.join(workdir, "upload.csv")
+    upload.to_csv(path, index=False)
+    return {"run": lambda: operations.append_file(df, path, "align"), "rows": len(upload)}
+
+
+@case("undo_growth")
+def _undo_growth(df, workdir):
+    def run():
+        undo = UndoManager(max_bytes=2 ** 62, max_entries=UNDO_EDITS)
+        table = df
+        for i in range(UNDO_EDITS):
+            step = i % 4
+            if step == 0:
+                table, delta = operations.sort_rows(table, [("price", i % 8 == 0)])
+            elif step == 1:
+                keep = np.ones(len(table), dtype=bool)
+                keep[::100] = False
+                table, delta = operations.delete_rows(table, keep)
+            elif step == 2:
+                table, delta = operations.add_column(table, f"note_{i}")
+            else:
+                table, delta = operations.drop_columns(table, [f"note_{i - 1}"])
+            undo.record("table", delta)
+        return {"undo_mb": undo.memory_usage() / 1024 / 1024,
+                "table_mb": df.memory_usage(index=True, deep=False).sum() / 1024 / 1024}
+    return {"run": run, "rows": len(df)}
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name: str, rows: int, extra_columns: int, optimize: bool, repeat: int) -> dict:
+    """
+    Build the table, set up one case and time it ``repeat`` times
+    """
+    workdir = tempfile.mkdtemp(prefix="table-bench-")
+    try:
+        # DataHandler reports every read and write on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = make_table(rows, extra_columns)
+            if optimize:
+                df, _ = optimize_dtypes(df)
+            bench = CASES[name](df, workdir)
+            setup_rss = peak_rss_mb()
+            times, extra = [], {}
+            for _ in range(repeat):
+                if "reset" in bench:
+                    bench["reset"]()
+                gc.collect()
+                started = time.perf_counter()
+                result = bench["run"]()
+                times.append(time.perf_counter() - started)
+                if isinstance(result, dict):
+                    extra = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    median = statistics.median(times)
+    return {
+        "case": name,
+        "rows": rows,
+        "extra_columns": extra_columns,
+        "optimize": optimize,
+        "processed_rows": bench["rows"],
+        "best_s": min(times),
+        "median_s": median,
+        "rows_per_s": bench["rows"] / median if median > 0 else None,
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def run_isolated(*args) -> dict:
+    """
+    ``run_case`` in a fresh process, so peak RSS belongs to that case alone
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_case, *args).result()
+
+
+def result_key(result: dict) -> tuple:
+    return result["case"], result["rows"], result["extra_columns"], result["optimize"]
+
+
+def format_mb(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.0f}"
+
+
+def report(results: List[dict], baseline: Optional[Dict[tuple, dict]] = None,
+           threshold: float = REGRESSION_THRESHOLD) -> List[dict]:
+    """
+    Print a results table, comparing with ``baseline`` when given; returns
+    the results slower than the baseline by more than ``threshold``
+    """
+    header = f"{'case':<16}{'rows':>12}{'best s':>10}{'median s':>10}{'rows/s':>14}{'peak MB':>9}"
+    if baseline is not None:
+        header += f"{'vs base':>10}"
+    print(header)
+    regressions = []
+    for result in results:
+        line = (f"{result['case']:<16}{result['rows']:>12,}{result['best_s']:>10.3f}{result['median_s']:>10.3f}"
+                f"{result['rows_per_s'] or 0:>14,.0f}{format_mb(result['peak_rss_mb']):>9}")
+        if baseline is not None:
+            base = baseline.get(result_key(result))
+            if base is None:
+                line += f"{'new':>10}"
+            else:
+                ratio = result["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+                line += f"{ratio:>9.2f}x"
+                if ratio > 1 + threshold:
+                    line += "  REGRESSION"
+                    regressions.append(result)
+        if "undo_mb" in result:
+            line += f"  (undo history {result['undo_mb']:.1f} MB for a {result['table_mb']:.1f} MB table)"
+        print(line)
+    return regressions
+
+
+def read_baseline(path: str) -> Dict[tuple, dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {result_key(result): result for result in json.load(f)["results"]}
+
+
+def write_results(path: str, results: List[dict]):
+    meta = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark table loading, filtering, sorting, editing and saving")
+    parser.add_argument("--scales", default="10k,100k",
+                        help="Comma-separated table sizes: 10k, 100k, 1m, 10m or row counts (default: 10k,100k)")
+    parser.add_argument("--cases", default=",".join(CASES),
+                        help=f"Comma-separated cases (default: all of {', '.join(CASES)})")
+    parser.add_argument("--extra-columns", type=int, default=0, help="Extra float columns for a wide schema")
+    parser.add_argument("--optimize", action="store_true", help="Convert tables to compact dtypes first")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (default: 3)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every case in this process (faster; peak RSS is then cumulative)")
+    parser.add_argument("--save", metavar="FILE", help="Write results as JSON, e.g. to use as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with results saved by --save")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Median slowdown reported as a regression (default: 0.10)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        scales = [parse_scale(text) for text in args.scales.split(",") if text.strip()]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        print(f"Unknown cases: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    baseline = read_baseline(args.baseline) if args.baseline else None
+
+    runner = run_case if args.in_process else run_isolated
+    results = []
+    for rows in scales:
+        for name in cases:
+            results.append(runner(name, rows, args.extra_columns, args.optimize, max(1, args.repeat)))
+            print(f"  {name} @ {rows:,} rows: {results[-1]['median_s']:.3f} s", file=sys.stderr)
+
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        write_results(args.save, results)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Rows per named scale
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+# Fixed seed so every run benchmarks the same data
+SEED = 1234
+
+_CATEGORIES = ["Electronics", "Furniture", "Clothing", "Books", "Toys", "Garden", "Sports", "Food"]
+_CITIES = [f"City {i}" for i in range(200)]
+
+
+def parse_scale(text: str) -> int:
+    """
+    Rows for a scale name (``"1m"``) or a plain row count (``"250000"``)
+    """
+    text = text.strip().lower()
+    if text in SCALES:
+        return SCALES[text]
+    try:
+        rows = int(text.replace("_", ""))
+    except ValueError:
+        raise ValueError(f"Unknown scale: {text!r} (use one of {', '.join(SCALES)} or a row count)")
+    if rows <= 0:
+        raise ValueError(f"Scale must be positive: {text!r}")
+    return rows
+
+
+def make_table(rows: int, extra_columns: int = 0, seed: int = SEED) -> pd.DataFrame:
+    """
+    Synthetic table mixing the dtypes the app sees in practice: integer ids
+    and quantities, float prices, low-cardinality text (category, city),
+    high-cardinality text (name), booleans and missing values. ``extra_columns``
+    adds float columns to make a wide schema.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "id": np.arange(rows, dtype=np.int64),
+        "name": pd.Series(rng.integers(0, max(rows // 2, 1), rows)).map("customer-{:08d}".format),
+        "category": np.array(_CATEGORIES, dtype=object)[rng.integers(0, len(_CATEGORIES), rows)],
+        "city": np.array(_CITIES, dtype=object)[rng.integers(0, len(_CITIES), rows)],
+        "quantity": rng.integers(0, 1000, rows),
+        "price": np.round(rng.gamma(2.0, 50.0, rows), 2),
+        "discount": np.where(rng.random(rows) < 0.1, np.nan, np.round(rng.random(rows) * 0.3, 2)),
+        "in_stock": rng.random(rows) < 0.8,
+    })
+    for i in range(extra_columns):
+        df[f"metric_{i}"] = rng.random(rows)
+    return df
+
+
+def make_upload(df: pd.DataFrame, rows: int, seed: int = SEED + 1) -> pd.DataFrame:
+    """
+    Rows to append to ``df`` whose columns don't quite match it: the
+    ``discount`` column is missing and a ``source`` column is added, so
+    appending them exercises column alignment
+    """
+    upload = make_table(rows, extra_columns=sum(col.startswith("metric_") for col in df.columns), seed=seed)
+    upload["id"] += len(df)
+    return upload.drop(columns=["discount"]).assign(source="upload")
@@ -17,6 +17,7 @@ def build_executable():
         '--hidden-import=pandas',
         '--hidden-import=openpyxl',
         '--hidden-import=numpy',
+        '--hidden-import=pyarrow',
         '--hidden-import=importlib.metadata',
         '--collect-all=streamlit',
         '--collect-all=altair',
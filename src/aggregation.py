@@ -0,0 +1,196 @@
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+
+from src.undo_manager import (CellChanges, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowPermutation, RowsAppended)
+
+# {label: aggregation} offered in the aggregate view
+AGGREGATIONS = {"Sum": "sum", "Mean": "mean", "Count": "count", "Min": "min", "Max": "max",
+                "Distinct count": "nunique"}
+# Aggregations that only apply to numeric columns
+NUMERIC_AGGREGATIONS = ("sum", "mean", "min", "max")
+# {column: [aggregation, ...]}
+Aggregations = Dict[str, List[str]]
+
+
+def is_numeric_column(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series)
+
+
+class GroupPartials:
+    """
+    Mergeable partial aggregates of a table grouped by ``keys``: the row
+    count of each group and, per value column, its sum, non-null count,
+    min and max (numeric columns) or non-null count (others), plus the
+    distinct (group, value) pairs for distinct counts.
+
+    Partials for rows appended to the table are computed on those rows
+    alone and merged in, so the full table is never re-aggregated.
+    Value columns are added on first use.
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        self.keys = list(keys)
+        self.rows = 0
+        self.size: Optional[pd.Series] = None
+        # {column: DataFrame of sum/count/min/max indexed by group}
+        self.stats: Dict[str, pd.DataFrame] = {}
+        # {column: unique rows of keys + column}
+        self.distinct: Dict[str, pd.DataFrame] = {}
+
+    def _groupby(self, df: pd.DataFrame, by=None):
+        return df.groupby(by if by is not None else self.keys, observed=True, dropna=False, sort=False)
+
+    def _column_stats(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        grouped = self._groupby(df)[column]
+        if is_numeric_column(df[column]):
+            return grouped.agg(["sum", "count", "min", "max"])
+        return grouped.agg(["count"])
+
+    def _distinct_pairs(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        return df[self.keys + [column]].drop_duplicates()
+
+    def ensure(self, df: pd.DataFrame, columns: Sequence[str], distinct: Sequence[str] = ()):
+        """
+        Compute the partials of ``columns`` (and distinct pairs of
+        ``distinct``) not yet held, over all of ``df``
+        """
+        if self.size is None:
+            self.size = self._groupby(df).size()
+            self.rows = len(df)
+        for column in columns:
+            if column not in self.stats:
+                self.stats[column] = self._column_stats(df, column)
+        for column in distinct:
+            if column not in self.distinct:
+                self.distinct[column] = self._distinct_pairs(df, column)
+
+    def _merge(self, frames: List[pd.DataFrame], funcs: Dict[str, str]) -> pd.DataFrame:
+        combined = pd.concat(frames)
+        levels = list(range(combined.index.nlevels))
+        return combined.groupby(level=levels, observed=True, dropna=False, sort=False).agg(funcs)
+
+    def append(self, rows: pd.DataFrame):
+        """
+        Merge in the partials of rows appended to the table
+        """
+        if self.size is None or rows.empty:
+            self.rows += len(rows)
+            return
+        size = self._groupby(rows).size()
+        self.size = self._merge([self.size.to_frame("size"), size.to_frame("size")], {"size": "sum"})["size"]
+        for column, stats in self.stats.items():
+            appended = self._column_stats(rows, column)
+            if list(appended.columns) != list(stats.columns):
+                # The column changed kind (e.g. text appended to numbers)
+                appended = self._column_stats(rows.astype({column: object}), column)
+                stats = stats[["count"]]
+                appended = appended[["count"]]
+            funcs = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+            self.stats[column] = self._merge([stats, appended], {col: funcs[col] for col in stats.columns})
+        for column, pairs in self.distinct.items():
+            self.distinct[column] = pd.concat([pairs, self._distinct_pairs(rows, column)]).drop_duplicates()
+        self.rows += len(rows)
+
+    def forget(self, columns):
+        for column in columns:
+            self.stats.pop(column, None)
+            self.distinct.pop(column, None)
+
+    def result(self, aggregations: Aggregations) -> pd.DataFrame:
+        """
+        One row per group with its row count and ``{column}_{aggregation}``
+        for every requested aggregation that applies to the column
+        """
+        result = {"rows": self.size}
+        for column, funcs in aggregations.items():
+            stats = self.stats[column]
+            for func in funcs:
+                if func == "nunique":
+                    result[f"{column}_distinct"] = self._groupby(self.distinct[column])[column].nunique()
+                elif func == "mean" and "sum" in stats:
+                    result[f"{column}_mean"] = stats["sum"] / stats["count"].where(stats["count"] > 0)
+                elif func in stats:
+                    result[f"{column}_{func}"] = stats[func]
+        return pd.DataFrame(result).reset_index()
+
+
+def aggregate(df: pd.DataFrame, keys: Sequence[str], aggregations: Aggregations) -> pd.DataFrame:
+    """
+    Group ``df`` by ``keys`` and aggregate it in one go
+    """
+    partials = GroupPartials(keys)
+    partials.ensure(df, list(aggregations),
+                    [column for column, funcs in aggregations.items() if "nunique" in funcs])
+    return partials.result(aggregations)
+
+
+class AggregationCache:
+    """
+    Group-by partials cached per table and key columns, keyed by table
+    version. Appended rows are merged into the cached partials; reordering
+    rows keeps them; edits drop only the affected columns.
+    """
+
+    def __init__(self):
+        # {table_id: {"version": version, "partials": {keys: GroupPartials}}}
+        self._entries: Dict[object, dict] = {}
+
+    def get(self, table_id, version, df: pd.DataFrame, keys: Sequence[str],
+            aggregations: Aggregations) -> pd.DataFrame:
+        """
+        Aggregates of ``df`` at ``version`` grouped by ``keys``
+        """
+        entry = self._entries.get(table_id)
+        if entry is None or entry["version"] != version:
+            entry = self._entries[table_id] = {"version": version, "partials": {}}
+        cache_key = tuple(keys)
+        partials = entry["partials"].get(cache_key)
+        if partials is None or partials.rows != len(df):
+            partials = entry["partials"][cache_key] = GroupPartials(keys)
+        partials.ensure(df, list(aggregations),
+                        [column for column, funcs in aggregations.items() if "nunique" in funcs])
+        return partials.result(aggregations)
+
+    def invalidate(self, table_id):
+        self._entries.pop(table_id, None)
+
+    def on_change(self, table_id, old_version, new_version, delta: Optional[Delta]):
+        """
+        Carry cached partials over a change where they can be updated
+        """
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if entry["version"] != old_version or delta is None or not self._update(entry["partials"], delta):
+            del self._entries[table_id]
+            return
+        entry["version"] = new_version
+
+    def _update(self, partials: dict, delta: Delta) -> bool:
+        if isinstance(delta, CompositeDelta):
+            return all(self._update(partials, inner) for inner in delta.deltas)
+        if isinstance(delta, RowPermutation):
+            return True
+        if isinstance(delta, RowsAppended):
+            for cache_key, partial in list(partials.items()):
+                needed = set(cache_key) | set(partial.stats) | set(partial.distinct)
+                if needed <= set(delta.rows.columns):
+                    partial.append(delta.rows)
+                else:
+                    del partials[cache_key]
+            return True
+        if isinstance(delta, (CellChanges, ColumnsAdded, ColumnsDropped)):
+            if isinstance(delta, CellChanges):
+                touched = set(delta.changes)
+            elif isinstance(delta, ColumnsAdded):
+                touched = set(delta.columns.columns)
+            else:
+                touched = set(delta.data.columns)
+            for cache_key, partial in list(partials.items()):
+                if touched & set(cache_key):
+                    del partials[cache_key]
+                else:
+                    partial.forget(touched)
+            return True
+        return False
@@ -0,0 +1,179 @@
+import os
+import pickle
+import struct
+import uuid
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src.undo_manager import Delta
+
+# Set to 1 to persist every change through the change log as it is made
+CHANGE_LOG_ENV = "TABLE_APP_CHANGE_LOG"
+# Directions of a logged delta
+APPLY = "apply"
+REVERT = "revert"
+# Frame of every record: payload length and CRC32 of the payload
+_FRAME = struct.Struct("<QI")
+
+
+def change_log_requested() -> bool:
+    return os.environ.get(CHANGE_LOG_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+class ChangeLog:
+    """
+    Append-only log of the changes made to one table since its file was
+    last written. The table is the file with the logged deltas replayed on
+    top, in order.
+
+    The first record is a header: the log's id, the signature of the file
+    it applies to (``source``) and the position of its first entry
+    (``start``). Every other record is an entry ``(direction, delta)``: a
+    ``Delta`` applied, or reverted by an undo. Positions count entries since
+    the log was created and carry over when compaction folds entries into
+    the file, so a reader's position stays valid.
+
+    Records are pickled, framed with their length and CRC32 and synced to
+    disk before ``append`` returns. A torn record at the end, left by a
+    crash mid-write, is detected and dropped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # (size, mtime_ns) of the file when last scanned, header, entry offsets, end of valid records
+        self._state: Optional[tuple] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _records(self, f) -> Iterator[Tuple[int, bytes]]:
+        """
+        ``(offset, payload)`` of every intact record, stopping at the first
+        torn or corrupt one
+        """
+        offset = 0
+        while True:
+            frame = f.read(_FRAME.size)
+            if len(frame) < _FRAME.size:
+                return
+            length, crc = _FRAME.unpack(frame)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield offset, payload
+            offset += _FRAME.size + length
+
+    def _scan(self) -> Tuple[Optional[dict], List[int], int]:
+        """
+        Header, offsets of the entries and end of the last intact record,
+        rescanning the file only when it changed since the last scan
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._state = None
+            return None, [], 0
+        key = (stat.st_size, stat.st_mtime_ns)
+        if self._state is None or self._state[0] != key:
+            header, offsets, end = None, [], 0
+            with open(self.path, "rb") as f:
+                for offset, payload in self._records(f):
+                    if header is None:
+                        header = pickle.loads(payload)
+                    else:
+                        offsets.append(offset)
+                    end = offset + _FRAME.size + len(payload)
+            self._state = (key, header, offsets, end)
+        return self._state[1:]
+
+    def header(self) -> Optional[dict]:
+        return self._scan()[0]
+
+    def position(self) -> int:
+        """
+        Position after the last entry
+        """
+        header, offsets, _ = self._scan()
+        return header["start"] + len(offsets) if header else 0
+
+    def entry_count(self) -> int:
+        return len(self._scan()[1])
+
+    def size(self) -> int:
+        return self._scan()[2]
+
+    def entries(self) -> List[Tuple[str, Delta]]:
+        with open(self.path, "rb") as f:
+            return [pickle.loads(payload) for _, payload in self._records(f)][1:]
+
+    def raw_entries(self, after: int) -> bytes:
+        """
+        The framed records of the entries past position ``after``
+        """
+        header, offsets, end = self._scan()
+        skip = after - header["start"]
+        if skip >= len(offsets):
+            return b""
+        with open(self.path, "rb") as f:
+            f.seek(offsets[max(skip, 0)])
+            return f.read(end - offsets[max(skip, 0)])
+
+    @staticmethod
+    def _frame(record) -> bytes:
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def create(self, source: dict, log_id: Optional[str] = None, start: int = 0, entries: bytes = b"") -> dict:
+        """
+        Replace the log with a new one for ``source`` holding ``entries``
+        (framed records from ``raw_entries``), returning its header
+        """
+        header = {"log_id": log_id or uuid.uuid4().hex, "source": source, "start": start}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(self._frame(header))
+                f.write(entries)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._state = None
+        return header
+
+    def append(self, direction: str, delta: Delta) -> int:
+        """
+        Durably add an entry and return the position after it
+        """
+        header, offsets, end = self._scan()
+        record = self._frame((direction, delta))
+        with open(self.path, "r+b") as f:
+            # Drop a torn record left by a crash before writing after it
+            f.truncate(end)
+            f.seek(end)
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        stat = os.stat(self.path)
+        self._state = ((stat.st_size, stat.st_mtime_ns), header, offsets + [end], end + len(record))
+        return header["start"] + len(offsets) + 1
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._state = None
+
+
+def replay(df: pd.DataFrame, entries: List[Tuple[str, Delta]]) -> pd.DataFrame:
+    """
+    Apply logged entries to the table they were recorded against
+    """
+    for direction, delta in entries:
+        df = delta.apply(df) if direction == APPLY else delta.revert(df)
+    return df
@@ -0,0 +1,204 @@
+import os
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.aggregation import Aggregations, GroupPartials
+from src.column_stats import ColumnStatsCache
+from src.columnar_store import ColumnarStore
+from src.filter_engine import FilterEngine, Filters
+from src.sort_index import SortKeys, compute_permutation
+
+# Size in MB of the table file above which the app queries a table from
+# disk instead of loading it; 0 keeps every table in memory
+OUT_OF_CORE_ENV = "TABLE_APP_OUT_OF_CORE_MB"
+DEFAULT_OUT_OF_CORE_MB = 1024
+# Filter, sort and aggregate results kept per table
+MAX_CACHED_RESULTS = 8
+
+
+def out_of_core_limit() -> int:
+    """
+    Bytes above which tables are opened out of core (0 = never)
+    """
+    try:
+        return int(float(os.environ.get(OUT_OF_CORE_ENV, DEFAULT_OUT_OF_CORE_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_OUT_OF_CORE_MB * 1024 * 1024
+
+
+def _plain(series: pd.Series) -> pd.Series:
+    """
+    Categorical columns as their plain values; batches differ in categories
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+
+class ChunkedTable:
+    """
+    Read-only table queried from a memory-mapped ``ColumnarStore`` one record
+    batch at a time, for tables too large to load as a DataFrame.
+
+    Scans read only the columns a query needs. Filters yield the matching
+    row positions, sorts a permutation built from per-row integer codes,
+    and aggregates are merged from per-batch ``GroupPartials``, so memory
+    grows with the number of rows times a few bytes (or with the number of
+    groups) rather than with the table. Pages are gathered from the mapped
+    parts by position. Results are cached on the table; a table whose
+    file changes is opened anew (see ``DataHandler.open_chunked``).
+    """
+
+    def __init__(self, store: ColumnarStore, signature: Optional[dict] = None):
+        self.store = store
+        self.signature = signature
+        manifest = store.read_manifest() or {"columns": [], "parts": []}
+        self.columns: List[str] = list(manifest["columns"])
+        self.num_rows = sum(part["rows"] for part in manifest["parts"])
+        self._schema: Optional[pd.DataFrame] = None
+        self._stats: Dict[str, dict] = {}
+        self._results: "OrderedDict[tuple, object]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    @property
+    def nbytes(self) -> int:
+        return self.store.nbytes
+
+    def schema(self) -> pd.DataFrame:
+        """
+        Empty DataFrame with the table's columns and dtypes
+        """
+        if self._schema is None:
+            first = next(self.store.iter_batches(), None)
+            self._schema = first.iloc[:0] if first is not None else pd.DataFrame(columns=self.columns)
+        return self._schema
+
+    def iter_chunks(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        The table as consecutive DataFrames indexed by row position
+        """
+        start = 0
+        for chunk in self.store.iter_batches(columns):
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        return self.take(np.arange(max(start, 0), min(stop, self.num_rows)))
+
+    def take(self, positions: np.ndarray) -> pd.DataFrame:
+        if not len(positions):
+            return self.schema()
+        return self.store.take(positions)
+
+    def _cached(self, key: tuple, compute):
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        result = self._results[key] = compute()
+        while len(self._results) > MAX_CACHED_RESULTS:
+            self._results.popitem(last=False)
+        return result
+
+    def column_stats(self, column: str) -> dict:
+        """
+        ``ColumnStatsCache.compute`` statistics of one column, merged over
+        the batches
+        """
+        if column not in self._stats:
+            stats = None
+            for chunk in self.iter_chunks([column]):
+                chunk_stats = ColumnStatsCache.compute(chunk[column])
+                stats = chunk_stats if stats is None else ColumnStatsCache.merge(stats, chunk_stats)
+                if stats is None:
+                    # Batches disagree on the column kind; use its schema dtype
+                    break
+            if stats is None:
+                stats = ColumnStatsCache.compute(self.schema()[column])
+            stats["dtype"] = str(self.schema()[column].dtype)
+            self._stats[column] = stats
+        return self._stats[column]
+
+    def filter_positions(self, filters: Filters) -> Optional[np.ndarray]:
+        """
+        Positions of the rows matching every predicate; None when nothing
+        filters
+        """
+        active = {col: condition for col, condition in filters.items()
+                  if condition is not None and (isinstance(condition, tuple) or len(condition))}
+        if not active:
+            return None
+
+        def compute():
+            matches = []
+            for chunk in self.iter_chunks(list(active)):
+                mask = FilterEngine.compile_mask(chunk, active)
+                matches.append(chunk.index.to_numpy()[mask])
+            return np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+
+        return self._cached(("filter", repr(sorted(active.items(), key=lambda item: str(item[0])))), compute)
+
+    def _sorted_uniques(self, column: str) -> pd.Index:
+        values = [_plain(chunk[column]).dropna().unique() for chunk in self.iter_chunks([column])]
+        if not values:
+            return pd.Index([], dtype=object)
+        uniques = pd.Index(pd.unique(np.concatenate(values)) if len(values) > 1 else values[0])
+        try:
+            return uniques.sort_values()
+        except TypeError:
+            # Mixed types can't be ordered directly; order them as text
+            return uniques[np.argsort(uniques.astype(str), kind="stable")]
+
+    def sort_permutation(self, keys: SortKeys) -> np.ndarray:
+        """
+        Stable permutation sorting the table by ``keys``. Each key column's
+        distinct values are collected and sorted first; rows are then encoded
+        batch by batch into one int64 code (as ``composite_codes`` does) and
+        argsorted. Key spaces too large for one code fall back to sorting the
+        key columns alone in memory.
+        """
+        def compute():
+            uniques = {col: self._sorted_uniques(col) for col, _ in keys}
+            span_total = 1
+            for col, _ in keys:
+                span_total *= len(uniques[col]) + 1
+            if span_total > 2 ** 62:
+                return compute_permutation(self.store.read([col for col, _ in keys]), keys)
+            composite = np.zeros(self.num_rows, dtype=np.int64)
+            for chunk in self.iter_chunks([col for col, _ in keys]):
+                if chunk.empty:
+                    continue
+                codes = np.zeros(len(chunk), dtype=np.int64)
+                for col, ascending in keys:
+                    n = len(uniques[col])
+                    col_codes = uniques[col].get_indexer(_plain(chunk[col])).astype(np.int64)
+                    col_codes = np.where(col_codes < 0, n, col_codes if ascending else n - 1 - col_codes)
+                    codes = codes * (n + 1) + col_codes
+                composite[chunk.index[0]:chunk.index[0] + len(chunk)] = codes
+            return np.argsort(composite, kind="stable")
+
+        return self._cached(("sort", tuple(keys)), compute)
+
+    def aggregate(self, keys: Sequence[str], aggregations: Aggregations) -> pd.DataFrame:
+        """
+        ``aggregate`` over the table, merging the partials of each batch
+        """
+        def compute():
+            partials = GroupPartials(keys)
+            columns = list(dict.fromkeys(list(keys) + list(aggregations)))
+            distinct = [column for column, funcs in aggregations.items() if "nunique" in funcs]
+            for chunk in self.iter_chunks(columns):
+                if partials.size is None:
+                    partials.ensure(chunk, list(aggregations), distinct)
+                else:
+                    partials.append(chunk)
+            if partials.size is None:
+                partials.ensure(self.schema()[columns], list(aggregations), distinct)
+            return partials.result(aggregations)
+
+        return self._cached(("aggregate", tuple(keys), repr(sorted(aggregations.items()))), compute)
@@ -0,0 +1,149 @@
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+import pandas as pd
+
+# Allow running as a script as well as with ``python -m src.cli``
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import operations
+from src.column_stats import is_range_column
+from src.data_handler import DataHandler
+from src.filter_engine import FilterEngine, parse_row_ranges
+from src.workspace import Workspace
+
+
+def parse_condition(df: pd.DataFrame, text: str, is_range: bool = False):
+    """
+    Parse ``COL=V1,V2`` into ``(column, [values])`` or, with ``is_range``,
+    ``COL=LOW:HIGH`` into ``(column, (low, high))``. Values are converted to
+    the column's type.
+    """
+    column, sep, values = text.partition("=")
+    if not sep or column not in df.columns:
+        raise ValueError(f"Unknown column in condition: {text!r}")
+    if is_range:
+        low, sep, high = values.partition(":")
+        if not sep:
+            raise ValueError(f"Range must be LOW:HIGH: {text!r}")
+        low = float(low) if low.strip() else float("-inf")
+        high = float(high) if high.strip() else float("inf")
+        return column, (low, high)
+    values = values.split(",")
+    if is_range_column(df[column]):
+        values = list(pd.to_numeric(pd.Series(values), errors="raise"))
+    return column, values
+
+
+def parse_sort_key(text: str):
+    column, _, order = text.partition(":")
+    if order not in ("", "asc", "desc"):
+        raise ValueError(f"Sort order must be asc or desc: {text!r}")
+    return column, order != "desc"
+
+
+def run_table(data_handler: DataHandler, filename: str, args) -> pd.DataFrame:
+    """
+    Apply the requested operations to one table, in a fixed order: append,
+    add and drop columns, keep matching rows, delete rows, sort
+    """
+    if not os.path.exists(os.path.join(data_handler.base_path, filename)):
+        raise ValueError("No such table")
+    df = data_handler.read_file(filename)
+    for source in args.append or []:
+        df, _ = operations.append_file(df, source, args.append_mode)
+    for name in args.add_column or []:
+        df, _ = operations.add_column(df, name)
+    if args.drop_column:
+        missing = [col for col in args.drop_column if col not in df.columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}")
+        df, _ = operations.drop_columns(df, args.drop_column)
+    filters = dict(parse_condition(df, text) for text in args.where or [])
+    filters.update(parse_condition(df, text, is_range=True) for text in args.range or [])
+    if filters:
+        df, _ = operations.filter_rows(df, filters)
+    if args.delete_where:
+        df, _ = operations.delete_matching(df, dict(parse_condition(df, text) for text in args.delete_where))
+    if args.delete_rows:
+        df, _ = operations.delete_rows(df, ~FilterEngine.range_mask(len(df), parse_row_ranges(args.delete_rows)))
+    if args.sort:
+        keys = [parse_sort_key(text) for text in args.sort]
+        unknown = [col for col, _ in keys if col not in df.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        df, _ = operations.sort_rows(df, keys)
+    return df
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Batch operations on the tables in the data directory")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the tables (default: data)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List the tables in the workspace")
+
+    info = commands.add_parser("info", help="Show rows, columns and memory use of tables")
+    info.add_argument("tables", nargs="*", help="Table files (default: all)")
+
+    run = commands.add_parser("run", help="Filter, sort, append and edit tables")
+    run.add_argument("tables", nargs="*", help="Table files (default: all)")
+    run.add_argument("--append", action="append", metavar="FILE", help="Append rows from a CSV/Excel file")
+    run.add_argument("--append-mode", choices=operations.APPEND_MODES, default="align",
+                     help="Match appended columns to the table (align) or add new ones (extend)")
+    run.add_argument("--add-column", action="append", metavar="NAME", help="Add an empty text column")
+    run.add_argument("--drop-column", action="append", metavar="NAME", help="Drop a column")
+    run.add_argument("--where", action="append", metavar="COL=V1,V2", help="Keep rows whose value is listed")
+    run.add_argument("--range", action="append", metavar="COL=LOW:HIGH", help="Keep rows within a range")
+    run.add_argument("--delete-where", action="append", metavar="COL=V1,V2", help="Delete rows whose value is listed")
+    run.add_argument("--delete-rows", metavar="RANGES", help="Delete row positions, e.g. '0-99,250,1000-'")
+    run.add_argument("--sort", action="append", metavar="COL[:asc|desc]", help="Sort key, in priority order")
+    output = run.add_mutually_exclusive_group()
+    output.add_argument("--output", metavar="DIR", help="Write results to DIR instead of the data directory")
+    output.add_argument("--in-place", action="store_true", help="Save results back to the tables")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    data_handler = DataHandler(args.data_dir, optimize_dtypes=True)
+    workspace = Workspace(data_handler)
+    tables = getattr(args, "tables", None) or [table["file"] for table in workspace.tables()]
+
+    if args.command == "list":
+        for table in workspace.tables():
+            print(f"{table['file']}\t{table['label']}")
+        return 0
+
+    if args.command == "info":
+        for filename, df, seconds in data_handler.read_files(tables):
+            print(f"{filename}: {len(df)} rows, {len(df.columns)} columns, "
+                  f"{df.memory_usage(index=True, deep=True).sum() / 1024 / 1024:.1f} MB (loaded in {seconds:.2f} s)")
+            for col, dtype in df.dtypes.items():
+                print(f"  {col}: {dtype}")
+        return 0
+
+    failed = 0
+    output_handler = DataHandler(args.output, use_cache=False, optimize_dtypes=True) if args.output else None
+    for filename in tables:
+        started = time.perf_counter()
+        try:
+            df = run_table(data_handler, filename, args)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"{filename}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if args.in_place or output_handler is not None:
+            target = output_handler or data_handler
+            if target.write_file(df, filename) is False:
+                failed += 1
+                continue
+        print(f"{filename}: {len(df)} rows, {len(df.columns)} columns ({time.perf_counter() - started:.2f} s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import pandas as pd
+from typing import Dict, Optional
+
+from src.undo_manager import (CellChanges, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowPermutation, RowsAppended)
+
+
+def is_range_column(series: pd.Series) -> bool:
+    """
+    Whether a column is filtered by range (numeric) rather than by value
+    """
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+class ColumnStatsCache:
+    """
+    Per-column statistics (dtype, null count, min/max, distinct values with
+    counts) cached per table and keyed by the table version.
+
+    Statistics are computed lazily per column. ``on_change`` moves the cache
+    to the next version, merging appended rows into existing statistics and
+    dropping only the columns a change touched.
+    """
+
+    def __init__(self):
+        # {table_id: {"version": version, "columns": {column: stats}}}
+        self._entries: Dict[object, dict] = {}
+
+    @staticmethod
+    def compute(series: pd.Series) -> dict:
+        """
+        Statistics for one column
+        """
+        stats = {
+            "dtype": str(series.dtype),
+            "null_count": int(series.isna().sum()),
+            "count": int(series.count()),
+            "min": None,
+            "max": None,
+            "value_counts": None,
+        }
+        if is_range_column(series):
+            if stats["count"]:
+                stats["min"] = series.min()
+                stats["max"] = series.max()
+        else:
+            value_counts = series.value_counts(dropna=True)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Count only values present, indexed by the plain values
+                value_counts = value_counts[value_counts > 0]
+                value_counts.index = value_counts.index.astype(series.cat.categories.dtype)
+            stats["value_counts"] = value_counts
+        return stats
+
+    @staticmethod
+    def merge(stats: dict, appended: dict) -> dict:
+        """
+        Combine the statistics of a column with those of rows appended to it
+        """
+        merged = dict(stats)
+        merged["null_count"] = stats["null_count"] + appended["null_count"]
+        merged["count"] = stats["count"] + appended["count"]
+        if (stats["value_counts"] is None) != (appended["value_counts"] is None):
+            return None
+        if stats["value_counts"] is not None:
+            merged["value_counts"] = stats["value_counts"].add(appended["value_counts"], fill_value=0) \
+                .astype("int64").sort_values(ascending=False, kind="stable")
+        else:
+            bounds = [value for value in (stats["min"], appended["min"]) if value is not None]
+            merged["min"] = min(bounds) if bounds else None
+            bounds = [value for value in (stats["max"], appended["max"]) if value is not None]
+            merged["max"] = max(bounds) if bounds else None
+        return merged
+
+    def get(self, table_id, version, df: pd.DataFrame, column: str) -> dict:
+        """
+        Statistics for ``df[column]`` at ``version``, computing them if needed
+        """
+        entry = self._entries.get(table_id)
+        if entry is None or entry["version"] != version:
+            entry = self._entries[table_id] = {"version": version, "columns": {}}
+        stats = entry["columns"].get(column)
+        series = df[column]
+        valid = stats is not None and stats["count"] + stats["null_count"] == len(series)
+        if valid and stats["dtype"] is None:
+            # Merged after an append: still valid if the column kind is unchanged
+            valid = (stats["value_counts"] is None) == is_range_column(series)
+            if valid:
+                stats["dtype"] = str(series.dtype)
+        elif valid:
+            valid = stats["dtype"] == str(series.dtype)
+        if not valid:
+            stats = entry["columns"][column] = self.compute(series)
+        return stats
+
+    def invalidate(self, table_id, columns=None):
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if columns is None:
+            del self._entries[table_id]
+        else:
+            for col in columns:
+                entry["columns"].pop(col, None)
+
+    def on_change(self, table_id, old_version, new_version, delta: Optional[Delta]):
+        """
+        Carry cached statistics over a change from ``old_version`` to
+        ``new_version`` where the delta allows it
+        """
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if entry["version"] != old_version or delta is None or not self._update(entry["columns"], delta):
+            del self._entries[table_id]
+            return
+        entry["version"] = new_version
+
+    def _update(self, columns: dict, delta: Delta) -> bool:
+        if isinstance(delta, CompositeDelta):
+            return all(self._update(columns, inner) for inner in delta.deltas)
+        if isinstance(delta, RowPermutation):
+            return True
+        if isinstance(delta, CellChanges):
+            for col in delta.changes:
+                columns.pop(col, None)
+            return True
+        if isinstance(delta, (ColumnsAdded, ColumnsDropped)):
+            names = delta.columns.columns if isinstance(delta, ColumnsAdded) else delta.data.columns
+            for col in names:
+                columns.pop(col, None)
+            return True
+        if isinstance(delta, RowsAppended):
+            for col, stats in list(columns.items()):
+                if col not in delta.rows.columns:
+                    columns.pop(col)
+                    continue
+                merged = self.merge(stats, self.compute(delta.rows[col]))
+                if merged is None:
+                    columns.pop(col)
+                else:
+                    # Appending may widen the dtype; re-validated on the next get()
+                    merged["dtype"] = None
+                    columns[col] = merged
+            return True
+        return False
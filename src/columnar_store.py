@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import uuid
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ColumnarStore:
+    """
+    A table stored as a directory of uncompressed Arrow IPC (Feather) parts.
+
+    Parts are memory-mapped on read, so numeric columns load without copying
+    the file contents. New rows are added as extra parts rather than by
+    rewriting existing ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST_NAME)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_manifest(directory: str, manifest: dict):
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def _write_part(directory: str, df: pd.DataFrame) -> dict:
+        name = f"part-{uuid.uuid4().hex}.feather"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, os.path.join(directory, name), compression="uncompressed")
+        return {"file": name, "rows": len(df)}
+
+    def write(self, df: pd.DataFrame, metadata: Optional[dict] = None):
+        """
+        Replace the store contents with a single part holding ``df``
+        """
+        self.write_parts([df], metadata)
+
+    def write_parts(self, chunks: Iterable[pd.DataFrame], metadata: Optional[dict] = None):
+        """
+        Replace the store contents with one part per chunk, holding only one
+        chunk in memory at a time
+        """
+        # Build the new contents beside the old ones and swap them in, so a
+        # concurrent reader never sees a half-written store
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(tmp_path)
+            columns, parts = None, []
+            for chunk in chunks:
+                if columns is None:
+                    columns = [str(col) for col in chunk.columns]
+                parts.append(self._write_part(tmp_path, chunk))
+            self._write_manifest(tmp_path, {
+                "columns": columns or [],
+                "parts": parts,
+                "metadata": metadata or {},
+            })
+            if os.path.exists(self.path):
+                shutil.rmtree(self.path)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def append(self, df: pd.DataFrame):
+        """
+        Add ``df`` as a new part; columns must match the stored schema
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            self.write(df)
+            return
+        if [str(col) for col in df.columns] != manifest["columns"]:
+            raise ValueError("Columns do not match the stored table")
+        manifest["parts"].append(self._write_part(self.path, df))
+        self._write_manifest(self.path, manifest)
+
+    def iter_parts(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield each part as a DataFrame, memory-mapping the underlying file
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return
+        for part in manifest["parts"]:
+            table = self._map_part(part)
+            if columns is not None:
+                table = table.select(columns)
+            yield table.to_pandas(split_blocks=True)
+
+    def _map_part(self, part: dict) -> pa.Table:
+        # Uncompressed parts are read zero-copy from the memory map
+        source = pa.memory_map(os.path.join(self.path, part["file"]), "r")
+        return pa.ipc.open_file(source).read_all()
+
+    def iter_batches(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield the table as DataFrames of one record batch each (at most
+        64K rows for parts written here), so only one batch of the selected
+        columns is converted at a time
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return
+        for part in manifest["parts"]:
+            source = pa.memory_map(os.path.join(self.path, part["file"]), "r")
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                yield batch.to_pandas(split_blocks=True)
+
+    def take(self, positions: np.ndarray, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Rows at ``positions`` (in that order, indexed by position), gathered
+        from the memory-mapped parts without loading whole parts
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return pd.DataFrame()
+        positions = np.asarray(positions, dtype=np.int64)
+        offsets = np.cumsum([0] + [part["rows"] for part in manifest["parts"]])
+        part_of = np.searchsorted(offsets, positions, side="right") - 1
+        pieces, order = [], []
+        for p in np.unique(part_of):
+            selected = np.flatnonzero(part_of == p)
+            table = self._map_part(manifest["parts"][p])
+            if columns is not None:
+                table = table.select(columns)
+            pieces.append(table.take(positions[selected] - offsets[p]).to_pandas(split_blocks=True))
+            order.append(selected)
+        if not pieces:
+            return pd.DataFrame(columns=columns or manifest["columns"])
+        result = pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True)
+        if len(pieces) > 1:
+            result = result.take(np.argsort(np.concatenate(order), kind="stable"))
+        result.index = positions
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes of the part files on disk
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return 0
+        return sum(os.path.getsize(os.path.join(self.path, part["file"])) for part in manifest["parts"])
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load the whole table
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return pd.DataFrame()
+        parts = list(self.iter_parts(columns))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return pd.DataFrame(columns=columns or manifest["columns"])
+        return pd.concat(parts, ignore_index=True)
+
+    @property
+    def num_rows(self) -> int:
+        manifest = self.read_manifest()
+        return sum(part["rows"] for part in manifest["parts"]) if manifest else 0
+
+    def clear(self):
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
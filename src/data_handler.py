@@ -1,50 +1,684 @@
+import numpy as np
 import pandas as pd
 import os
-from typing import List, Union
+import hashlib
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from src.change_log import APPLY, ChangeLog, replay
+from src.chunked_table import ChunkedTable
+from src.columnar_store import ColumnarStore
+from src.schema import frame_schema, optimize_dtypes, read_schema, write_schema
+from src.search_index import SearchIndex
+from src.undo_manager import Delta, RowsAppended, Snapshot
+from src.write_behind import WriteBehindWriter
+
+# Sidecar directory (inside base_path) holding binary copies of parsed tables
+CACHE_DIR = ".cache"
+# Bytes hashed from each end of a source file for the cache key
+SIGNATURE_SAMPLE_BYTES = 1024 * 1024
+# Tables stored natively as a directory of Arrow parts (see ColumnarStore)
+COLUMNAR_EXTENSION = '.arrow'
+# Rows processed per chunk when streaming appends and reporting write progress
+APPEND_CHUNK_ROWS = 100_000
+# Suffix of the search index persisted in CACHE_DIR beside a table's cache
+SEARCH_INDEX_SUFFIX = '.search'
+# Tables parsed concurrently by read_files
+MAX_LOAD_WORKERS = 4
+# Directory (inside base_path) holding the change log of each table
+CHANGE_LOG_DIR = '.changelog'
+# A change log is folded into its table file once it outgrows either limit
+COMPACT_LOG_BYTES = 64 * 1024 * 1024
+COMPACT_LOG_ENTRIES = 1000
+# DataFrame.attrs key under which read_file returns the table's log token
+LOG_TOKEN_ATTR = 'change_log'
 
 class DataHandler:
-    def __init__(self, base_path='data'):
+    def __init__(self, base_path='data', use_cache=True, write_behind=False, optimize_dtypes=False,
+                 change_log=False, out_of_core_bytes=0):
         self.base_path = base_path
+        self.use_cache = use_cache
+        self.write_behind = write_behind
+        self.optimize_dtypes = optimize_dtypes
+        self.change_log = change_log
+        # Tables whose file is larger are queried from disk (0 = never)
+        self.out_of_core_bytes = out_of_core_bytes
+        self._chunked: Dict[str, ChunkedTable] = {}
+        self._chunked_lock = threading.Lock()
+        self._writer = None
+        self._logs: Dict[str, ChangeLog] = {}
+        # Held while a table file and its change log must be seen together
+        self._log_lock = threading.RLock()
+        self._compactor = None
+        self._compactions: Dict[str, Future] = {}
         os.makedirs(base_path, exist_ok=True)
 
     def read_file(self, filename: str) -> pd.DataFrame:
         """
-        Read CSV or Excel file with robust error handling
+        Read CSV or Excel file with robust error handling.
+        Parsed tables are served from the columnar cache while it is fresh.
+        With ``optimize_dtypes`` the table is converted to compact dtypes (see
+        ``src.schema``) and the schema is recorded next to the file.
+        Changes recorded in the table's change log are replayed on top; with
+        ``change_log`` enabled the table's log token is returned in
+        ``df.attrs`` (see ``pop_log_token``).
         """
         try:
-            file_path = os.path.join(self.base_path, filename)
-            if filename.endswith('.csv'):
-                return pd.read_csv(file_path, low_memory=False)
-            elif filename.endswith(('.xls', '.xlsx')):
-                return pd.read_excel(file_path)
-            else:
-                raise ValueError("Unsupported file format")
+            if not self.change_log and not self.change_log_for(filename).exists():
+                return self._read_table(filename)
+            with self._log_lock:
+                return self._replay_log(filename, self._read_table(filename))
         except Exception as e:
             print(f"Error reading file {filename}: {e}")
             return pd.DataFrame()
 
-    def write_file(self, df: pd.DataFrame, filename: str):
+    def _read_table(self, filename: str) -> pd.DataFrame:
+        file_path = os.path.join(self.base_path, filename)
+        if filename.endswith(COLUMNAR_EXTENSION):
+            df = ColumnarStore(file_path).read()
+            return self._optimize(filename, df) if self.optimize_dtypes else df
+        if not filename.endswith(('.csv', '.xls', '.xlsx')):
+            raise ValueError("Unsupported file format")
+        if self.use_cache:
+            cached = self._read_cache(filename)
+            if cached is not None:
+                return cached
+        if filename.endswith('.csv'):
+            df = pd.read_csv(file_path, low_memory=False)
+        else:
+            df = pd.read_excel(file_path)
+        if self.optimize_dtypes:
+            df = self._optimize(filename, df)
+        if self.use_cache:
+            self._write_cache(filename, df)
+        return df
+
+    def read_files(self, filenames: List[str], max_workers: int = MAX_LOAD_WORKERS,
+                   read_func: Optional[Callable[[str], pd.DataFrame]] = None
+                   ) -> Iterator[Tuple[str, pd.DataFrame, float]]:
         """
-        Write DataFrame to CSV or Excel
+        Read several tables concurrently, yielding ``(filename, df, seconds)``
+        for each one as soon as it is loaded. ``read_func`` replaces
+        ``read_file`` as the per-table loader.
+        """
+        read_func = read_func or self.read_file
+
+        def timed_read(filename):
+            started = time.perf_counter()
+            df = read_func(filename)
+            return df, time.perf_counter() - started
+
+        if len(filenames) <= 1:
+            for filename in filenames:
+                yield (filename, *timed_read(filename))
+            return
+        # The CSV parser and Arrow reads release the GIL, so threads overlap
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(filenames)),
+                                thread_name_prefix="table-load") as pool:
+            futures = {pool.submit(timed_read, filename): filename for filename in filenames}
+            for future in as_completed(futures):
+                yield (futures[future], *future.result())
+
+    def write_file(self, df: pd.DataFrame, filename: str, columns: Optional[List[str]] = None,
+                   progress: Optional[Callable[[float], None]] = None, log_token: Optional[dict] = None) -> bool:
+        """
+        Write DataFrame to CSV or Excel, optionally in the given column order.
+        The file is written to a temporary path and renamed into place, so a
+        failed write never leaves a partial file behind. ``progress`` is called
+        with the fraction of rows written so far.
+
+        The table's change log is cleared, as the whole table is on disk.
+        With ``log_token`` (the log state ``df`` was taken at, see
+        ``pop_log_token``) only the entries up to it are dropped; changes
+        logged while the file was written stay in the log on top of it. If
+        the log was replaced by another one meanwhile, it holds newer changes
+        and the file is left as it was.
         """
         file_path = os.path.join(self.base_path, filename)
+        tmp_path = self._temp_path(file_path)
         print(f"Writing file: {file_path}")
         try:
-            if filename.endswith('.csv'):
-                df.to_csv(file_path, index=False)
-                print(f"Successfully wrote CSV file: {file_path}")
+            kind = self._encode(df, filename, tmp_path, columns, progress)
+            with self._log_lock:
+                log = self.change_log_for(filename)
+                header = self._valid_log_header(filename)
+                tail = None
+                if log_token is not None and header is not None:
+                    if header["log_id"] != log_token["log"] or log.position() < log_token["position"]:
+                        print(f"Not writing {filename}: its change log holds newer changes")
+                        self._discard(tmp_path)
+                        return False
+                    tail = log.raw_entries(log_token["position"])
+                self._replace(tmp_path, file_path)
+                print(f"Successfully wrote {kind}: {file_path}")
+                if self.optimize_dtypes:
+                    write_schema(file_path, frame_schema(df if columns is None else df[columns]))
+                if tail:
+                    log.create(self.table_signature(filename), header["log_id"], log_token["position"], tail)
+                else:
+                    log.clear()
+            return True
+        except Exception as e:
+            print(f"Error writing file {filename}: {e}")
+            self._discard(tmp_path)
+            return False
+        finally:
+            self.invalidate_cache(filename)
+
+    def _encode(self, df: pd.DataFrame, filename: str, path: str, columns: Optional[List[str]] = None,
+                progress: Optional[Callable[[float], None]] = None) -> str:
+        """
+        Write ``df`` to ``path`` in the format of ``filename``, returning the
+        kind of file written
+        """
+        if filename.endswith('.csv'):
+            if progress is None:
+                df.to_csv(path, index=False, columns=columns)
+            else:
+                self._write_csv_chunked(df, path, columns, progress)
+            return "CSV file"
+        if filename.endswith(('.xls', '.xlsx')):
+            df.to_excel(path, index=False, columns=columns)
+            return "Excel file"
+        if filename.endswith(COLUMNAR_EXTENSION):
+            ColumnarStore(path).write(df if columns is None else df[columns])
+            return "columnar table"
+        raise ValueError("Unsupported file format")
+
+    @staticmethod
+    def _temp_path(file_path: str) -> str:
+        root, ext = os.path.splitext(file_path)
+        return f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+
+    @staticmethod
+    def _replace(tmp_path: str, file_path: str):
+        """
+        Move a fully written file (or columnar directory) into place
+        """
+        if os.path.isdir(tmp_path):
+            if os.path.exists(file_path):
+                shutil.rmtree(file_path)
+            os.rename(tmp_path, file_path)
+        else:
+            os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def _discard(path: str):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _write_csv_chunked(df: pd.DataFrame, file_path: str, columns: Optional[List[str]],
+                           progress: Callable[[float], None]):
+        with open(file_path, 'w', newline='') as f:
+            df.iloc[:0].to_csv(f, index=False, columns=columns)
+            for start in range(0, len(df), APPEND_CHUNK_ROWS):
+                df.iloc[start:start + APPEND_CHUNK_ROWS].to_csv(f, header=False, index=False, columns=columns)
+                progress(min(1.0, (start + APPEND_CHUNK_ROWS) / len(df)))
+
+    def submit_write(self, df: pd.DataFrame, filename: str, columns: Optional[List[str]] = None,
+                     log_token: Optional[dict] = None, owner=None) -> Optional[int]:
+        """
+        Write DataFrame in the background when write-behind is enabled,
+        returning a job id for ``write_status``; otherwise write it now and
+        return None. ``log_token`` is passed on to ``write_file``; queued
+        writes are only coalesced with later ones from the same ``owner``.
+        """
+        if not self.write_behind:
+            self.write_file(df, filename, columns=columns, log_token=log_token)
+            return None
+        if self._writer is None:
+            self._writer = WriteBehindWriter(self.write_file)
+        return self._writer.submit(df, filename, columns, owner=owner, log_token=log_token)
+
+    def write_status(self, job_id: int) -> Optional[dict]:
+        """
+        State of a background write submitted with ``submit_write``
+        """
+        return self._writer.status(job_id) if self._writer is not None else None
+
+    def flush_writes(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for all background writes, including log compactions, to finish
+        """
+        flushed = self._writer.flush(timeout) if self._writer is not None else True
+        _, not_done = wait(list(self._compactions.values()), timeout)
+        return flushed and not not_done
+
+    def append_data(self, new_data, filename: str, chunksize: Optional[int] = None,
+                    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None):
+        """
+        Append new data to existing file.
+        ``new_data`` may be a DataFrame, an iterable of DataFrames, or a path or
+        buffer of a CSV/Excel file that is read ``chunksize`` rows at a time.
+        CSV and columnar tables only receive the new rows; Excel files are
+        rewritten in full. ``on_chunk`` sees every chunk as it is appended, so
+        derived data (e.g. ``GroupPartials``) can be updated without
+        re-reading the file. With ``change_log`` enabled, or while the table
+        has a change log, the rows are appended to the log instead.
+        """
+        file_path = os.path.join(self.base_path, filename)
+        try:
+            chunks = self.iter_chunks(new_data, chunksize)
+            if on_chunk is not None:
+                chunks = self._observe(chunks, on_chunk)
+            if self.change_log or self.change_log_for(filename).exists():
+                self._log_rows(filename, chunks)
+            elif filename.endswith('.csv'):
+                self._append_csv(chunks, file_path)
+            elif filename.endswith(COLUMNAR_EXTENSION):
+                store = ColumnarStore(file_path)
+                for chunk in chunks:
+                    columns = (store.read_manifest() or {}).get("columns") or list(chunk.columns)
+                    store.append(self.align_columns(chunk, columns))
             elif filename.endswith(('.xls', '.xlsx')):
-                df.to_excel(file_path, index=False)
-                print(f"Successfully wrote Excel file: {file_path}")
+                existing_df = self.read_file(filename)
+                combined_df = pd.concat([existing_df, *chunks], ignore_index=True)
+                self.write_file(combined_df, filename)
             else:
                 raise ValueError("Unsupported file format")
+            print(f"Successfully appended to file: {file_path}")
         except Exception as e:
-            print(f"Error writing file {filename}: {e}")
+            print(f"Error appending to file {filename}: {e}")
+        finally:
+            self.invalidate_cache(filename)
+
+    @staticmethod
+    def _observe(chunks: Iterable[pd.DataFrame], callback: Callable[[pd.DataFrame], None]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            callback(chunk)
+            yield chunk
+
+    @staticmethod
+    def iter_chunks(source, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield DataFrames from a DataFrame, an iterable of DataFrames, or a
+        CSV/Excel path or uploaded file
+        """
+        if isinstance(source, pd.DataFrame):
+            if not chunksize:
+                yield source
+                return
+            for start in range(0, len(source), chunksize):
+                yield source.iloc[start:start + chunksize]
+            return
+        if isinstance(source, str) or hasattr(source, 'read'):
+            name = source if isinstance(source, str) else getattr(source, 'name', '')
+            if name.endswith(('.xls', '.xlsx')):
+                # Excel workbooks can't be parsed incrementally
+                yield from DataHandler.iter_chunks(pd.read_excel(source), chunksize)
+            elif chunksize:
+                yield from pd.read_csv(source, chunksize=chunksize, low_memory=False)
+            else:
+                yield pd.read_csv(source, low_memory=False)
+            return
+        for chunk in source:
+            yield chunk
+
+    @staticmethod
+    def align_columns(df: pd.DataFrame, columns: List[str], fill_value=None) -> pd.DataFrame:
+        """
+        Reorder ``df`` to ``columns``, adding any missing ones filled with
+        ``fill_value``; raises if ``df`` has columns outside ``columns``
+        """
+        extra = [col for col in df.columns if col not in columns]
+        if extra:
+            raise ValueError(f"Columns not in table: {extra}")
+        if list(df.columns) == list(columns):
+            return df
+        return df.reindex(columns=columns, fill_value=fill_value)
+
+    def _append_csv(self, chunks: Iterable[pd.DataFrame], file_path: str):
+        header = None
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            header = list(pd.read_csv(file_path, nrows=0).columns)
+            with open(file_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                missing_newline = f.read(1) not in (b'\n', b'\r')
+            if missing_newline:
+                with open(file_path, 'a', newline='') as f:
+                    f.write(os.linesep)
+        for chunk in chunks:
+            if header is None:
+                chunk.to_csv(file_path, index=False)
+                header = list(chunk.columns)
+                continue
+            extra = [col for col in chunk.columns if col not in header]
+            if extra:
+                header = header + extra
+                self._widen_csv(file_path, header)
+            with open(file_path, 'a', newline='') as f:
+                self.align_columns(chunk, header).to_csv(f, header=False, index=False)
+
+    @staticmethod
+    def _widen_csv(file_path: str, columns: List[str]):
+        """
+        Rewrite a CSV with extra (empty) columns, streaming it chunk by chunk
+        """
+        root, ext = os.path.splitext(file_path)
+        tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+        with open(tmp_path, 'w', newline='') as out:
+            pd.DataFrame(columns=columns).to_csv(out, index=False)
+            for chunk in pd.read_csv(file_path, chunksize=APPEND_CHUNK_ROWS, low_memory=False):
+                chunk.reindex(columns=columns).to_csv(out, header=False, index=False)
+        os.replace(tmp_path, file_path)
+
+    def _optimize(self, filename: str, df: pd.DataFrame) -> pd.DataFrame:
+        file_path = os.path.join(self.base_path, filename)
+        recorded = read_schema(file_path)
+        df, schema = optimize_dtypes(df, recorded)
+        if schema != recorded:
+            try:
+                write_schema(file_path, schema)
+            except OSError as e:
+                print(f"Could not record schema of {filename}: {e}")
+        return df
+
+    def table_size(self, filename: str) -> int:
+        """
+        Bytes of the table file (or columnar parts) on disk
+        """
+        file_path = os.path.join(self.base_path, filename)
+        if filename.endswith(COLUMNAR_EXTENSION):
+            return ColumnarStore(file_path).nbytes
+        return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+    def is_out_of_core(self, filename: str) -> bool:
+        """
+        Whether a table is too large to load and is opened with
+        ``open_chunked`` instead. Tables with logged changes are always
+        loaded, as the log is replayed on the whole table.
+        """
+        return (bool(self.out_of_core_bytes) and self.table_size(filename) > self.out_of_core_bytes
+                and not self.change_log_for(filename).exists())
+
+    def open_chunked(self, filename: str) -> ChunkedTable:
+        """
+        The table as a ``ChunkedTable`` queried from disk. Columnar tables
+        are used in place; CSV and Excel files are first converted chunk by
+        chunk into the columnar cache. Tables are shared until their file
+        changes, along with their cached query results.
+        """
+        with self._chunked_lock:
+            signature = self.table_signature(filename)
+            table = self._chunked.get(filename)
+            if table is not None and table.signature == signature:
+                return table
+            file_path = os.path.join(self.base_path, filename)
+            if filename.endswith(COLUMNAR_EXTENSION):
+                store = ColumnarStore(file_path)
+            elif filename.endswith(('.csv', '.xls', '.xlsx')):
+                store = self.cache_store(filename)
+                manifest = store.read_manifest()
+                if manifest is None or manifest.get("metadata", {}).get("source") != signature:
+                    print(f"Converting {filename} for out-of-core queries")
+                    chunks = self.iter_chunks(file_path, APPEND_CHUNK_ROWS)
+                    if filename.endswith('.csv'):
+                        dtypes = self._csv_dtypes(file_path)
+                        chunks = (chunk.astype(dtypes) for chunk in chunks)
+                    store.write_parts(chunks, {"source": signature, "optimized": False})
+            else:
+                raise ValueError("Unsupported file format")
+            table = self._chunked[filename] = ChunkedTable(store, signature)
+            return table
+
+    @staticmethod
+    def _csv_dtypes(file_path: str) -> Dict[str, object]:
+        """
+        Dtype of every CSV column over the whole file; chunks parsed on their
+        own can disagree (e.g. integers in one, with blanks in the next)
+        """
+        dtypes = {}
+        for chunk in pd.read_csv(file_path, chunksize=APPEND_CHUNK_ROWS, low_memory=False):
+            for col, dtype in chunk.dtypes.items():
+                previous = dtypes.setdefault(col, dtype)
+                if previous != dtype:
+                    numeric = pd.api.types.is_numeric_dtype(previous) and pd.api.types.is_numeric_dtype(dtype)
+                    dtypes[col] = np.result_type(previous, dtype) if numeric else np.dtype(object)
+        return dtypes
+
+    def cache_store(self, filename: str) -> ColumnarStore:
+        """
+        Columnar sidecar cache for a source file
+        """
+        return ColumnarStore(os.path.join(self.base_path, CACHE_DIR, filename))
+
+    def invalidate_cache(self, filename: str):
+        self.cache_store(filename).clear()
+        shutil.rmtree(self.search_index_path(filename), ignore_errors=True)
 
-    def append_data(self, new_df: pd.DataFrame, filename: str):
+    def search_index_path(self, filename: str) -> str:
+        return os.path.join(self.base_path, CACHE_DIR, filename + SEARCH_INDEX_SUFFIX)
+
+    def table_signature(self, filename: str) -> dict:
         """
-        Append new data to existing file
+        Identify the current contents of a table: its part files for
+        columnar tables, ``source_signature`` otherwise
         """
-        existing_df = self.read_file(filename)
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        self.write_file(combined_df, filename)
\ No newline at end of file
+        if filename.endswith(COLUMNAR_EXTENSION):
+            manifest = ColumnarStore(os.path.join(self.base_path, filename)).read_manifest() or {}
+            return {"parts": [part["file"] for part in manifest.get("parts", [])]}
+        return self.source_signature(filename)
+
+    def read_search_index(self, filename: str) -> Optional[SearchIndex]:
+        """
+        Search index persisted for the table, if it matches the current file
+        """
+        path = self.search_index_path(filename)
+        if not os.path.exists(path):
+            return None
+        try:
+            index, metadata = SearchIndex.load(path)
+            if metadata.get("source") != self.table_signature(filename):
+                return None
+            if metadata.get("log") != self._log_marker(filename):
+                return None
+            return index
+        except Exception as e:
+            print(f"Ignoring unreadable search index for {filename}: {e}")
+            return None
+
+    def write_search_index(self, filename: str, index: SearchIndex, log_token: Optional[dict] = None):
+        """
+        Persist a search index built from the table as stored on disk, or
+        as loaded at ``log_token``
+        """
+        if log_token is None:
+            marker = self._log_marker(filename)
+        else:
+            marker = [log_token["log"], log_token["position"]] if log_token["log"] else None
+        try:
+            os.makedirs(os.path.join(self.base_path, CACHE_DIR), exist_ok=True)
+            index.save(self.search_index_path(filename), {"source": self.table_signature(filename), "log": marker})
+        except Exception as e:
+            print(f"Could not save search index for {filename}: {e}")
+
+    def change_log_for(self, filename: str) -> ChangeLog:
+        if filename not in self._logs:
+            self._logs[filename] = ChangeLog(os.path.join(self.base_path, CHANGE_LOG_DIR, filename + '.log'))
+        return self._logs[filename]
+
+    def _valid_log_header(self, filename: str) -> Optional[dict]:
+        """
+        Header of the table's change log, unless there is none or the file
+        was rewritten outside the log since it was started
+        """
+        header = self.change_log_for(filename).header()
+        if header is None or header["source"] != self.table_signature(filename):
+            return None
+        return header
+
+    def _log_marker(self, filename: str) -> Optional[list]:
+        header = self._valid_log_header(filename)
+        return [header["log_id"], self.change_log_for(filename).position()] if header else None
+
+    def _replay_log(self, filename: str, df: pd.DataFrame) -> pd.DataFrame:
+        log = self.change_log_for(filename)
+        header = self._valid_log_header(filename)
+        source = self.table_signature(filename)
+        token = {"log": None, "position": 0, "source": source}
+        if header is None and log.exists():
+            print(f"Ignoring the change log of {filename}: the file was changed outside it")
+        elif header is not None:
+            df = replay(df, log.entries())
+            token = {"log": header["log_id"], "position": log.position(), "source": source}
+        if self.change_log:
+            df.attrs[LOG_TOKEN_ATTR] = token
+        return df
+
+    @staticmethod
+    def pop_log_token(df: pd.DataFrame) -> Optional[dict]:
+        """
+        Take the log token ``read_file`` attached to a table: the change log
+        state it was loaded at, to pass to ``log_change``
+        """
+        return df.attrs.pop(LOG_TOKEN_ATTR, None)
+
+    def log_change(self, filename: str, direction: str, delta: Delta, df: pd.DataFrame,
+                   token: Optional[dict], columns: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        Durably record a change made to a loaded table (``df`` being the
+        result) in its change log. Returns the table's new log token, or None
+        if the change could not be logged.
+
+        If the log moved on since ``token`` (another session changed the
+        table, or the file was rewritten) the whole table is logged in a new
+        log instead, so the latest change wins as with whole-file saves.
+        Once the log outgrows ``COMPACT_LOG_BYTES`` or
+        ``COMPACT_LOG_ENTRIES`` it is folded into the file in the background,
+        ``columns`` giving the column order to write.
+        """
+        try:
+            with self._log_lock:
+                log = self.change_log_for(filename)
+                header = self._valid_log_header(filename)
+                source = self.table_signature(filename)
+                if token is not None and header is not None and token["log"] == header["log_id"] \
+                        and token["position"] == log.position():
+                    position = log.append(direction, delta)
+                elif token is not None and header is None and token["log"] is None and token["source"] == source:
+                    header = log.create(source)
+                    position = log.append(direction, delta)
+                else:
+                    header = log.create(source)
+                    position = log.append(APPLY, Snapshot(None, df))
+                token = {"log": header["log_id"], "position": position, "source": source}
+                if log.size() > COMPACT_LOG_BYTES or log.entry_count() > COMPACT_LOG_ENTRIES:
+                    self._schedule_compaction(filename, df, token, columns)
+            return token
+        except Exception as e:
+            print(f"Error logging change to {filename}: {e}")
+            return None
+
+    def _log_rows(self, filename: str, chunks: Iterable[pd.DataFrame]):
+        with self._log_lock:
+            log = self.change_log_for(filename)
+            if self._valid_log_header(filename) is None:
+                log.create(self.table_signature(filename))
+            for chunk in chunks:
+                log.append(APPLY, RowsAppended(chunk))
+
+    def log_status(self, filename: str) -> Optional[dict]:
+        """
+        Entries and bytes in the table's change log, if it has one
+        """
+        log = self.change_log_for(filename)
+        if self._valid_log_header(filename) is None:
+            return None
+        return {"entries": log.entry_count(), "bytes": log.size(),
+                "compacting": filename in self._compactions and not self._compactions[filename].done()}
+
+    def _schedule_compaction(self, filename: str, df: pd.DataFrame, token: dict, columns: Optional[List[str]]):
+        running = self._compactions.get(filename)
+        if running is not None and not running.done():
+            return
+        if self._compactor is None:
+            self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compaction")
+        # Under copy-on-write a shallow copy is already an immutable snapshot
+        snapshot = df.copy(deep=not pd.get_option("mode.copy_on_write"))
+        self._compactions[filename] = self._compactor.submit(self.compact_log, snapshot, filename, token, columns)
+
+    def compact_log(self, df: pd.DataFrame, filename: str, token: dict, columns: Optional[List[str]] = None) -> bool:
+        """
+        Fold the change log into a fresh table file. ``df`` is the table at
+        log position ``token``; it is written beside the file, then swapped
+        in while the log restarts with only the entries logged after it, so
+        changes keep being logged while the file is written.
+        """
+        file_path = os.path.join(self.base_path, filename)
+        tmp_path = self._temp_path(file_path)
+        try:
+            self._encode(df, filename, tmp_path, columns)
+            with self._log_lock:
+                log = self.change_log_for(filename)
+                header = self._valid_log_header(filename)
+                if header is None or header["log_id"] != token["log"] or log.position() < token["position"]:
+                    # The log was replaced (or the file rewritten) meanwhile
+                    self._discard(tmp_path)
+                    return False
+                tail = log.raw_entries(token["position"])
+                self._replace(tmp_path, file_path)
+                if self.optimize_dtypes:
+                    write_schema(file_path, frame_schema(df if columns is None else df[columns]))
+                self.invalidate_cache(filename)
+                log.create(self.table_signature(filename), header["log_id"], token["position"], tail)
+            print(f"Compacted change log of {filename}")
+            return True
+        except Exception as e:
+            print(f"Error compacting change log of {filename}: {e}")
+            self._discard(tmp_path)
+            return False
+
+    def source_signature(self, filename: str) -> dict:
+        """
+        Identify the current contents of a source file by path, mtime, size
+        and a hash of its first and last bytes
+        """
+        file_path = os.path.join(self.base_path, filename)
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(SIGNATURE_SAMPLE_BYTES))
+            if stat.st_size > SIGNATURE_SAMPLE_BYTES:
+                f.seek(max(stat.st_size - SIGNATURE_SAMPLE_BYTES, SIGNATURE_SAMPLE_BYTES))
+                digest.update(f.read())
+        return {
+            "path": os.path.abspath(file_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": digest.hexdigest(),
+        }
+
+    def _read_cache(self, filename: str) -> Optional[pd.DataFrame]:
+        store = self.cache_store(filename)
+        manifest = store.read_manifest()
+        if manifest is None:
+            return None
+        try:
+            metadata = manifest.get("metadata", {})
+            if metadata.get("source") != self.source_signature(filename):
+                return None
+            if bool(metadata.get("optimized")) != self.optimize_dtypes:
+                return None
+            df = store.read()
+            # Arrow-backed strings come back Python-backed; restore the schema
+            return self._optimize(filename, df) if self.optimize_dtypes else df
+        except Exception as e:
+            print(f"Ignoring unreadable cache for {filename}: {e}")
+            return None
+
+    def _write_cache(self, filename: str, df: pd.DataFrame):
+        try:
+            self.cache_store(filename).write(df, {"source": self.source_signature(filename),
+                                                  "optimized": self.optimize_dtypes})
+        except Exception as e:
+            # Mixed-type object columns can't always be stored as Arrow;
+            # the table is simply re-parsed next time
+            print(f"Could not cache {filename}: {e}")
+            self.invalidate_cache(filename)
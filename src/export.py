@@ -0,0 +1,156 @@
+import atexit
+import gzip
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows encoded per chunk when writing an export
+EXPORT_CHUNK_ROWS = 100_000
+
+# {format: (file extension, MIME type)}
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "CSV (zip)": (".zip", "application/zip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _export_chunks(table, columns: Optional[List[str]]) -> Iterator[pd.DataFrame]:
+    """
+    ``table`` (a DataFrame or a ``ChunkedTable``) as consecutive chunks
+    """
+    if isinstance(table, pd.DataFrame):
+        df = table if columns is None else table[columns]
+        for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+            yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+    else:
+        yield from table.iter_chunks(columns)
+
+
+def _write_csv(header: pd.DataFrame, chunks: Iterator[pd.DataFrame], f,
+               progress: Optional[Callable[[float], None]], total: int):
+    header.to_csv(f, index=False)
+    written = 0
+    for chunk in chunks:
+        chunk.to_csv(f, header=False, index=False)
+        written += len(chunk)
+        if progress is not None and total:
+            progress(min(1.0, written / total))
+
+
+def write_export(df, path: str, export_format: str, columns: Optional[List[str]] = None,
+                 progress: Optional[Callable[[float], None]] = None, name: str = "table"):
+    """
+    Write ``df`` to ``path`` in one of ``EXPORT_FORMATS``, encoding it chunk
+    by chunk so the whole export is never held in memory. ``df`` may also
+    be a ``ChunkedTable``, which is streamed from disk.
+    """
+    header = df.iloc[:0] if isinstance(df, pd.DataFrame) else df.schema()
+    if columns is not None:
+        header = header[columns]
+    chunks = _export_chunks(df, columns)
+    total = len(df)
+    if export_format == "CSV":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            _write_csv(header, chunks, f, progress, total)
+    elif export_format == "CSV (gzip)":
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            _write_csv(header, chunks, f, progress, total)
+    elif export_format == "CSV (zip)":
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"{name}.csv", "w", force_zip64=True) as member:
+                with io.TextIOWrapper(member, encoding="utf-8", newline="") as f:
+                    _write_csv(header, chunks, f, progress, total)
+    elif export_format == "Parquet":
+        # Types come from the first chunk; text columns without a value in
+        # it are typed as strings
+        first = next(chunks, header)
+        schema = pa.Schema.from_pandas(first, preserve_index=False)
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+        with pq.ParquetWriter(path, schema) as writer:
+            written = 0
+            for chunk in itertools.chain([first], chunks):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                written += len(chunk)
+                if progress is not None and total:
+                    progress(min(1.0, written / total))
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if progress is not None:
+        progress(1.0)
+
+
+class ExportCache:
+    """
+    Export files generated on request and kept per table, format and table
+    version, so an unchanged table is never encoded twice. Files live in a
+    temporary directory removed at exit.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or tempfile.mkdtemp(prefix="table-exports-")
+        os.makedirs(self.directory, exist_ok=True)
+        # {(table_id, format): {"version": version, "path": path}}
+        self._exports: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+        if directory is None:
+            atexit.register(shutil.rmtree, self.directory, True)
+
+    def get(self, table_id, version, export_format: str) -> Optional[str]:
+        """
+        Path of the export of ``table_id`` at ``version``, if already generated
+        """
+        with self._lock:
+            export = self._exports.get((table_id, export_format))
+        if export is None or export["version"] != version or not os.path.exists(export["path"]):
+            return None
+        return export["path"]
+
+    def export(self, table_id, version, df, export_format: str,
+               columns: Optional[List[str]] = None,
+               progress: Optional[Callable[[float], None]] = None) -> str:
+        """
+        Generate (or reuse) the export of ``df`` as ``table_id`` at ``version``
+        """
+        path = self.get(table_id, version, export_format)
+        if path is not None:
+            return path
+        extension, _ = EXPORT_FORMATS[export_format]
+        stem = os.path.splitext(str(table_id))[0]
+        path = os.path.join(self.directory, f"{stem}-v{version}-{uuid.uuid4().hex[:8]}{extension}")
+        try:
+            write_export(df, path, export_format, columns=columns, progress=progress, name=stem)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        with self._lock:
+            previous = self._exports.get((table_id, export_format))
+            self._exports[(table_id, export_format)] = {"version": version, "path": path}
+        if previous is not None and previous["path"] != path and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+        return path
+
+    def invalidate(self, table_id):
+        """
+        Remove every export of a table
+        """
+        with self._lock:
+            removed = [key for key in self._exports if key[0] == table_id]
+            paths = [self._exports.pop(key)["path"] for key in removed]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# {column: [allowed values]} keeps rows whose value is in the list;
+# {column: (low, high)} keeps rows whose value lies in the inclusive range
+Filters = Dict[str, Union[Sequence, Tuple[float, float]]]
+# [(first, last), ...] inclusive row positions; None leaves that end open
+RowRanges = List[Tuple[Optional[int], Optional[int]]]
+
+
+def parse_row_ranges(text: str) -> RowRanges:
+    """
+    Parse row positions such as ``"0-99, 250, 1000-"`` into inclusive ranges
+    """
+    ranges = []
+    for token in text.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        first, dash, last = token.partition("-")
+        try:
+            first = int(first) if first.strip() else None
+            last = int(last) if last.strip() else None
+        except ValueError:
+            raise ValueError(f"Invalid row range: {token!r}")
+        if not dash:
+            last = first
+        if first is None and last is None:
+            raise ValueError(f"Invalid row range: {token!r}")
+        ranges.append((first, last))
+    return ranges
+
+
+class FilterEngine:
+    """
+    Compiles column predicates into a single boolean mask.
+
+    Usable without Streamlit, e.g. from scripts and benchmarks.
+    """
+
+    @staticmethod
+    def predicate_mask(series: pd.Series, condition) -> np.ndarray:
+        """
+        Boolean mask for a single column predicate
+        """
+        if isinstance(condition, tuple) and len(condition) == 2:
+            low, high = condition
+            return series.between(low, high).to_numpy(dtype=bool, na_value=False)
+        return series.isin(list(condition)).to_numpy(dtype=bool, na_value=False)
+
+    @staticmethod
+    def compile_mask(df: pd.DataFrame, filters: Filters) -> Optional[np.ndarray]:
+        """
+        AND all active predicates into one mask; None when nothing filters
+        """
+        mask = None
+        for col, condition in filters.items():
+            if condition is None or (not isinstance(condition, tuple) and len(condition) == 0):
+                continue
+            predicate = FilterEngine.predicate_mask(df[col], condition)
+            if mask is None:
+                mask = predicate
+            else:
+                np.logical_and(mask, predicate, out=mask)
+        return mask
+
+    @staticmethod
+    def apply(df: pd.DataFrame, filters: Filters) -> pd.DataFrame:
+        """
+        Return the rows of ``df`` matching every predicate. ``df`` itself is
+        returned (not a copy) when no predicate is active or all rows match.
+        """
+        mask = FilterEngine.compile_mask(df, filters)
+        if mask is None or mask.all():
+            return df
+        return df[mask]
+
+    @staticmethod
+    def range_mask(length: int, ranges: RowRanges) -> np.ndarray:
+        """
+        Boolean mask of the row positions covered by ``ranges``
+        """
+        mask = np.zeros(length, dtype=bool)
+        for first, last in ranges:
+            start = 0 if first is None else max(first, 0)
+            stop = length if last is None else min(last + 1, length)
+            if start < stop:
+                mask[start:stop] = True
+        return mask
@@ -0,0 +1,77 @@
+import pandas as pd
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.data_handler import DataHandler
+from src.schema import cast_lossless
+
+# Rows parsed per chunk when ingesting an upload
+INGEST_CHUNK_ROWS = 50_000
+# Guards against uploads that would exhaust memory
+MAX_UPLOAD_ROWS = 5_000_000
+MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+
+class UploadLimitError(ValueError):
+    """
+    Raised when an upload exceeds the configured row or byte limit
+    """
+
+
+def read_upload_header(uploaded_file) -> List[str]:
+    """
+    Column names of an uploaded CSV/Excel file, without parsing its rows
+    """
+    if uploaded_file.name.endswith(('.xls', '.xlsx')):
+        columns = list(pd.read_excel(uploaded_file, nrows=0).columns)
+    else:
+        columns = list(pd.read_csv(uploaded_file, nrows=0).columns)
+    uploaded_file.seek(0)
+    return columns
+
+
+def coerce_column(series: pd.Series, dtype) -> pd.Series:
+    """
+    Cast an uploaded column to the table's dtype when that loses nothing;
+    otherwise return it unchanged
+    """
+    return cast_lossless(series, dtype)
+
+
+def ingest_upload(uploaded_file, columns: Optional[List[str]] = None, dtypes: Optional[Dict[str, object]] = None,
+                  fill_value=None, chunksize: int = INGEST_CHUNK_ROWS, max_rows: int = MAX_UPLOAD_ROWS,
+                  max_bytes: int = MAX_UPLOAD_BYTES,
+                  progress: Optional[Callable[[float], None]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Parse an uploaded CSV/Excel file chunk by chunk. Each chunk is aligned
+    to ``columns`` (missing ones filled with ``fill_value``, extra ones
+    dropped) and cast to ``dtypes`` where lossless. ``progress`` receives
+    the fraction of the file consumed so far.
+    """
+    size = getattr(uploaded_file, "size", None)
+    if size is not None and size > max_bytes:
+        raise UploadLimitError(f"Upload is {size / 1024 / 1024:.0f} MB; the limit is {max_bytes / 1024 / 1024:.0f} MB")
+
+    rows = 0
+    for chunk in DataHandler.iter_chunks(uploaded_file, chunksize):
+        rows += len(chunk)
+        if rows > max_rows:
+            raise UploadLimitError(f"Upload has more than {max_rows} rows")
+        if columns is not None:
+            chunk = chunk.reindex(columns=columns, fill_value=fill_value)
+        if dtypes:
+            changed = {}
+            for col in chunk.columns:
+                if col in dtypes:
+                    series = chunk[col]
+                    coerced = coerce_column(series, dtypes[col])
+                    if coerced is not series:
+                        changed[col] = coerced
+            if changed:
+                chunk = chunk.copy(deep=False)
+                for col, series in changed.items():
+                    chunk[col] = series
+        if progress is not None and size:
+            progress(min(1.0, uploaded_file.tell() / size))
+        yield chunk
+    if progress is not None:
+        progress(1.0)
@@ -0,0 +1,251 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.undo_manager import (CellChanges, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowPermutation, RowsAppended, RowsDeleted)
+
+# Key indexes kept per table
+MAX_CACHED_INDEXES = 4
+JOIN_TYPES = ("inner", "left")
+
+
+def _plain(values) -> pd.Index:
+    """
+    Distinct key values as a hashable Index of plain (non-categorical) values
+    """
+    index = pd.Index(values)
+    if isinstance(index, pd.CategoricalIndex):
+        index = pd.Index(index.astype(index.categories.dtype))
+    return index
+
+
+def _missing(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    Rows with a missing value in any key column; they never match
+    """
+    return df[list(columns)].isna().to_numpy().any(axis=1)
+
+
+def _multi_keys(df: pd.DataFrame, columns: Sequence[str]) -> pd.MultiIndex:
+    frame = df[list(columns)]
+    plain = {col: frame[col].astype(frame[col].cat.categories.dtype)
+             for col in columns if isinstance(frame[col].dtype, pd.CategoricalDtype)}
+    return pd.MultiIndex.from_frame(frame.assign(**plain) if plain else frame)
+
+
+def _factorize(df: pd.DataFrame, columns: Sequence[str]) -> Tuple[np.ndarray, pd.Index]:
+    """
+    Key code of every row (-1 for missing keys) and the distinct keys
+    """
+    if len(columns) == 1:
+        codes, uniques = pd.factorize(df[columns[0]])
+        return codes.astype(np.int64), _plain(uniques)
+    codes, uniques = _multi_keys(df, columns).factorize()
+    codes = codes.astype(np.int64)
+    codes[_missing(df, columns)] = -1
+    return codes, uniques
+
+
+def _codes_in(keys: pd.Index, df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    Position of each row's key in ``keys`` (-1 when absent or missing)
+    """
+    if len(columns) == 1:
+        series = df[columns[0]]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Hash the categories once and map the row codes through them
+            mapping = keys.get_indexer(_plain(series.cat.categories))
+            row_codes = series.cat.codes.to_numpy()
+            return np.where(row_codes >= 0, mapping.take(row_codes, mode="clip"), -1).astype(np.int64)
+        codes = keys.get_indexer(series)
+    else:
+        codes = keys.get_indexer(_multi_keys(df, columns))
+    codes = codes.astype(np.int64)
+    codes[_missing(df, columns)] = -1
+    return codes
+
+
+class KeyIndex:
+    """
+    Hash index over the key columns of one table: the distinct keys, held in
+    a pandas Index (hash lookups with ``get_indexer``), and the key code of
+    every row. The rows of each key are grouped lazily for joins.
+    """
+
+    def __init__(self, columns: Sequence[str], codes: np.ndarray, keys: pd.Index):
+        self.columns = tuple(columns)
+        self.codes = codes
+        self.keys = keys
+        self._groups: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Sequence[str]) -> "KeyIndex":
+        codes, keys = _factorize(df, list(columns))
+        return cls(columns, codes, keys)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ``(order, offsets)``: row positions grouped by key code, the rows of
+        code ``c`` being ``order[offsets[c]:offsets[c + 1]]``
+        """
+        if self._groups is None:
+            valid = self.codes >= 0
+            order = np.argsort(self.codes, kind="stable")[int((~valid).sum()):]
+            counts = np.bincount(self.codes[valid], minlength=len(self.keys))
+            offsets = np.zeros(len(self.keys) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._groups = (order, offsets)
+        return self._groups
+
+    def append(self, rows: pd.DataFrame):
+        """
+        Index rows appended to the table, adding keys not seen before
+        """
+        codes = _codes_in(self.keys, rows, self.columns)
+        unseen = (codes < 0) & ~_missing(rows, self.columns)
+        if unseen.any():
+            new_codes, new_keys = _factorize(rows.iloc[np.flatnonzero(unseen)], list(self.columns))
+            codes[unseen] = np.where(new_codes >= 0, new_codes + len(self.keys), -1)
+            self.keys = self.keys.append(new_keys)
+        self.codes = np.concatenate([self.codes, codes])
+        self._groups = None
+
+    def delete(self, positions: np.ndarray):
+        self.codes = np.delete(self.codes, positions)
+        self._groups = None
+
+    def permute(self, permutation: np.ndarray):
+        self.codes = self.codes[permutation]
+        self._groups = None
+
+
+def match_codes(probe: KeyIndex, build: KeyIndex) -> np.ndarray:
+    """
+    For each row indexed by ``probe``, the code of its key in ``build``
+    (-1 if ``build`` has no such key). Only the distinct keys are hashed.
+    """
+    if not len(probe.keys) or not len(build.keys):
+        # Every key is missing on one side, so nothing matches
+        return np.full(len(probe.codes), -1, dtype=np.int64)
+    mapping = build.keys.get_indexer(probe.keys).astype(np.int64)
+    return np.where(probe.codes >= 0, mapping.take(probe.codes, mode="clip"), -1)
+
+
+def lookup_positions(probe: KeyIndex, build: KeyIndex) -> np.ndarray:
+    """
+    For each row of the probe table, the position of the first row of the
+    build table with the same key, or -1
+    """
+    codes = match_codes(probe, build)
+    if not len(build.keys):
+        return codes
+    order, offsets = build.groups()
+    counts = np.diff(offsets)
+    first = np.full(len(build.keys), -1, dtype=np.int64)
+    present = counts > 0
+    first[present] = order[offsets[:-1][present]]
+    return np.where(codes >= 0, first.take(codes, mode="clip"), -1)
+
+
+def join_positions(probe: KeyIndex, build: KeyIndex, how: str = "inner") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row position pairs ``(probe_positions, build_positions)`` of an inner or
+    left join, in probe order. Unmatched probe rows of a left join are paired
+    with -1.
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type: {how}")
+    order, offsets = build.groups()
+    codes = match_codes(probe, build)
+    matched = codes >= 0
+    safe_codes = np.where(matched, codes, 0)
+    counts = np.where(matched, offsets.take(safe_codes + 1, mode="clip") - offsets.take(safe_codes, mode="clip"), 0)
+    emitted = np.maximum(counts, 1) if how == "left" else counts
+    probe_positions = np.repeat(np.arange(len(codes), dtype=np.int64), emitted)
+    # Position of each output row within its probe row's matches
+    within = np.arange(len(probe_positions), dtype=np.int64) - np.repeat(np.cumsum(emitted) - emitted, emitted)
+    starts = np.repeat(offsets.take(safe_codes, mode="clip"), emitted)
+    has_match = np.repeat(counts > 0, emitted)
+    build_positions = np.full(len(probe_positions), -1, dtype=np.int64)
+    if len(order):
+        build_positions[has_match] = order[(starts + within)[has_match]]
+    return probe_positions, build_positions
+
+
+class KeyIndexCache:
+    """
+    Key indexes cached per table and key columns, keyed by table version.
+    ``on_change`` updates indexes in place for appended, deleted and
+    reordered rows instead of rebuilding them.
+    """
+
+    def __init__(self):
+        # {table_id: {"version": version, "indexes": {columns: KeyIndex}}}
+        self._entries: Dict[object, dict] = {}
+
+    def get(self, table_id, version, df: pd.DataFrame, columns: List[str]) -> KeyIndex:
+        """
+        Index of ``df`` on ``columns`` at ``version``, building it if needed
+        """
+        cache_key = tuple(columns)
+        entry = self._entries.get(table_id)
+        if entry is None or entry["version"] != version:
+            entry = self._entries[table_id] = {"version": version, "indexes": {}}
+        indexes = entry["indexes"]
+        index = indexes.pop(cache_key, None)
+        if index is None or len(index) != len(df):
+            index = KeyIndex.build(df, cache_key)
+        # Most recently used last; drop the oldest beyond the limit
+        indexes[cache_key] = index
+        while len(indexes) > MAX_CACHED_INDEXES:
+            indexes.pop(next(iter(indexes)))
+        return index
+
+    def invalidate(self, table_id):
+        self._entries.pop(table_id, None)
+
+    def on_change(self, table_id, old_version, new_version, delta: Optional[Delta]):
+        """
+        Carry indexes over a change where they can be updated
+        """
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if entry["version"] != old_version or delta is None or not self._update(entry["indexes"], delta):
+            del self._entries[table_id]
+            return
+        entry["version"] = new_version
+
+    def _update(self, indexes: dict, delta: Delta) -> bool:
+        if isinstance(delta, CompositeDelta):
+            return all(self._update(indexes, inner) for inner in delta.deltas)
+        if isinstance(delta, RowsAppended):
+            for cache_key, index in list(indexes.items()):
+                if set(cache_key) <= set(delta.rows.columns):
+                    index.append(delta.rows)
+                else:
+                    del indexes[cache_key]
+            return True
+        if isinstance(delta, RowsDeleted):
+            for index in indexes.values():
+                index.delete(delta.positions)
+            return True
+        if isinstance(delta, RowPermutation):
+            for index in indexes.values():
+                index.permute(delta.permutation)
+            return True
+        if isinstance(delta, (CellChanges, ColumnsAdded, ColumnsDropped)):
+            if isinstance(delta, CellChanges):
+                touched = set(delta.changes)
+            elif isinstance(delta, ColumnsAdded):
+                touched = set(delta.columns.columns)
+            else:
+                touched = set(delta.data.columns)
+            for cache_key in [key for key in indexes if touched & set(key)]:
+                del indexes[cache_key]
+            return True
+        return False
@@ -1,15 +1,48 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import sys
 import os
 import time
+import uuid
 from datetime import datetime
 
 # Add the src directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.data_handler import DataHandler
+from src.export import EXPORT_FORMATS, ExportCache
+from src.aggregation import AggregationCache
+from src.change_log import APPLY, REVERT, change_log_requested
+from src.chunked_table import out_of_core_limit
+from src.column_stats import ColumnStatsCache
+from src.ingest import read_upload_header
+from src.join_index import KeyIndexCache, join_positions, lookup_positions
+from src import operations
+from src.profiler import METRICS_FILE_ENV, MetricsSink, RerunProfiler, profiling_requested
+from src.search_index import SEARCH_MODES, SearchIndexCache
+from src.sort_index import SortIndexCache
+from src.table_store import SharedTableStore
 from src.table_operations import TableOperations
+from src.workspace import Workspace
+from src.undo_manager import UndoManager
+
+# Memory budget shared by the undo/redo history of all tables in a session
+UNDO_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Tables kept loaded in a session besides the selected one; tables with
+# unsaved changes are never unloaded
+MAX_RESIDENT_TABLES = 3
+
+# Rows shown when previewing a lookup or join
+PREVIEW_ROWS = 50
+
+# Sessions share loaded tables; copy-on-write keeps each session's edits private
+pd.set_option("mode.copy_on_write", True)
+
+# Identifies this session to the shared table store
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Initialize session state for data persistence
 if 'table_data' not in st.session_state:
@@ -21,8 +54,90 @@ if 'table_column_order' not in st.session_state:
 if 'last_saved' not in st.session_state:
     st.session_state.last_saved = {}
 
-if 'undo_stack' not in st.session_state:
-    st.session_state.undo_stack = {}
+# Per-table change counters; a table needs saving while its version differs
+# from the version last written to disk
+if 'table_version' not in st.session_state:
+    st.session_state.table_version = {}
+
+if 'saved_version' not in st.session_state:
+    st.session_state.saved_version = {}
+
+if 'undo_manager' not in st.session_state:
+    st.session_state.undo_manager = UndoManager(max_bytes=UNDO_MEMORY_BUDGET)
+
+# Column statistics for filter widgets, keyed by table version
+if 'column_stats' not in st.session_state:
+    st.session_state.column_stats = ColumnStatsCache()
+
+# Sort permutations, keyed by table version and sort keys
+if 'sort_index' not in st.session_state:
+    st.session_state.sort_index = SortIndexCache()
+
+# Group-by partial aggregates, keyed by table version
+if 'aggregates' not in st.session_state:
+    st.session_state.aggregates = AggregationCache()
+
+# Hash indexes on join/lookup key columns, keyed by table version
+if 'key_indexes' not in st.session_state:
+    st.session_state.key_indexes = KeyIndexCache()
+
+# Trigram search indexes over text columns, keyed by table version
+if 'search_index' not in st.session_state:
+    st.session_state.search_index = SearchIndexCache()
+
+# Uploads already appended, so reruns don't append them again: {table_id: file_id}
+if 'ingested_uploads' not in st.session_state:
+    st.session_state.ingested_uploads = {}
+
+# Change log state each table was loaded at or last logged, when changes
+# are saved through the change log (TABLE_APP_CHANGE_LOG=1)
+if 'log_tokens' not in st.session_state:
+    st.session_state.log_tokens = {}
+
+# Background saves in flight: {table_id: {"job": job_id, "version": version}}
+if 'pending_saves' not in st.session_state:
+    st.session_state.pending_saves = {}
+
+# Seconds each table took to load: {table_id: seconds}
+if 'load_times' not in st.session_state:
+    st.session_state.load_times = {}
+
+# Download files generated on request, keyed by table version
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = ExportCache()
+
+# Loaded tables, least recently viewed first
+if 'table_lru' not in st.session_state:
+    st.session_state.table_lru = []
+
+# Phase timings of recent reruns for the diagnostics panel (off unless
+# enabled there or with TABLE_APP_PROFILE=1)
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = RerunProfiler(enabled=profiling_requested())
+
+if 'last_autosave' not in st.session_state:
+    st.session_state.last_autosave = time.time()
+
+@st.cache_resource
+def get_data_handler():
+    """Process-wide DataHandler whose background writer is shared by all sessions"""
+    return DataHandler(write_behind=True, optimize_dtypes=True, change_log=change_log_requested(),
+                       out_of_core_bytes=out_of_core_limit())
+
+@st.cache_resource
+def get_workspace():
+    """Tables discovered in the data directory"""
+    return Workspace(get_data_handler())
+
+@st.cache_resource
+def get_table_store():
+    """Process-wide store that loads each table once for all sessions"""
+    return SharedTableStore(get_data_handler())
+
+@st.cache_resource
+def get_metrics_sink():
+    """Process-wide log and metrics file receiving profiled reruns"""
+    return MetricsSink(os.environ.get(METRICS_FILE_ENV), echo=profiling_requested())
 
 def main():
     st.set_page_config(page_title="Data Table Manager", layout="wide", page_icon="📊")
@@ -240,144 +355,147 @@ def main():
     st.markdown("<h1 class='main-header'>📊 Data Table Manager</h1>", unsafe_allow_html=True)
     
     # Save button at the top
-    data_handler = DataHandler()
+    st.session_state.profiler.begin()
+    data_handler = get_data_handler()
+    get_table_store().touch(st.session_state.session_id)
+    poll_pending_saves(data_handler)
+    maybe_autosave(data_handler)
     if st.button("💾 Save All Data", type="primary"):
-        save_all_data(data_handler)
-        st.success("All data saved!")
+        saved = save_all_data(data_handler)
+        if saved:
+            st.success(f"Saving {', '.join(table_label(table_id) for table_id in saved)} in the background...")
+        else:
+            st.info("No unsaved changes.")
     
     st.markdown("---")
     
     # Initialize components
     table_ops = TableOperations()
     
-    # Create tabs with icons
-    tab1, tab2, tab3 = st.tabs(["📋 Table 1", "📊 Table 2", "📈 Table 3"])
-    
-    # Tab 1
-    with tab1:
-        handle_tab_content(1, data_handler, table_ops)
-    
-    # Tab 2
-    with tab2:
-        handle_tab_content(2, data_handler, table_ops)
-    
-    # Tab 3
-    with tab3:
-        handle_tab_content(3, data_handler, table_ops)
+    # Only the selected table is loaded and rendered
+    table_ids = {table["label"]: table["file"] for table in get_workspace().tables()}
+    if table_ids:
+        if "pending_active_table" in st.session_state:
+            # Select a table created on the previous run
+            st.session_state.active_table = table_label(st.session_state.pop("pending_active_table"))
+        selected = table_ids[st.selectbox(f"Table ({len(table_ids)} available)", list(table_ids), key="active_table")]
+        if data_handler.is_out_of_core(selected):
+            # Too large to load; queried from disk instead
+            handle_large_table(selected, data_handler, table_ops)
+        else:
+            if selected not in st.session_state.table_data:
+                load_table(selected)
+            touch_table(selected)
+            unload_tables(keep=selected)
+            handle_tab_content(selected, data_handler, table_ops)
+    else:
+        st.info("ℹ️ No tables found. Create one in the sidebar to get started.")
+
     
     # Sidebar with improved organization
     with st.sidebar:
         st.header("⚙️ Application Controls")
         
         # Undo section
-        st.subheader("🔄 Undo")
-        if st.button("Undo Last Change", use_container_width=True):
-            undo_last_change()
+        st.subheader("🔄 Undo / Redo")
+        undo_manager = st.session_state.undo_manager
+        table_labels = {table_label(table_id): table_id for table_id in st.session_state.table_lru}
+        undo_table = table_labels.get(st.selectbox("Table", list(table_labels), key="undo_table"))
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Undo", use_container_width=True, disabled=not undo_manager.can_undo(undo_table)):
+                undo_last_change(undo_table)
+        with col2:
+            if st.button("Redo", use_container_width=True, disabled=not undo_manager.can_redo(undo_table)):
+                redo_last_change(undo_table)
+        st.caption(f"History memory: {undo_manager.memory_usage() / 1024 / 1024:.1f} MB")
+        shared = get_table_store().stats()
+        st.caption(f"Shared tables: {len(shared)} loaded, "
+                   f"{sum(entry['nbytes'] for entry in shared.values()) / 1024 / 1024:.1f} MB")
         
         # Last saved info
         st.subheader("🕒 Last Saved")
-        for i in range(1, 4):
-            if i in st.session_state.last_saved:
-                st.caption(f"Table {i}: {st.session_state.last_saved[i]}")
+        for table_id in st.session_state.table_lru:
+            label = table_label(table_id)
+            status = " (unsaved changes)" if is_dirty(table_id) else ""
+            if table_id in st.session_state.last_saved:
+                st.caption(f"{label}: {st.session_state.last_saved[table_id]}{status}")
+            else:
+                st.caption(f"{label}: Never{status}")
+            log_status = data_handler.log_status(table_id) if data_handler.change_log else None
+            if log_status:
+                st.caption(f"Change log: {log_status['entries']} changes, {log_status['bytes'] / 1024 / 1024:.1f} MB"
+                           + (" (compacting)" if log_status["compacting"] else ""))
+            if table_id in st.session_state.pending_saves:
+                st.progress(st.session_state.pending_saves[table_id].get("progress", 0.0), text=f"Saving {label}...")
+        st.number_input(
+            "Autosave every (minutes, 0 = off)",
+            min_value=0, max_value=120, value=0, step=1,
+            key="autosave_minutes"
+        )
+        
+        # New table
+        st.subheader("➕ New Table")
+        new_table_name = st.text_input("Table name", key="new_table_name")
+        if st.button("Create Table", key="create_table"):
+            try:
+                filename = get_workspace().create_table(new_table_name)
+            except ValueError as e:
+                st.warning(str(e))
             else:
-                st.caption(f"Table {i}: Never")
+                if filename:
+                    st.session_state.pending_active_table = filename
+                    st.rerun()
+                else:
+                    st.warning("Enter a name that isn't used by another table.")
+        
+        # Diagnostics
+        st.subheader("🩺 Diagnostics")
+        show_diagnostics()
         
         # Help section
         st.subheader("ℹ️ Help")
         st.markdown("""
-        - Use tabs to switch between tables
+        - Pick a table from the table selector
         - Edit data directly in the table
         - Filter and sort using the operation tabs
         - Delete rows in batch using the delete tab
+        - Fill columns from or join with another table using the join tab
+        - Group and summarise rows using the aggregate tab
         - Download tables using the download button
         """)
+    
+    finish_profile()
 
-def handle_tab_content(tab_number, data_handler, table_ops):
+def handle_tab_content(table_id, data_handler, table_ops):
     """Handle content for each tab"""
-    st.markdown(f"<h3 style='color: #4b6cb7;'>Table {tab_number} Data</h3>", unsafe_allow_html=True)
+    label = table_label(table_id)
+    st.markdown(f"<h3 style='color: #4b6cb7;'>{label} Data</h3>", unsafe_allow_html=True)
+    
+    if table_id in st.session_state.load_times:
+        st.caption(f"Loaded in {st.session_state.load_times[table_id]:.2f} s")
     
     # Initialize session state for this table if not exists
-    if tab_number not in st.session_state.table_data:
+    if table_id not in st.session_state.table_data:
         # Try to load existing data
-        filename = f"table{tab_number}.csv"
-        df = data_handler.read_file(filename)
-        if df.empty:
-            # Create empty DataFrame with default columns
-            df = pd.DataFrame(columns=["Column1", "Column2", "Column3"])
-        st.session_state.table_data[tab_number] = df
-        st.session_state.table_column_order[tab_number] = list(df.columns)
-        st.session_state.undo_stack[tab_number] = []
+        init_table(table_id, get_table_store().acquire(table_id, st.session_state.session_id))
     
     # File upload for appending data
     st.markdown("##### 📤 Upload Data")
     uploaded_file = st.file_uploader(
-        f"Upload CSV/Excel for Table {tab_number}",
+        f"Upload CSV/Excel for {label}",
         type=["csv", "xlsx", "xls"],
-        key=f"uploader_{tab_number}",
+        key=f"uploader_{table_id}",
         label_visibility="collapsed"
     )
     
-    if uploaded_file is not None:
-        try:
-            # Save current state for undo
-            st.session_state.undo_stack[tab_number].append(
-                st.session_state.table_data[tab_number].copy()
-            )
-            
-            # Load new data
-            if uploaded_file.name.endswith('.csv'):
-                new_df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith(('.xls', '.xlsx')):
-                new_df = pd.read_excel(uploaded_file)
-            else:
-                st.error("Unsupported file format.")
-                return
-            
-            # Validate columns
-            current_df = st.session_state.table_data[tab_number]
-            if not current_df.empty:
-                # Check if columns match
-                if not new_df.columns.equals(current_df.columns):
-                    st.warning("⚠️ Column mismatch detected!")
-                    st.write("Current table columns:", list(current_df.columns))
-                    st.write("Uploaded file columns:", list(new_df.columns))
-                    
-                    # Offer options to handle mismatch
-                    option = st.radio(
-                        "How would you like to proceed?",
-                        ("Append with column alignment", "Append as new columns", "Cancel upload"),
-                        key=f"column_mismatch_{tab_number}"
-                    )
-                    
-                    if option == "Cancel upload":
-                        st.info("Upload cancelled.")
-                        return
-                    elif option == "Append with column alignment":
-                        # Align columns and fill missing values with empty strings
-                        for col in current_df.columns:
-                            if col not in new_df.columns:
-                                new_df[col] = ""
-                        # Reorder columns to match current table
-                        new_df = new_df[current_df.columns]
-                    elif option == "Append as new columns":
-                        # Add missing columns to current table
-                        for col in new_df.columns:
-                            if col not in current_df.columns:
-                                current_df[col] = ""
-                        # Update session state
-                        st.session_state.table_data[tab_number] = current_df
-            
-            # Append to existing data
-            combined_df = pd.concat([current_df, new_df], ignore_index=True)
-            st.session_state.table_data[tab_number] = combined_df
-            st.success(f"✅ Data appended to Table {tab_number}!")
-            
-        except Exception as e:
-            st.error(f"❌ Error processing file: {str(e)}")
+    # Each upload is ingested once; the uploader keeps the file across reruns
+    if uploaded_file is not None and st.session_state.ingested_uploads.get(table_id) != uploaded_file.file_id:
+        ingest_uploaded_file(table_id, uploaded_file)
     
     # Display editable table
-    if not st.session_state.table_data[tab_number].empty:
-        st.markdown(f"**Table {tab_number}** (Editable)")
+    if not st.session_state.table_data[table_id].empty:
+        st.markdown(f"**{label}** (Editable)")
         
         # Column management
         with st.expander("📝 Column Management"):
@@ -385,183 +503,665 @@ def handle_tab_content(tab_number, data_handler, table_ops):
             
             with col1:
                 # Add new column
-                new_col_name = st.text_input("New Column Name", key=f"new_col_{tab_number}")
-                if st.button("➕ Add Column", key=f"add_col_{tab_number}"):
-                    if new_col_name and new_col_name not in st.session_state.table_data[tab_number].columns:
-                        # Save current state for undo
-                        st.session_state.undo_stack[tab_number].append(
-                            st.session_state.table_data[tab_number].copy()
-                        )
-                        
+                new_col_name = st.text_input("New Column Name", key=f"new_col_{table_id}")
+                if st.button("➕ Add Column", key=f"add_col_{table_id}"):
+                    if new_col_name and new_col_name not in st.session_state.table_data[table_id].columns:
                         # Add new column with empty values
-                        st.session_state.table_data[tab_number][new_col_name] = ""
+                        apply_operation(table_id, operations.add_column(st.session_state.table_data[table_id], new_col_name))
                         st.success(f"Column '{new_col_name}' added!")
-                    elif new_col_name in st.session_state.table_data[tab_number].columns:
+                    elif new_col_name in st.session_state.table_data[table_id].columns:
                         st.warning(f"Column '{new_col_name}' already exists!")
             
             with col2:
                 # Delete columns
-                if len(st.session_state.table_data[tab_number].columns) > 1:
+                if len(st.session_state.table_data[table_id].columns) > 1:
                     cols_to_delete = st.multiselect(
                         "Select Columns to Delete",
-                        st.session_state.table_data[tab_number].columns,
-                        key=f"del_col_{tab_number}"
+                        st.session_state.table_data[table_id].columns,
+                        key=f"del_col_{table_id}"
                     )
-                    if st.button("🗑️ Delete Selected Columns", key=f"delete_col_{tab_number}"):
+                    if st.button("🗑️ Delete Selected Columns", key=f"delete_col_{table_id}"):
                         if cols_to_delete:
-                            # Save current state for undo
-                            st.session_state.undo_stack[tab_number].append(
-                                st.session_state.table_data[tab_number].copy()
-                            )
-                            
-                            # Delete columns
-                            st.session_state.table_data[tab_number] = st.session_state.table_data[tab_number].drop(columns=cols_to_delete)
+                            apply_operation(table_id, operations.drop_columns(st.session_state.table_data[table_id], cols_to_delete))
                             st.success(f"Columns {cols_to_delete} deleted!")
                         else:
                             st.warning("Please select at least one column to delete.")
                 else:
                     st.info("Need at least one column to display data")
         
+        handle_search(table_id, data_handler, table_ops)
+        
         # Create tabs for different operations
-        op_tab1, op_tab2, op_tab3, op_tab4 = st.tabs(["✏️ Edit", "🔍 Filter", "🔄 Sort", "🗑️ Delete"])
+        op_tab1, op_tab2, op_tab3, op_tab4, op_tab5, op_tab6 = st.tabs(
+            ["✏️ Edit", "🔍 Filter", "🔄 Sort", "🗑️ Delete", "🔗 Join", "📊 Aggregate"]
+        )
         
         with op_tab1:
             st.markdown("###### Edit your data directly in the table below:")
-            # Create editable dataframe
-            edited_df = st.data_editor(
-                st.session_state.table_data[tab_number],
-                num_rows="dynamic",
-                key=f"editor_{tab_number}",
-                height=400,
-                use_container_width=True
+            # Only the visible page is sent to the editor
+            page_df, page_start = table_ops.paginate(st.session_state.table_data[table_id], f"edit_{table_id}")
+            # Edits are applied from the editor's change set by the callback
+            editor_key = f"editor_{table_id}"
+            table_ops.editable_dataframe(
+                page_df, key=editor_key,
+                on_change=apply_editor_changes, args=(table_id, editor_key, page_start)
             )
-            
-            # Update session state if changes were made
-            if not edited_df.equals(st.session_state.table_data[tab_number]):
-                # Save current state for undo
-                st.session_state.undo_stack[tab_number].append(
-                    st.session_state.table_data[tab_number].copy()
-                )
-                
-                # Update column order if it has changed
-                if list(edited_df.columns) != list(st.session_state.table_data[tab_number].columns):
-                    st.session_state.table_column_order[tab_number] = list(edited_df.columns)
-                
-                st.session_state.table_data[tab_number] = edited_df
+            # The editor can't reorder columns itself; the order is chosen here
+            order_key = f"column_order_{table_id}"
+            if operations.ordered_columns(page_df, st.session_state.get(order_key)) != list(page_df.columns):
+                # Reordered since (e.g. undone); show the table's current order
+                st.session_state.pop(order_key, None)
+            st.multiselect(
+                "Column order (selected columns first, in the order picked)",
+                list(page_df.columns), default=list(page_df.columns), key=order_key,
+                on_change=apply_column_order, args=(table_id, order_key)
+            )
+            if st.session_state.pop(f"edited_{table_id}", False):
                 st.success("✅ Changes saved!")
         
         with op_tab2:
             st.markdown("###### Filter your data using the options below:")
             # Apply advanced filtering
-            filtered_df = table_ops.advanced_filter_dataframe(st.session_state.table_data[tab_number], str(tab_number))
-            st.dataframe(filtered_df, use_container_width=True, height=400)
+            current_df = st.session_state.table_data[table_id]
+            version = st.session_state.table_version[table_id]
+            with profile("filter", rows=len(current_df)):
+                filtered_df = table_ops.advanced_filter_dataframe(
+                    current_df, str(table_id),
+                    stats=lambda col: st.session_state.column_stats.get(table_id, version, current_df, col)
+                )
+            filtered_page, _ = table_ops.paginate(filtered_df, f"filter_{table_id}")
+            st.dataframe(filtered_page, use_container_width=True, height=400)
             
-            # Option to apply filter to main data
-            if not filtered_df.equals(st.session_state.table_data[tab_number]) and not filtered_df.empty:
-                if st.button("Apply Filter to Main Data", key=f"apply_filter_{tab_number}"):
-                    # Save current state for undo
-                    st.session_state.undo_stack[tab_number].append(
-                        st.session_state.table_data[tab_number].copy()
-                    )
-                    st.session_state.table_data[tab_number] = filtered_df
+            # Option to apply filter to main data (filtering only ever removes rows)
+            if len(filtered_df) < len(st.session_state.table_data[table_id]) and not filtered_df.empty:
+                if st.button("Apply Filter to Main Data", key=f"apply_filter_{table_id}"):
+                    # Drop the filtered-out rows, keeping the filtered index
+                    current_df = st.session_state.table_data[table_id]
+                    apply_operation(table_id, operations.delete_rows(
+                        current_df, current_df.index.isin(filtered_df.index), reset_index=False
+                    ))
                     st.success("✅ Filter applied to main data!")
         
         with op_tab3:
             st.markdown("###### Sort your data using the options below:")
             # Apply sorting
-            sorted_df = table_ops.sort_dataframe(st.session_state.table_data[tab_number], str(tab_number))
-            st.dataframe(sorted_df, use_container_width=True, height=400)
+            current_df = st.session_state.table_data[table_id]
+            sort_keys = table_ops.sort_keys(current_df, str(table_id))
+            # Reuse the cached permutation for this table version and sort keys
+            with profile("sort", rows=len(current_df)):
+                permutation = st.session_state.sort_index.get(
+                    table_id, st.session_state.table_version[table_id], current_df, sort_keys
+                ) if sort_keys else None
+            sorted_page, _ = table_ops.paginate(current_df, f"sort_{table_id}", order=permutation)
+            st.dataframe(sorted_page, use_container_width=True, height=400)
             
             # Option to apply sort to main data
-            if not sorted_df.equals(st.session_state.table_data[tab_number]):
-                if st.button("Apply Sort to Main Data", key=f"apply_sort_{tab_number}"):
-                    # Save current state for undo
-                    st.session_state.undo_stack[tab_number].append(
-                        st.session_state.table_data[tab_number].copy()
-                    )
-                    st.session_state.table_data[tab_number] = sorted_df
+            if permutation is not None and (permutation != np.arange(len(permutation))).any():
+                if st.button("Apply Sort to Main Data", key=f"apply_sort_{table_id}"):
+                    apply_operation(table_id, operations.sort_rows(current_df, sort_keys, permutation))
                     st.success("✅ Sort applied to main data!")
         
         with op_tab4:
-            st.markdown("###### Select rows to delete:")
-            current_df = st.session_state.table_data[tab_number].copy()
-            current_df["Select"] = False
-            
-            # Show dataframe with selection column
-            edited_with_selection = st.data_editor(
-                current_df,
-                num_rows="fixed",
-                key=f"delete_editor_{tab_number}",
-                height=400,
-                use_container_width=True
+            # Rows are chosen by conditions or positions and dropped with one keep-mask
+            current_df = st.session_state.table_data[table_id]
+            version = st.session_state.table_version[table_id]
+            keep = table_ops.batch_delete_rows(
+                current_df, str(table_id),
+                stats=lambda col: st.session_state.column_stats.get(table_id, version, current_df, col)
             )
-            
-            # Check which rows were selected for deletion
-            selected_rows = edited_with_selection[edited_with_selection["Select"] == True]
-            
-            if not selected_rows.empty:
-                st.warning(f"⚠️ {len(selected_rows)} rows selected for deletion")
-                if st.button(f"🗑️ Delete {len(selected_rows)} Selected Rows", key=f"delete_button_{tab_number}"):
-                    # Save current state for undo
-                    st.session_state.undo_stack[tab_number].append(
-                        st.session_state.table_data[tab_number].copy()
+            if keep is not None:
+                with profile("delete", rows=len(current_df)):
+                    apply_operation(table_id, operations.delete_rows(current_df, keep))
+                st.success(f"✅ Deleted {len(current_df) - int(keep.sum())} rows!")
+                
+                # Rerun to refresh the UI
+                st.rerun()
+        
+        with op_tab5:
+            handle_join(table_id, table_ops)
+        
+        with op_tab6:
+            # Cached partials are merged with appended rows instead of recomputed
+            current_df = st.session_state.table_data[table_id]
+            settings = table_ops.aggregate_settings(current_df, str(table_id))
+            if settings is not None:
+                keys, aggregations = settings
+                with profile("aggregate", rows=len(current_df)):
+                    result = st.session_state.aggregates.get(
+                        table_id, st.session_state.table_version[table_id], current_df, keys, aggregations
                     )
-                    
-                    # Remove selected rows (excluding the "Select" column)
-                    indices_to_delete = selected_rows.index.tolist()
-                    new_df = st.session_state.table_data[tab_number].drop(indices_to_delete).reset_index(drop=True)
-                    st.session_state.table_data[tab_number] = new_df
-                    st.success(f"✅ Deleted {len(indices_to_delete)} rows!")
-                    
-                    # Rerun to refresh the UI
-                    st.rerun()
-            else:
-                st.info("ℹ️ Select rows by checking the 'Select' checkbox to delete them.")
+                st.caption(f"{len(result)} groups")
+                st.dataframe(result, use_container_width=True, hide_index=True, height=400)
         
-        # Download button
+        # Download button; the export is only generated on request and is
+        # reused until the table changes
         st.markdown("---")
-        csv = convert_df_to_csv(st.session_state.table_data[tab_number])
-        st.download_button(
-            label="📥 Download Table Data",
-            data=csv,
-            file_name=f"table{tab_number}_data.csv",
-            mime="text/csv",
-            key=f"download_{tab_number}",
-            use_container_width=True
-        )
+        export_cache = st.session_state.export_cache
+        version = st.session_state.table_version[table_id]
+        col1, col2 = st.columns(2)
+        with col1:
+            export_format = st.selectbox("Download format", list(EXPORT_FORMATS), key=f"export_format_{table_id}")
+        extension, mime = EXPORT_FORMATS[export_format]
+        export_path = export_cache.get(table_id, version, export_format)
+        with col2:
+            if export_path is None and st.button("📦 Prepare Download", key=f"prepare_download_{table_id}",
+                                                 use_container_width=True):
+                progress_bar = st.progress(0.0, text="Preparing download...")
+                try:
+                    with profile("export", rows=len(st.session_state.table_data[table_id])):
+                        export_path = export_cache.export(
+                            table_id, version, st.session_state.table_data[table_id], export_format,
+                            progress=lambda fraction: progress_bar.progress(fraction, text="Preparing download...")
+                        )
+                except Exception as e:
+                    st.error(f"❌ Error preparing download: {str(e)}")
+                progress_bar.empty()
+            if export_path is not None:
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        label="📥 Download Table Data",
+                        data=export_file,
+                        file_name=f"{label}_data{extension}",
+                        mime=mime,
+                        key=f"download_{table_id}",
+                        use_container_width=True
+                    )
     else:
         st.info("ℹ️ No data available. Upload a file to get started.")
 
+def handle_large_table(table_id, data_handler, table_ops):
+    """Read-only view of a table too large to load, queried from disk in chunks"""
+    label = table_label(table_id)
+    st.markdown(f"<h3 style='color: #4b6cb7;'>{label} Data</h3>", unsafe_allow_html=True)
+    with profile("open"):
+        table = data_handler.open_chunked(table_id)
+    st.info(f"ℹ️ {label} has {len(table):,} rows ({table.nbytes / 1024 / 1024:,.0f} MB), more than fits "
+            "in memory. It is queried from disk and can't be edited here.")
+    if not len(table):
+        return
+    # Widgets only look at column dtypes
+    sample = table.rows(0, 1)
+    
+    view_tab, filter_tab, sort_tab, aggregate_tab = st.tabs(["👁️ View", "🔍 Filter", "🔄 Sort", "📊 Aggregate"])
+    
+    with view_tab:
+        with profile("page", rows=len(table)):
+            page, _ = table_ops.paginate(table, f"large_view_{table_id}")
+        st.dataframe(page, use_container_width=True, height=400)
+    
+    with filter_tab:
+        st.markdown("###### Filter your data using the options below:")
+        filters = table_ops.filter_conditions(sample, f"large_{table_id}", stats=table.column_stats)
+        with profile("filter", rows=len(table)):
+            positions = table.filter_positions(filters)
+        if positions is not None:
+            st.caption(f"{len(positions):,} matching rows")
+        page, _ = table_ops.paginate(table, f"large_filter_{table_id}", order=positions)
+        st.dataframe(page, use_container_width=True, height=400)
+    
+    with sort_tab:
+        st.markdown("###### Sort your data using the options below:")
+        sort_keys = table_ops.sort_keys(sample, f"large_{table_id}")
+        with profile("sort", rows=len(table)):
+            permutation = table.sort_permutation(sort_keys) if sort_keys else None
+        page, _ = table_ops.paginate(table, f"large_sort_{table_id}", order=permutation)
+        st.dataframe(page, use_container_width=True, height=400)
+    
+    with aggregate_tab:
+        settings = table_ops.aggregate_settings(sample, f"large_{table_id}")
+        if settings is not None:
+            keys, aggregations = settings
+            with profile("aggregate", rows=len(table)):
+                result = table.aggregate(keys, aggregations)
+            st.caption(f"{len(result)} groups")
+            st.dataframe(result, use_container_width=True, hide_index=True, height=400)
+    
+    # The export is streamed from disk and kept until the file changes
+    st.markdown("---")
+    export_cache = st.session_state.export_cache
+    version = f"disk{abs(hash(repr(table.signature))):x}"
+    col1, col2 = st.columns(2)
+    with col1:
+        export_format = st.selectbox("Download format", list(EXPORT_FORMATS), key=f"export_format_{table_id}")
+    extension, mime = EXPORT_FORMATS[export_format]
+    export_path = export_cache.get(table_id, version, export_format)
+    with col2:
+        if export_path is None and st.button("📦 Prepare Download", key=f"prepare_download_{table_id}",
+                                             use_container_width=True):
+            progress_bar = st.progress(0.0, text="Preparing download...")
+            try:
+                with profile("export", rows=len(table)):
+                    export_path = export_cache.export(
+                        table_id, version, table, export_format,
+                        progress=lambda fraction: progress_bar.progress(fraction, text="Preparing download...")
+                    )
+            except Exception as e:
+                st.error(f"❌ Error preparing download: {str(e)}")
+            progress_bar.empty()
+        if export_path is not None:
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    label="📥 Download Table Data",
+                    data=export_file,
+                    file_name=f"{label}_data{extension}",
+                    mime=mime,
+                    key=f"download_{table_id}",
+                    use_container_width=True
+                )
+
+def handle_search(table_id, data_handler, table_ops):
+    """Search all text columns through the table's search index"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("🔎 Search all text columns", key=f"search_{table_id}",
+                              placeholder="Type to search...")
+    with col2:
+        mode = st.radio("Match", list(SEARCH_MODES), key=f"search_mode_{table_id}", horizontal=True)
+    if not query:
+        return
+    current_df = st.session_state.table_data[table_id]
+    started = time.perf_counter()
+    with profile("search", rows=len(current_df)):
+        index = search_index(table_id, data_handler)
+        positions = index.search(query, SEARCH_MODES[mode])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.caption(f"{len(positions)} matching rows ({elapsed_ms:.0f} ms)")
+    if len(positions):
+        results_page, _ = table_ops.paginate(current_df, f"search_results_{table_id}", order=positions)
+        st.dataframe(results_page, use_container_width=True)
+
+def search_index(table_id, data_handler):
+    """The table's search index, from the session, the index persisted beside the file, or built"""
+    cache = st.session_state.search_index
+    current_df = st.session_state.table_data[table_id]
+    version = st.session_state.table_version[table_id]
+    # Unchanged tables match the file, so the persisted index applies and
+    # a freshly built one is worth keeping
+    unchanged = version == 0 and st.session_state.saved_version[table_id] == 0
+    if cache.peek(table_id, version) is None and unchanged:
+        persisted = data_handler.read_search_index(table_id)
+        if persisted is not None and len(persisted) == len(current_df):
+            cache.put(table_id, version, persisted)
+            return cache.get(table_id, version, current_df)
+        index = cache.get(table_id, version, current_df)
+        data_handler.write_search_index(table_id, index, st.session_state.log_tokens.get(table_id))
+        return index
+    return cache.get(table_id, version, current_df)
+
+def handle_join(table_id, table_ops):
+    """Look up values from, or join with, another table through cached key indexes"""
+    st.markdown("###### Fill columns from another table or join the two:")
+    others = {table["label"]: table["file"] for table in get_workspace().tables() if table["file"] != table_id}
+    other_label = st.selectbox("Other table", list(others), index=None, placeholder="Choose a table",
+                               key=f"join_table_{table_id}")
+    if other_label is None:
+        return
+    other_id = others[other_label]
+    if other_id not in st.session_state.table_data:
+        # Only the chosen table is checked; tables queried from disk can't
+        # be joined in memory
+        if get_data_handler().is_out_of_core(other_id):
+            st.info(f"ℹ️ {other_label} is too large to load, so it can't be joined.")
+            return
+        load_table(other_id)
+    current_df = st.session_state.table_data[table_id]
+    other_df = st.session_state.table_data[other_id]
+    settings = table_ops.join_settings(current_df, other_df, str(table_id))
+    if settings is None:
+        return
+    
+    # Both sides probe through their key indexes, so neither table is rescanned
+    key_indexes = st.session_state.key_indexes
+    with profile("join", rows=len(current_df)):
+        probe = key_indexes.get(table_id, st.session_state.table_version[table_id], current_df, settings["left_on"])
+        build = key_indexes.get(other_id, st.session_state.table_version[other_id], other_df, settings["right_on"])
+        if settings["mode"] == "lookup":
+            left_positions = np.arange(len(current_df))
+            right_positions = lookup_positions(probe, build)
+        else:
+            left_positions, right_positions = join_positions(probe, build, settings["mode"])
+    suffix = f"_{other_label}"
+    preview = operations.join_tables(current_df, other_df, left_positions[:PREVIEW_ROWS],
+                                     right_positions[:PREVIEW_ROWS], settings["columns"], suffix)
+    
+    if settings["mode"] == "lookup":
+        matched = int((right_positions >= 0).sum())
+        st.caption(f"{matched} of {len(current_df)} rows have a match in {other_label}")
+        st.dataframe(preview, use_container_width=True, height=300)
+        if matched and st.button("Fill Columns", key=f"join_apply_{table_id}"):
+            _, delta = apply_operation(table_id, operations.lookup_fill(
+                current_df, other_df, right_positions, settings["columns"], settings["overwrite"]
+            ))
+            if delta is None:
+                st.info("Nothing to fill.")
+            else:
+                st.success(f"✅ Filled {', '.join(settings['columns'])} from {other_label}!")
+    else:
+        st.caption(f"The join has {len(left_positions)} rows")
+        st.dataframe(preview, use_container_width=True, height=300)
+        name = st.text_input("New table name", value=f"{table_label(table_id)}_{other_label}",
+                             key=f"join_name_{table_id}")
+        if st.button("Save Join as New Table", key=f"join_save_{table_id}"):
+            joined = operations.join_tables(current_df, other_df, left_positions, right_positions,
+                                            settings["columns"], suffix)
+            try:
+                filename = get_workspace().create_table(name, data=joined)
+            except ValueError as e:
+                st.warning(str(e))
+            else:
+                if filename:
+                    st.session_state.pending_active_table = filename
+                    st.rerun()
+                else:
+                    st.warning("Enter a name that isn't used by another table.")
+
+def load_table(table_id):
+    """Load a table into the session from the shared store"""
+    with profile("load"):
+        for filename, df, seconds in get_table_store().acquire_many([table_id], st.session_state.session_id):
+            init_table(filename, df)
+            st.session_state.load_times[filename] = seconds
+    touch_table(table_id)
+
+def init_table(table_id, df):
+    """Start a table's session state from freshly loaded data"""
+    if df.empty:
+        # Create empty DataFrame with default columns
+        df = pd.DataFrame(columns=["Column1", "Column2", "Column3"])
+    st.session_state.log_tokens[table_id] = DataHandler.pop_log_token(df)
+    st.session_state.table_data[table_id] = df
+    st.session_state.table_column_order[table_id] = list(df.columns)
+    st.session_state.undo_manager.clear(table_id)
+    st.session_state.table_version[table_id] = 0
+    st.session_state.saved_version[table_id] = 0
+    st.session_state.column_stats.invalidate(table_id)
+    st.session_state.sort_index.invalidate(table_id)
+    st.session_state.key_indexes.invalidate(table_id)
+    st.session_state.aggregates.invalidate(table_id)
+    st.session_state.search_index.invalidate(table_id)
+    st.session_state.export_cache.invalidate(table_id)
+
+def table_label(table_id):
+    """Display name of a table"""
+    return get_workspace().labels().get(table_id, Workspace.default_label(table_id))
+
+def touch_table(table_id):
+    """Mark a loaded table as the most recently viewed"""
+    if table_id in st.session_state.table_lru:
+        st.session_state.table_lru.remove(table_id)
+    st.session_state.table_lru.append(table_id)
+
+def unload_tables(keep):
+    """Unload the least recently viewed tables beyond MAX_RESIDENT_TABLES, skipping unsaved ones"""
+    resident = st.session_state.table_lru
+    for table_id in list(resident[:-1]):
+        if len(resident) <= MAX_RESIDENT_TABLES:
+            break
+        if table_id == keep or is_dirty(table_id) or table_id in st.session_state.pending_saves:
+            continue
+        resident.remove(table_id)
+        for state in (st.session_state.table_data, st.session_state.table_column_order,
+                      st.session_state.table_version, st.session_state.saved_version,
+                      st.session_state.load_times, st.session_state.ingested_uploads,
+                      st.session_state.log_tokens):
+            state.pop(table_id, None)
+        st.session_state.undo_manager.clear(table_id)
+        st.session_state.column_stats.invalidate(table_id)
+        st.session_state.sort_index.invalidate(table_id)
+        st.session_state.key_indexes.invalidate(table_id)
+        st.session_state.aggregates.invalidate(table_id)
+        st.session_state.search_index.invalidate(table_id)
+        st.session_state.export_cache.invalidate(table_id)
+        get_table_store().release(table_id, st.session_state.session_id)
+
+def ingest_uploaded_file(table_id, uploaded_file):
+    """Stream an uploaded CSV/Excel file into a table"""
+    try:
+        if not uploaded_file.name.endswith(('.csv', '.xls', '.xlsx')):
+            st.error("Unsupported file format.")
+            return
+        
+        # Validate columns from the header before parsing any rows
+        new_columns = read_upload_header(uploaded_file)
+        current_df = st.session_state.table_data[table_id]
+        mode = "align"
+        if not current_df.empty and new_columns != list(current_df.columns):
+            st.warning("⚠️ Column mismatch detected!")
+            st.write("Current table columns:", list(current_df.columns))
+            st.write("Uploaded file columns:", new_columns)
+            
+            # Offer options to handle mismatch
+            option = st.radio(
+                "How would you like to proceed?",
+                ("Append with column alignment", "Append as new columns", "Cancel upload"),
+                key=f"column_mismatch_{table_id}"
+            )
+            
+            if option == "Cancel upload":
+                st.info("Upload cancelled.")
+                return
+            if not st.button("📥 Import Upload", key=f"import_upload_{table_id}"):
+                return
+            # Align columns to the current table (missing values filled with
+            # empty strings) or add the new ones to it
+            mode = "align" if option == "Append with column alignment" else "extend"
+        
+        # Parse, align and coerce the upload chunk by chunk
+        progress_bar = st.progress(0.0, text="Importing upload...")
+        with profile("upload"):
+            combined_df, _ = apply_operation(table_id, operations.append_file(
+                current_df, uploaded_file, mode,
+                progress=lambda fraction: progress_bar.progress(fraction, text="Importing upload...")
+            ))
+        progress_bar.empty()
+        st.session_state.ingested_uploads[table_id] = uploaded_file.file_id
+        st.success(f"✅ Appended {len(combined_df) - len(current_df)} rows to {table_label(table_id)}!")
+        
+    except Exception as e:
+        st.error(f"❌ Error processing file: {str(e)}")
+
 def save_all_data(data_handler):
-    """Save all table data to files"""
-    for tab_number in st.session_state.table_data:
-        filename = f"table{tab_number}.csv"
-        # Reorder columns according to user preference before saving
-        if tab_number in st.session_state.table_column_order:
-            df_to_save = st.session_state.table_data[tab_number].copy()
-            # Reorder columns to match the user's preference
-            columns_in_order = st.session_state.table_column_order[tab_number]
-            # Add any new columns that might not be in the stored order
-            for col in df_to_save.columns:
-                if col not in columns_in_order:
-                    columns_in_order.append(col)
-            df_to_save = df_to_save[columns_in_order]
+    """Queue tables with unsaved changes for saving, returning their table ids (filenames)"""
+    saved = []
+    for table_id in st.session_state.table_data:
+        if not is_dirty(table_id):
+            continue
+        pending = st.session_state.pending_saves.get(table_id)
+        if pending and pending["version"] == st.session_state.table_version[table_id]:
+            continue
+        # Write columns in the user's preferred order, followed by any new
+        # columns not in the stored order
+        with profile("save_submit"):
+            job_id = operations.save_table(
+                data_handler, st.session_state.table_data[table_id], table_id,
+                st.session_state.table_column_order.get(table_id), st.session_state.log_tokens.get(table_id),
+                owner=st.session_state.session_id
+            )
+        st.session_state.pending_saves[table_id] = {
+            "job": job_id,
+            "version": st.session_state.table_version[table_id],
+        }
+        saved.append(table_id)
+    poll_pending_saves(data_handler)
+    return saved
+
+def poll_pending_saves(data_handler):
+    """Record finished background saves in last_saved and saved_version"""
+    for table_id, pending in list(st.session_state.pending_saves.items()):
+        status = data_handler.write_status(pending["job"]) if pending["job"] is not None else {"state": "done"}
+        # A coalesced save completes with the job that replaced it; only
+        # this session's own saves are coalesced
+        while status is not None and status["state"] == "superseded":
+            status = data_handler.write_status(status["superseded_by"])
+        if status is None or status["state"] == "done":
+            # Sessions opening the table from now on load the saved version
+            get_table_store().invalidate(table_id)
+            st.session_state.saved_version[table_id] = pending["version"]
+            finished = status["finished"] if status and status.get("finished") else time.time()
+            if status and status.get("started"):
+                # Time the background writer spent encoding and writing the table
+                st.session_state.profiler.record("save", finished - status["started"])
+            st.session_state.last_saved[table_id] = datetime.fromtimestamp(finished).strftime("%H:%M:%S")
+            del st.session_state.pending_saves[table_id]
+        elif status["state"] == "failed":
+            st.error(f"❌ Saving {table_label(table_id)} failed.")
+            del st.session_state.pending_saves[table_id]
         else:
-            df_to_save = st.session_state.table_data[tab_number]
-        data_handler.write_file(df_to_save, filename)
-        st.session_state.last_saved[tab_number] = datetime.now().strftime("%H:%M:%S")
-
-def undo_last_change():
-    """Undo the last change for all tables"""
-    for tab_number in st.session_state.undo_stack:
-        if st.session_state.undo_stack[tab_number]:
-            # Restore previous state
-            st.session_state.table_data[tab_number] = st.session_state.undo_stack[tab_number].pop()
-    st.success("Last change undone!")
-
-def convert_df_to_csv(df):
-    """Convert DataFrame to CSV string"""
-    return df.to_csv(index=False).encode('utf-8')
+            pending["progress"] = status["progress"]
+
+def maybe_autosave(data_handler):
+    """Queue a save of changed tables when the autosave interval has elapsed"""
+    interval = st.session_state.get("autosave_minutes", 0) * 60
+    if interval and time.time() - st.session_state.last_autosave >= interval:
+        st.session_state.last_autosave = time.time()
+        save_all_data(data_handler)
+
+def is_dirty(table_id):
+    """Whether a table has changes that have not been saved"""
+    return st.session_state.table_version.get(table_id, 0) != st.session_state.saved_version.get(table_id, 0)
+
+def mark_changed(table_id, delta=None):
+    """Bump a table's version after any mutation, carrying caches over when the delta allows"""
+    old_version = st.session_state.table_version.get(table_id, 0)
+    st.session_state.table_version[table_id] = old_version + 1
+    st.session_state.column_stats.on_change(table_id, old_version, old_version + 1, delta)
+    st.session_state.sort_index.on_change(table_id, old_version, old_version + 1, delta)
+    st.session_state.key_indexes.on_change(table_id, old_version, old_version + 1, delta)
+    st.session_state.aggregates.on_change(table_id, old_version, old_version + 1, delta)
+    st.session_state.search_index.on_change(table_id, old_version, old_version + 1, delta)
+
+def apply_editor_changes(table_id, editor_key, page_start):
+    """Apply the data editor's change set to the table in place"""
+    changes = st.session_state.get(editor_key)
+    if not changes:
+        return
+    with profile("editor_diff"):
+        new_df, delta = TableOperations.apply_editor_changes(
+            st.session_state.table_data[table_id], changes, page_start
+        )
+    if delta is not None:
+        # Save the edit as a delta for undo
+        st.session_state.table_data[table_id] = new_df
+        record_change(table_id, delta)
+        st.session_state[f"edited_{table_id}"] = True
+
+def apply_column_order(table_id, order_key):
+    """Reorder a table's columns as chosen and keep that order for saving"""
+    apply_operation(table_id, operations.reorder_columns(
+        st.session_state.table_data[table_id], st.session_state.get(order_key) or []
+    ))
+    st.session_state.table_column_order[table_id] = list(st.session_state.table_data[table_id].columns)
+
+def apply_operation(table_id, result):
+    """Store the table returned by an operation and record its delta"""
+    df, delta = result
+    if delta is not None:
+        st.session_state.table_data[table_id] = df
+        record_change(table_id, delta)
+    return df, delta
+
+def record_change(table_id, delta):
+    """Record a change already stored in table_data in the table's undo history"""
+    st.session_state.undo_manager.record(table_id, delta)
+    mark_changed(table_id, delta)
+    log_change(table_id, APPLY, delta)
+
+def undo_last_change(table_id):
+    """Undo the last change for one table"""
+    delta = st.session_state.undo_manager.peek(table_id)
+    st.session_state.table_data[table_id] = st.session_state.undo_manager.undo(
+        table_id, st.session_state.table_data[table_id]
+    )
+    st.session_state.table_column_order[table_id] = list(st.session_state.table_data[table_id].columns)
+    mark_changed(table_id)
+    log_change(table_id, REVERT, delta)
+    st.success(f"Last change to {table_label(table_id)} undone!")
+
+def redo_last_change(table_id):
+    """Redo the last undone change for one table"""
+    delta = st.session_state.undo_manager.peek(table_id, redo=True)
+    st.session_state.table_data[table_id] = st.session_state.undo_manager.redo(
+        table_id, st.session_state.table_data[table_id]
+    )
+    st.session_state.table_column_order[table_id] = list(st.session_state.table_data[table_id].columns)
+    mark_changed(table_id)
+    log_change(table_id, APPLY, delta)
+    st.success(f"Change to {table_label(table_id)} redone!")
+
+def log_change(table_id, direction, delta):
+    """Save a change through the table's change log when that storage mode is on"""
+    data_handler = get_data_handler()
+    if not data_handler.change_log or delta is None:
+        return
+    df = st.session_state.table_data[table_id]
+    token = data_handler.log_change(
+        table_id, direction, delta, df, st.session_state.log_tokens.get(table_id),
+        operations.ordered_columns(df, st.session_state.table_column_order.get(table_id))
+    )
+    if token is None:
+        # Not logged; the table stays unsaved and is saved as a whole file
+        return
+    st.session_state.log_tokens[table_id] = token
+    st.session_state.saved_version[table_id] = st.session_state.table_version[table_id]
+    st.session_state.last_saved[table_id] = datetime.now().strftime("%H:%M:%S")
+    # Sessions opening the table from now on replay the logged change
+    get_table_store().invalidate(table_id)
+
+def profile(name, rows=None):
+    """Time a phase of this rerun when profiling is enabled"""
+    return st.session_state.profiler.phase(name, rows)
+
+def table_memory():
+    """Rows and approximate bytes held by each loaded table and its undo history"""
+    undo_manager = st.session_state.undo_manager
+    return {
+        table_id: {
+            "rows": len(df),
+            "table_bytes": int(df.memory_usage(index=True, deep=False).sum()),
+            "undo_bytes": undo_manager.memory_usage(table_id),
+        }
+        for table_id, df in st.session_state.table_data.items()
+    }
+
+def finish_profile():
+    """Close this rerun's timings and send them to the log and metrics file"""
+    profiler = st.session_state.profiler
+    fields = {"session": st.session_state.session_id, "tables": table_memory()} if profiler.enabled else {}
+    record = profiler.finish(**fields)
+    if record is not None:
+        get_metrics_sink().emit(record)
+
+def show_diagnostics():
+    """Sidebar panel with the last rerun's phase timings and per-table memory"""
+    profiler = st.session_state.profiler
+    profiler.enabled = st.checkbox("Profile reruns", value=profiler.enabled, key="profile_reruns")
+    if not profiler.enabled:
+        return
+    last_run = profiler.last_run()
+    if last_run is None:
+        st.caption("Timings appear after the next rerun.")
+    else:
+        st.caption(f"Last rerun: {last_run['total_s'] * 1000:.0f} ms")
+        phases = pd.DataFrame(
+            [{"phase": name, "ms": phase["seconds"] * 1000, "calls": phase["calls"]}
+             for name, phase in last_run["phases"].items()],
+            columns=["phase", "ms", "calls"]
+        )
+        st.dataframe(phases, hide_index=True, use_container_width=True)
+        summary = pd.DataFrame(profiler.phase_summary(), columns=["phase", "runs", "mean_s", "max_s"])
+        st.caption(f"Last {len(profiler.runs)} reruns")
+        st.dataframe(summary.assign(mean_ms=summary["mean_s"] * 1000, max_ms=summary["max_s"] * 1000)
+                     [["phase", "runs", "mean_ms", "max_ms"]], hide_index=True, use_container_width=True)
+    memory = pd.DataFrame(
+        [{"table": table_label(table_id), "rows": usage["rows"],
+          "table MB": usage["table_bytes"] / 1024 / 1024, "undo MB": usage["undo_bytes"] / 1024 / 1024}
+         for table_id, usage in table_memory().items()],
+        columns=["table", "rows", "table MB", "undo MB"]
+    )
+    st.dataframe(memory, hide_index=True, use_container_width=True)
+    metrics_path = get_metrics_sink().path
+    if metrics_path:
+        st.caption(f"Writing metrics to {metrics_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
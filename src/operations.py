@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from src.data_handler import DataHandler
+from src.filter_engine import FilterEngine, Filters
+from src.ingest import ingest_upload, read_upload_header
+from src.schema import empty_column, match_dtypes
+from src.sort_index import SortKeys, compute_permutation
+from src.undo_manager import (CellChanges, ColumnReorder, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowPermutation, RowsAppended, RowsDeleted, values_differ)
+
+# UI-free table operations shared by the Streamlit app and the command line.
+# Each returns the updated table and the delta describing the change (None
+# when nothing changed), so callers can record it for undo.
+Result = Tuple[pd.DataFrame, Optional[Delta]]
+
+# How appended rows with different columns are matched to the table:
+# "align" keeps the table's columns (missing ones filled with empty strings,
+# extra ones dropped); "extend" adds the extra columns to the table
+APPEND_MODES = ("align", "extend")
+
+
+def add_column(df: pd.DataFrame, name: str, fill_value: str = "") -> Result:
+    """
+    Add a text column holding ``fill_value`` in every row
+    """
+    if not name:
+        raise ValueError("Column name is empty")
+    if name in df.columns:
+        raise ValueError(f"Column '{name}' already exists")
+    df = df.copy(deep=False)
+    df[name] = empty_column(len(df), fill_value)
+    return df, ColumnsAdded(df[[name]])
+
+
+def drop_columns(df: pd.DataFrame, columns: List[str]) -> Result:
+    if not columns:
+        return df, None
+    delta = ColumnsDropped(df, columns)
+    return delta.apply(df), delta
+
+
+def delete_rows(df: pd.DataFrame, keep: np.ndarray, reset_index: bool = True) -> Result:
+    """
+    Keep only the rows where ``keep`` is True
+    """
+    keep = np.asarray(keep, dtype=bool)
+    if keep.all():
+        return df, None
+    delta = RowsDeleted.from_mask(df, keep, reset_index=reset_index)
+    return delta.apply(df), delta
+
+
+def filter_rows(df: pd.DataFrame, filters: Filters) -> Result:
+    """
+    Keep only the rows matching every condition in ``filters``
+    """
+    mask = FilterEngine.compile_mask(df, filters)
+    if mask is None:
+        return df, None
+    return delete_rows(df, mask, reset_index=False)
+
+
+def delete_matching(df: pd.DataFrame, filters: Filters) -> Result:
+    """
+    Delete the rows matching every condition in ``filters``
+    """
+    mask = FilterEngine.compile_mask(df, filters)
+    if mask is None:
+        return df, None
+    return delete_rows(df, ~mask)
+
+
+def sort_rows(df: pd.DataFrame, keys: SortKeys, permutation: Optional[np.ndarray] = None) -> Result:
+    """
+    Reorder rows by ``keys``; pass a cached ``permutation`` to skip sorting
+    """
+    if not keys:
+        return df, None
+    if permutation is None:
+        permutation = compute_permutation(df, keys)
+    if (permutation == np.arange(len(permutation))).all():
+        return df, None
+    delta = RowPermutation(permutation)
+    return delta.apply(df), delta
+
+
+def upload_columns(df: pd.DataFrame, new_columns: List[str], mode: str = "align"
+                   ) -> Tuple[Optional[List[str]], Optional[str], List[str]]:
+    """
+    How to lay out appended rows with columns ``new_columns`` on ``df``:
+    returns ``(target_columns, fill_value, added_columns)``. Rows appended
+    to an empty table keep their own columns.
+    """
+    if mode not in APPEND_MODES:
+        raise ValueError(f"Unknown append mode: {mode}")
+    if df.empty:
+        return None, None, []
+    columns = list(df.columns)
+    if new_columns == columns or mode == "align":
+        return columns, None if new_columns == columns else "", []
+    added = [col for col in new_columns if col not in columns]
+    return columns + added, None, added
+
+
+def append_rows(df: pd.DataFrame, chunks: Iterable[pd.DataFrame], added_columns: List[str] = ()) -> Result:
+    """
+    Append ``chunks`` (already laid out with ``upload_columns``), first adding
+    ``added_columns`` to the table. The table and the chunks are combined in
+    one concatenation; the delta keeps a slice of the result rather than a
+    separate copy of the appended rows.
+    """
+    changes = []
+    if added_columns:
+        df = df.copy(deep=False)
+        for col in added_columns:
+            df[col] = empty_column(len(df))
+        changes.append(ColumnsAdded(df[list(added_columns)]))
+    dtypes_before = df.dtypes
+    # Keep the table's compact dtypes while appending. The dtypes every chunk
+    # needs (new categories, nullable integers) are settled on an empty frame
+    # first, so the table itself is converted at most once.
+    schema, pieces = df.iloc[:0], []
+    for chunk in chunks:
+        schema, chunk = match_dtypes(schema, chunk)
+        pieces.append(chunk)
+    changed = {col: dtype for col, dtype in schema.dtypes.items() if df[col].dtype != dtype}
+    if changed:
+        df = df.astype(changed)
+    categories = {col: dtype for col, dtype in schema.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    for i, piece in enumerate(pieces):
+        # Chunks matched before later categories were added get them too
+        recast = {col: dtype for col, dtype in categories.items()
+                  if col in piece.columns and piece[col].dtype != dtype}
+        if recast:
+            pieces[i] = piece.astype(recast)
+    combined = pd.concat([df, *pieces], ignore_index=isinstance(df.index, pd.RangeIndex)) if pieces else df
+    changes.append(RowsAppended(combined.iloc[len(df):], dtypes_before))
+    return combined, CompositeDelta(changes, "upload")
+
+
+def append_file(df: pd.DataFrame, source, mode: str = "align",
+                progress: Optional[Callable[[float], None]] = None, **limits) -> Result:
+    """
+    Append the rows of a CSV/Excel file (path, open file or upload), parsed
+    chunk by chunk; ``limits`` are passed on to ``ingest_upload``
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return append_file(df, f, mode, progress, **limits)
+    target_columns, fill_value, added = upload_columns(df, read_upload_header(source), mode)
+    chunks = ingest_upload(source, columns=target_columns, dtypes=df.dtypes.to_dict(),
+                           fill_value=fill_value, progress=progress, **limits)
+    return append_rows(df, chunks, added)
+
+
+def _take_rows(df: pd.DataFrame, columns: List[str], positions: np.ndarray) -> pd.DataFrame:
+    """
+    ``columns`` of the rows at ``positions``; position -1 gives missing values
+    """
+    part = df[list(columns)]
+    if (positions >= 0).all():
+        return part.take(positions).reset_index(drop=True)
+    return part.reset_index(drop=True).reindex(positions).reset_index(drop=True)
+
+
+def lookup_fill(df: pd.DataFrame, other: pd.DataFrame, positions: np.ndarray, columns: List[str],
+                overwrite: bool = False) -> Result:
+    """
+    Fill ``columns`` from the rows of ``other`` at ``positions`` (one per row
+    of ``df``, -1 for no match; see ``join_index.lookup_positions``).
+    Columns ``df`` already has only receive values where they are missing,
+    unless ``overwrite``; the others are added.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    matched = positions >= 0
+    values = _take_rows(other, columns, positions)
+    changes, added = {}, []
+    for col in columns:
+        if col not in df.columns:
+            added.append(col)
+            continue
+        old = df[col].to_numpy(dtype=object)
+        new = values[col].to_numpy(dtype=object)
+        target = matched if overwrite else matched & pd.isna(old)
+        changed = np.flatnonzero(target & values_differ(old, new))
+        if len(changed):
+            changes[col] = (changed, old[changed], new[changed])
+    deltas = []
+    if changes:
+        delta = CellChanges(changes)
+        df = delta.apply(df.copy(deep=not pd.get_option("mode.copy_on_write")))
+        deltas.append(delta)
+    if added:
+        df = df.copy(deep=False)
+        for col in added:
+            df[col] = values[col].array
+        deltas.append(ColumnsAdded(df[added]))
+    if not deltas:
+        return df, None
+    return df, CompositeDelta(deltas, "lookup fill")
+
+
+def join_tables(left: pd.DataFrame, right: pd.DataFrame, left_positions: np.ndarray, right_positions: np.ndarray,
+                columns: List[str], suffix: str = "_right") -> pd.DataFrame:
+    """
+    Rows of a join built from position pairs (see ``join_index.join_positions``):
+    every column of ``left`` followed by ``columns`` of ``right``, renamed
+    with ``suffix`` where they clash. Unmatched rows (-1) get missing values.
+    """
+    result = left.take(left_positions).reset_index(drop=True)
+    right_part = _take_rows(right, columns, np.asarray(right_positions, dtype=np.int64))
+    right_part.columns = [f"{col}{suffix}" if col in result.columns else col for col in columns]
+    return pd.concat([result, right_part], axis=1)
+
+
+def ordered_columns(df: pd.DataFrame, preferred: Optional[List[str]] = None) -> List[str]:
+    """
+    Columns of ``df`` in the preferred order, followed by any others
+    """
+    columns = [col for col in preferred or [] if col in df.columns]
+    return columns + [col for col in df.columns if col not in columns]
+
+
+def reorder_columns(df: pd.DataFrame, preferred: List[str]) -> Result:
+    """
+    Put the columns in the preferred order, followed by any others
+    """
+    columns = ordered_columns(df, preferred)
+    if columns == list(df.columns):
+        return df, None
+    delta = ColumnReorder(df.columns, columns)
+    return delta.apply(df), delta
+
+
+def save_table(data_handler: DataHandler, df: pd.DataFrame, filename: str,
+               column_order: Optional[List[str]] = None, log_token: Optional[dict] = None,
+               owner=None) -> Optional[int]:
+    """
+    Save a table in the preferred column order, in the background when the
+    handler has write-behind enabled (returning the job id). ``log_token``
+    is the change log state the table was taken at; ``owner`` (a session)
+    scopes which queued saves are coalesced.
+    """
+    return data_handler.submit_write(df, filename, columns=ordered_columns(df, column_order),
+                                     log_token=log_token, owner=owner)
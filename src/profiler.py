@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Set to 1 to profile every session from the start
+PROFILE_ENV = "TABLE_APP_PROFILE"
+# Path of a JSON-lines file receiving one record per profiled rerun
+METRICS_FILE_ENV = "TABLE_APP_METRICS_FILE"
+# Profiled reruns kept for the diagnostics panel
+MAX_PROFILED_RUNS = 50
+
+logger = logging.getLogger("table_app.profile")
+
+
+def profiling_requested() -> bool:
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+class RerunProfiler:
+    """
+    Per-session timings of the phases of each app rerun (load, upload
+    parse, editor diff, filter, sort, export encode, save...).
+
+    Phases are timed with ``phase`` and accumulate into the current rerun
+    until ``finish`` closes it. Streamlit runs widget callbacks before the
+    script, so phases timed in callbacks count towards the rerun they
+    trigger. While disabled ``phase`` is a no-op.
+    """
+
+    def __init__(self, enabled: bool = False, max_runs: int = MAX_PROFILED_RUNS):
+        self.enabled = enabled
+        self.runs: deque = deque(maxlen=max_runs)
+        self._started: Optional[float] = None
+        self._phases: Dict[str, dict] = {}
+
+    def begin(self):
+        """
+        Mark the start of a rerun (if no callback phase already did)
+        """
+        if self.enabled and self._started is None:
+            self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, rows: Optional[int] = None):
+        if not self.enabled:
+            yield
+            return
+        self.begin()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, rows)
+
+    def record(self, name: str, seconds: float, rows: Optional[int] = None):
+        """
+        Add a phase timed elsewhere, e.g. a background save
+        """
+        if not self.enabled:
+            return
+        phase = self._phases.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0})
+        phase["seconds"] += seconds
+        phase["calls"] += 1
+        if rows is not None:
+            phase["rows"] += rows
+
+    def finish(self, **fields) -> Optional[dict]:
+        """
+        Close the current rerun and return its record; ``fields`` (e.g. the
+        session id and per-table memory) are stored with it
+        """
+        if not self.enabled or self._started is None:
+            self._started, self._phases = None, {}
+            return None
+        record = {
+            "time": time.time(),
+            "total_s": time.perf_counter() - self._started,
+            "phases": {name: dict(phase, seconds=round(phase["seconds"], 6))
+                       for name, phase in self._phases.items()},
+            **fields,
+        }
+        self.runs.append(record)
+        self._started, self._phases = None, {}
+        return record
+
+    def last_run(self) -> Optional[dict]:
+        return self.runs[-1] if self.runs else None
+
+    def phase_summary(self) -> List[dict]:
+        """
+        ``[{"phase", "runs", "mean_s", "max_s"}, ...]`` over the kept reruns,
+        slowest first
+        """
+        totals: Dict[str, List[float]] = {}
+        for run in self.runs:
+            for name, phase in run["phases"].items():
+                totals.setdefault(name, []).append(phase["seconds"])
+        summary = [{"phase": name, "runs": len(times), "mean_s": sum(times) / len(times), "max_s": max(times)}
+                   for name, times in totals.items()]
+        return sorted(summary, key=lambda row: row["mean_s"], reverse=True)
+
+
+class MetricsSink:
+    """
+    Process-wide destination of rerun records: the ``table_app.profile``
+    logger (as JSON) and, when ``path`` is set, a JSON-lines metrics file
+    for offline analysis. With ``echo`` the logger writes to stderr unless
+    logging is already configured for it.
+    """
+
+    def __init__(self, path: Optional[str] = None, echo: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        if echo and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def emit(self, record: dict):
+        line = json.dumps(record, default=str)
+        logger.info(line)
+        if self.path:
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
@@ -0,0 +1,226 @@
+import json
+import os
+import uuid
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# {column: dtype name}, e.g. {"age": "Int8", "city": "category"}
+Schema = Dict[str, str]
+
+# Text columns with at most this share of distinct values become categoricals;
+# the rest are stored as Arrow-backed strings
+CATEGORY_MAX_RATIO = 0.5
+ARROW_STRING = "string[pyarrow]"
+# Sidecar holding the inferred schema, next to the table file
+SCHEMA_SUFFIX = ".schema.json"
+
+_INT_TYPES = ["int8", "int16", "int32", "int64"]
+
+
+def dtype_name(dtype) -> str:
+    """
+    Name of a dtype that ``astype`` accepts back, keeping the string storage
+    """
+    if isinstance(dtype, pd.StringDtype):
+        return f"string[{dtype.storage}]"
+    return str(dtype)
+
+
+def _smallest_int(low, high) -> str:
+    for name in _INT_TYPES:
+        info = np.iinfo(name)
+        if info.min <= low and high <= info.max:
+            return name
+    return "int64"
+
+
+def infer_column_dtype(series: pd.Series) -> str:
+    """
+    Most compact dtype that holds every value of ``series`` exactly
+    """
+    current = dtype_name(series.dtype)
+    if pd.api.types.is_bool_dtype(series):
+        return current
+    if pd.api.types.is_integer_dtype(series):
+        if isinstance(series.dtype, np.dtype) and len(series):
+            return _smallest_int(series.min(), series.max())
+        return current
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if values.empty:
+            return current
+        if (values == np.floor(values)).all() and values.min() >= -2 ** 63 and values.max() < 2 ** 63:
+            # Whole numbers read as float because of missing values
+            name = _smallest_int(values.min(), values.max())
+            return name.capitalize() if len(values) < len(series) else name
+        if series.dtype == np.float64:
+            narrowed = values.astype(np.float32).astype(np.float64)
+            if (narrowed == values).all():
+                return "float32"
+        return current
+    if pd.api.types.is_object_dtype(series):
+        values = series.dropna()
+        if values.empty or pd.api.types.infer_dtype(values, skipna=False) != "string":
+            return current
+        if values.nunique() <= CATEGORY_MAX_RATIO * len(series):
+            return "category"
+        return ARROW_STRING
+    return current
+
+
+def infer_schema(df: pd.DataFrame) -> Schema:
+    """
+    Compact dtype for every column of ``df``
+    """
+    return {str(col): infer_column_dtype(df[col]) for col in df.columns}
+
+
+def frame_schema(df: pd.DataFrame) -> Schema:
+    """
+    The dtypes ``df`` currently has
+    """
+    return {str(col): dtype_name(dtype) for col, dtype in df.dtypes.items()}
+
+
+def apply_schema(df: pd.DataFrame, schema: Schema) -> pd.DataFrame:
+    """
+    Cast ``df`` to ``schema``. Columns whose values no longer fit their
+    recorded dtype (e.g. after the file was edited elsewhere) keep the dtype
+    they were parsed with.
+    """
+    changed = {}
+    for col in df.columns:
+        target = schema.get(str(col))
+        if target is None or target == dtype_name(df[col].dtype):
+            continue
+        converted = cast_lossless(df[col], pd.api.types.pandas_dtype(target))
+        if converted is not df[col]:
+            changed[col] = converted
+    if not changed:
+        return df
+    df = df.copy(deep=False)
+    for col, series in changed.items():
+        df[col] = series
+    return df
+
+
+def optimize_dtypes(df: pd.DataFrame, schema: Optional[Schema] = None) -> Tuple[pd.DataFrame, Schema]:
+    """
+    Convert ``df`` to compact dtypes: numerics downcast, low-cardinality text
+    as categoricals and other text as Arrow-backed strings. Columns listed in
+    ``schema`` use the recorded dtype; the others are inferred. Returns the
+    converted frame and the full schema.
+    """
+    schema = dict(schema or {})
+    for col in df.columns:
+        if str(col) not in schema:
+            schema[str(col)] = infer_column_dtype(df[col])
+    return apply_schema(df, schema), schema
+
+
+def cast_lossless(series: pd.Series, dtype) -> pd.Series:
+    """
+    Cast ``series`` to ``dtype`` when that loses nothing; otherwise return it
+    unchanged
+    """
+    if series.dtype == dtype and dtype_name(series.dtype) == dtype_name(dtype):
+        return series
+    present = series.notna()
+    try:
+        if isinstance(dtype, pd.CategoricalDtype):
+            converted = series.astype(dtype)
+            return converted if converted.notna().sum() == present.sum() else series
+        if isinstance(dtype, pd.StringDtype):
+            values = series[present]
+            if values.empty or pd.api.types.infer_dtype(values, skipna=False) == "string":
+                return series.astype(dtype)
+            return series
+        if pd.api.types.is_numeric_dtype(dtype) and pd.api.types.is_numeric_dtype(series):
+            converted = series.astype(dtype)
+            if converted.isna().sum() != (~present).sum():
+                return series
+            return converted if (converted[present] == series[present]).all() else series
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            converted = pd.to_datetime(series, errors="coerce")
+            return converted if converted.notna().sum() == present.sum() else series
+        if pd.api.types.is_object_dtype(dtype):
+            return series.astype(object)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return series
+
+
+def match_dtypes(df: pd.DataFrame, rows: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Prepare ``rows`` for appending to ``df`` so concatenation keeps the
+    compact dtypes of ``df``: new values are added to categoricals, and rows
+    are cast to the table's dtypes where that loses nothing. Neither input
+    is modified.
+    """
+    table_changed, rows_changed = {}, {}
+    for col in rows.columns:
+        if col not in df.columns or rows[col].dtype == df[col].dtype:
+            continue
+        target = df[col].dtype
+        if isinstance(target, pd.CategoricalDtype):
+            missing = pd.Index(rows[col].dropna().unique()).difference(target.categories)
+            if len(missing):
+                try:
+                    table_changed[col] = df[col].cat.add_categories(missing)
+                except (TypeError, ValueError):
+                    continue
+                target = table_changed[col].dtype
+        elif (pd.api.types.is_integer_dtype(target) and isinstance(target, np.dtype)
+              and rows[col].isna().any()):
+            # Missing values in appended rows: switch to the nullable integer
+            # type instead of widening the whole column to float
+            nullable = pd.api.types.pandas_dtype(target.name.capitalize())
+            converted = cast_lossless(rows[col], nullable)
+            if converted is not rows[col]:
+                table_changed[col] = df[col].astype(nullable)
+                rows_changed[col] = converted
+            continue
+        converted = cast_lossless(rows[col], target)
+        if converted is not rows[col]:
+            rows_changed[col] = converted
+    if table_changed:
+        df = df.copy(deep=False)
+        for col, series in table_changed.items():
+            df[col] = series
+    if rows_changed:
+        rows = rows.copy(deep=False)
+        for col, series in rows_changed.items():
+            rows[col] = series
+    return df, rows
+
+
+def empty_column(length: int, fill_value: str = "") -> pd.Categorical:
+    """
+    A new text column holding one repeated value, stored as a single category
+    """
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), [fill_value])
+
+
+def schema_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + SCHEMA_SUFFIX
+
+
+def read_schema(file_path: str) -> Optional[Schema]:
+    """
+    Schema recorded next to a table file, if any
+    """
+    try:
+        with open(schema_path(file_path), "r", encoding="utf-8") as f:
+            return json.load(f).get("columns")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_schema(file_path: str, schema: Schema):
+    path = schema_path(file_path)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"columns": schema}, f, indent=2)
+    os.replace(tmp_path, path)
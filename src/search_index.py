@@ -0,0 +1,354 @@
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from src.undo_manager import (CellChanges, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowPermutation, RowsAppended, RowsDeleted)
+
+# Characters per indexed n-gram; shorter queries scan the distinct values
+NGRAM = 3
+# Posting segments kept before they are merged into one
+MAX_SEGMENTS = 8
+# Characters unpacked at once when extracting n-grams
+BLOCK_CHARS = 4_000_000
+# {label: mode} offered by the search box
+SEARCH_MODES = {"Contains": "substring", "Word starts with": "prefix"}
+
+# (sorted distinct n-grams, offsets into ids, value ids grouped by n-gram)
+Segment = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def is_text_column(series: pd.Series) -> bool:
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def _normalize(values) -> np.ndarray:
+    """
+    Values as lower-case strings, the form they are indexed and searched in
+    """
+    return pd.Series(np.asarray(values, dtype=object), dtype=object).astype(str).str.lower().to_numpy(dtype=object)
+
+
+def _ngram_pairs(values: np.ndarray, first_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distinct (n-gram, value id) pairs of ``values``, which get ids from
+    ``first_id``. Each trigram is packed into an int64 from its three code
+    points (21 bits each, enough for any Unicode character).
+    """
+    grams, ids = [], []
+    lengths = pd.Series(values, dtype=object).str.len().fillna(0).to_numpy(dtype=np.int64)
+    start = 0
+    while start < len(values):
+        # Unpack blocks into a (values, chars) code point matrix of at most
+        # BLOCK_CHARS cells, padded to the longest value of the block
+        window = np.maximum(np.maximum.accumulate(lengths[start:start + BLOCK_CHARS]), 1)
+        fits = window * np.arange(1, len(window) + 1) <= BLOCK_CHARS
+        stop = start + max(1, int(fits.sum()))
+        block = np.array(values[start:stop], dtype=str)
+        width = block.dtype.itemsize // 4
+        if width >= NGRAM:
+            points = block.view(np.uint32).reshape(len(block), width).astype(np.int64)
+            packed = points[:, :width - 2] << 42
+            packed |= points[:, 1:width - 1] << 21
+            packed |= points[:, 2:]
+            block_lengths = np.char.str_len(block)
+            valid = np.arange(width - 2)[None, :] < (block_lengths - 2)[:, None]
+            grams.append(packed[valid])
+            ids.append(np.broadcast_to(np.arange(first_id + start, first_id + stop, dtype=np.int64)[:, None],
+                                       packed.shape)[valid])
+        start = stop
+    if not grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    grams, ids = np.concatenate(grams), np.concatenate(ids)
+    order = np.lexsort((ids, grams))
+    grams, ids = grams[order], ids[order]
+    distinct = np.ones(len(grams), dtype=bool)
+    distinct[1:] = (grams[1:] != grams[:-1]) | (ids[1:] != ids[:-1])
+    return grams[distinct], ids[distinct]
+
+
+def _segment(grams: np.ndarray, ids: np.ndarray) -> Segment:
+    """
+    Posting lists from (n-gram, id) pairs sorted by n-gram
+    """
+    keys, starts = np.unique(grams, return_index=True)
+    offsets = np.append(starts, len(grams)).astype(np.int64)
+    return keys, offsets, ids.astype(np.int32)
+
+
+def _query_grams(query: str) -> np.ndarray:
+    grams, _ = _ngram_pairs(np.array([query], dtype=object), 0)
+    return np.unique(grams)
+
+
+class SearchIndex:
+    """
+    Inverted n-gram index over the text columns of one table.
+
+    Distinct values (lower-cased) get ids; each row stores the value id of
+    each text column. Posting lists map every character trigram to the ids
+    of the values containing it. A query intersects the posting lists of its
+    trigrams, verifies the few candidate values and maps them back to rows,
+    so the cost depends on the number of distinct values and matches rather
+    than on scanning every cell.
+
+    New values are indexed into extra posting segments, merged once there
+    are more than ``MAX_SEGMENTS``.
+    """
+
+    def __init__(self):
+        self.values = np.empty(0, dtype=object)
+        self._value_index = pd.Index([], dtype=object)
+        self.segments: List[Segment] = []
+        # {column: value id of every row, -1 for missing}
+        self.columns: Dict[str, np.ndarray] = {}
+        self.rows = 0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "SearchIndex":
+        index = cls()
+        index.rows = len(df)
+        index.sync_columns(df)
+        return index
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _ids_for(self, text: np.ndarray) -> np.ndarray:
+        """
+        Value ids of normalized strings, indexing the ones not seen before
+        """
+        ids = self._value_index.get_indexer(text)
+        unseen = ids < 0
+        if unseen.any():
+            new_values = pd.unique(text[unseen])
+            first_id = len(self.values)
+            self.values = np.concatenate([self.values, new_values.astype(object)])
+            self._value_index = pd.Index(self.values, dtype=object)
+            grams, value_ids = _ngram_pairs(new_values, first_id)
+            if len(grams):
+                self.segments.append(_segment(grams, value_ids))
+            if len(self.segments) > MAX_SEGMENTS:
+                self._merge_segments()
+            ids = self._value_index.get_indexer(text)
+        return ids.astype(np.int32)
+
+    def _merge_segments(self):
+        grams = np.concatenate([np.repeat(keys, np.diff(offsets)) for keys, offsets, _ in self.segments])
+        ids = np.concatenate([ids for _, _, ids in self.segments])
+        order = np.argsort(grams, kind="stable")
+        self.segments = [_segment(grams[order], ids[order])]
+
+    def _encode(self, values) -> np.ndarray:
+        """
+        Value ids of a column's cells; only its distinct values are normalized
+        """
+        codes, uniques = pd.factorize(pd.Series(values) if not isinstance(values, pd.Series) else values)
+        if not len(uniques):
+            return np.full(len(codes), -1, dtype=np.int32)
+        ids = self._ids_for(_normalize(uniques))
+        return np.where(codes >= 0, ids.take(codes, mode="clip"), -1).astype(np.int32)
+
+    def sync_columns(self, df: pd.DataFrame):
+        """
+        Index text columns of ``df`` not indexed yet and forget the others
+        """
+        for col in list(self.columns):
+            if col not in df.columns or not is_text_column(df[col]):
+                del self.columns[col]
+        for col in df.columns:
+            if col not in self.columns and is_text_column(df[col]):
+                self.columns[col] = self._encode(df[col])
+
+    def _writable(self, col: str) -> np.ndarray:
+        codes = self.columns[col]
+        if not codes.flags.writeable:
+            codes = self.columns[col] = codes.copy()
+        return codes
+
+    def append(self, rows: pd.DataFrame):
+        for col, codes in list(self.columns.items()):
+            new = self._encode(rows[col]) if col in rows.columns else np.full(len(rows), -1, dtype=np.int32)
+            self.columns[col] = np.concatenate([codes, new])
+        self.rows += len(rows)
+
+    def delete(self, positions: np.ndarray):
+        for col, codes in list(self.columns.items()):
+            self.columns[col] = np.delete(codes, positions)
+        self.rows -= len(positions)
+
+    def permute(self, permutation: np.ndarray):
+        for col, codes in list(self.columns.items()):
+            self.columns[col] = codes[permutation]
+
+    def set_cells(self, col: str, positions: np.ndarray, values: np.ndarray):
+        if col in self.columns:
+            self._writable(col)[positions] = self._encode(pd.Series(values, dtype=object))
+
+    def drop_columns(self, columns):
+        for col in columns:
+            self.columns.pop(col, None)
+
+    def matching_values(self, query: str, mode: str = "substring") -> np.ndarray:
+        """
+        Ids of the values containing ``query`` (``substring``) or having a
+        word that starts with it (``prefix``), ignoring case
+        """
+        if mode not in SEARCH_MODES.values():
+            raise ValueError(f"Unknown search mode: {mode}")
+        query = query.lower()
+        if len(query) >= NGRAM:
+            candidates = None
+            for gram in _query_grams(query):
+                postings = [ids[offsets[pos]:offsets[pos + 1]]
+                            for keys, offsets, ids in self.segments
+                            for pos in [np.searchsorted(keys, gram)] if pos < len(keys) and keys[pos] == gram]
+                found = np.concatenate(postings) if postings else np.empty(0, dtype=np.int32)
+                candidates = found if candidates is None else np.intersect1d(candidates, found, assume_unique=True)
+                if not len(candidates):
+                    return candidates
+        else:
+            candidates = np.arange(len(self.values), dtype=np.int32)
+        texts = pd.Series(self.values[candidates], dtype=object)
+        if mode == "substring":
+            matched = texts.str.contains(query, regex=False)
+        else:
+            matched = texts.str.startswith(query) | texts.str.contains(" " + query, regex=False)
+        return candidates[matched.to_numpy(dtype=bool)]
+
+    def search(self, query: str, mode: str = "substring", columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Positions of the rows with a match in any indexed column (or in ``columns``)
+        """
+        value_ids = self.matching_values(query, mode)
+        if not len(value_ids):
+            return np.empty(0, dtype=np.int64)
+        # One extra slot so that missing cells (-1) look up False
+        hit = np.zeros(len(self.values) + 1, dtype=bool)
+        hit[value_ids] = True
+        mask = np.zeros(self.rows, dtype=bool)
+        for col in columns if columns is not None else self.columns:
+            if col in self.columns:
+                mask |= hit[self.columns[col]]
+        return np.flatnonzero(mask)
+
+    def save(self, path: str, metadata: Optional[dict] = None):
+        """
+        Write the index to the directory ``path``, replacing it atomically
+        """
+        if len(self.segments) > 1:
+            self._merge_segments()
+        keys, offsets, ids = self.segments[0] if self.segments else (np.empty(0, np.int64), np.zeros(1, np.int64),
+                                                                     np.empty(0, np.int32))
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(tmp_path)
+            feather.write_feather(pa.table({"value": pa.array(self.values, type=pa.string())}),
+                                  os.path.join(tmp_path, "values.feather"), compression="uncompressed")
+            feather.write_feather(pa.table({"gram": np.repeat(keys, np.diff(offsets)), "id": ids}),
+                                  os.path.join(tmp_path, "postings.feather"), compression="uncompressed")
+            feather.write_feather(pa.table({str(col): codes for col, codes in self.columns.items()}
+                                           or {"_": np.empty(0, np.int32)}),
+                                  os.path.join(tmp_path, "rows.feather"), compression="uncompressed")
+            with open(os.path.join(tmp_path, "index.json"), "w", encoding="utf-8") as f:
+                json.dump({"rows": self.rows, "columns": [str(col) for col in self.columns],
+                           "metadata": metadata or {}}, f)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["SearchIndex", dict]:
+        """
+        Read an index written by ``save``, returning it with its metadata
+        """
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        index = cls()
+        index.rows = info["rows"]
+        index.values = feather.read_table(os.path.join(path, "values.feather"))["value"] \
+            .to_numpy(zero_copy_only=False).astype(object)
+        index._value_index = pd.Index(index.values, dtype=object)
+        postings = feather.read_table(os.path.join(path, "postings.feather"))
+        if postings.num_rows:
+            index.segments = [_segment(postings["gram"].to_numpy(), postings["id"].to_numpy())]
+        rows = feather.read_table(os.path.join(path, "rows.feather"))
+        index.columns = {col: rows[col].to_numpy() for col in info["columns"]}
+        return index, info["metadata"]
+
+
+class SearchIndexCache:
+    """
+    Search indexes cached per table, keyed by table version, built lazily on
+    the first search and updated in place by ``on_change``
+    """
+
+    def __init__(self):
+        # {table_id: {"version": version, "index": SearchIndex}}
+        self._entries: Dict[object, dict] = {}
+
+    def peek(self, table_id, version) -> Optional[SearchIndex]:
+        entry = self._entries.get(table_id)
+        return entry["index"] if entry is not None and entry["version"] == version else None
+
+    def put(self, table_id, version, index: SearchIndex):
+        self._entries[table_id] = {"version": version, "index": index}
+
+    def get(self, table_id, version, df: pd.DataFrame) -> SearchIndex:
+        """
+        Index of ``df`` at ``version``, building it if needed
+        """
+        index = self.peek(table_id, version)
+        if index is None or len(index) != len(df):
+            index = SearchIndex.build(df)
+            self.put(table_id, version, index)
+        else:
+            index.sync_columns(df)
+        return index
+
+    def invalidate(self, table_id):
+        self._entries.pop(table_id, None)
+
+    def on_change(self, table_id, old_version, new_version, delta: Optional[Delta]):
+        """
+        Carry the index over a change by updating it in place
+        """
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if entry["version"] != old_version or delta is None or not self._update(entry["index"], delta):
+            del self._entries[table_id]
+            return
+        entry["version"] = new_version
+
+    def _update(self, index: SearchIndex, delta: Delta) -> bool:
+        if isinstance(delta, CompositeDelta):
+            return all(self._update(index, inner) for inner in delta.deltas)
+        if isinstance(delta, RowsAppended):
+            index.append(delta.rows)
+        elif isinstance(delta, RowsDeleted):
+            index.delete(delta.positions)
+        elif isinstance(delta, RowPermutation):
+            index.permute(delta.permutation)
+        elif isinstance(delta, CellChanges):
+            for col, (positions, _, new) in delta.changes.items():
+                index.set_cells(col, positions, new)
+        elif isinstance(delta, ColumnsDropped):
+            index.drop_columns(delta.data.columns)
+        elif not isinstance(delta, ColumnsAdded):
+            # Added columns are indexed on the next search
+            return False
+        return True
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from src.undo_manager import (CellChanges, ColumnsAdded, ColumnsDropped, CompositeDelta, Delta,
+                              RowsAppended)
+
+# [(column, ascending), ...] in priority order
+SortKeys = List[Tuple[str, bool]]
+
+# Sort permutations kept per table
+MAX_CACHED_SORTS = 4
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    return series.astype(str).where(series.notna())
+
+
+def _factorize_key(series: pd.Series) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """
+    Codes of a sort key column into its sorted distinct values, returned
+    along with whether the values were ordered as text
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) and not series.cat.ordered:
+        # Order by value rather than by the order categories were added in
+        series = series.cat.reorder_categories(series.cat.categories.sort_values())
+    try:
+        codes, uniques = pd.factorize(series, sort=True)
+        as_text = False
+    except TypeError:
+        # Mixed types can't be ordered directly; order them as text
+        codes, uniques = pd.factorize(_as_text(series), sort=True)
+        as_text = True
+    return codes, np.asarray(uniques), as_text
+
+
+def _composite(columns: List[Tuple[np.ndarray, int, bool]], length: int) -> Optional[np.ndarray]:
+    """
+    Combine per-key ``(codes, number of distinct values, ascending)`` into
+    one int64 per row (missing values, coded -1, last); None if the combined
+    key space doesn't fit in 62 bits
+    """
+    composite = np.zeros(length, dtype=np.int64)
+    span_total = 1
+    for codes, n, ascending in columns:
+        codes = np.where(codes < 0, n, codes if ascending else n - 1 - codes).astype(np.int64)
+        span_total *= n + 1
+        if span_total > 2 ** 62:
+            return None
+        composite = composite * (n + 1) + codes
+    return composite
+
+
+def composite_codes(df: pd.DataFrame, keys: SortKeys) -> Optional[np.ndarray]:
+    """
+    Encode the sort keys of every row as one int64 whose order matches the
+    requested multi-key order (missing values last). Returns None if the
+    combined key space doesn't fit in 62 bits.
+    """
+    columns = []
+    for col, ascending in keys:
+        codes, uniques, _ = _factorize_key(df[col])
+        columns.append((codes, len(uniques), ascending))
+    return _composite(columns, len(df))
+
+
+def compute_permutation(df: pd.DataFrame, keys: SortKeys) -> np.ndarray:
+    """
+    Stable row permutation sorting ``df`` by ``keys``
+    """
+    codes = composite_codes(df, keys)
+    if codes is not None:
+        return np.argsort(codes, kind="stable")
+    key_frame = df[[col for col, _ in keys]].reset_index(drop=True)
+    return key_frame.sort_values(
+        [col for col, _ in keys], ascending=[asc for _, asc in keys], kind="stable", na_position="last"
+    ).index.to_numpy()
+
+
+def sort_state(df: pd.DataFrame, keys: SortKeys) -> dict:
+    """
+    Permutation sorting ``df`` by ``keys``, with what ``extend_sort`` needs
+    to merge appended rows into it: the composite codes in sorted order and
+    each key's sorted distinct values (``codes`` is None when the rows
+    can't be coded and appends are sorted from scratch)
+    """
+    factorized = [_factorize_key(df[col]) for col, _ in keys]
+    codes = _composite([(codes, len(uniques), ascending)
+                        for (codes, uniques, _), (_, ascending) in zip(factorized, keys)], len(df))
+    if codes is None:
+        return {"permutation": compute_permutation(df, keys), "codes": None}
+    permutation = np.argsort(codes, kind="stable")
+    if any(isinstance(df[col].dtype, pd.CategoricalDtype) and df[col].cat.ordered for col, _ in keys):
+        # Ordered categoricals sort by category rather than by value, which
+        # new values can't be merged into
+        return {"permutation": permutation, "codes": None}
+    return {"permutation": permutation, "codes": codes[permutation],
+            "uniques": [uniques for _, uniques, _ in factorized],
+            "as_text": [as_text for _, _, as_text in factorized]}
+
+
+def extend_sort(df: pd.DataFrame, keys: SortKeys, state: dict) -> dict:
+    """
+    Extend a ``sort_state`` covering the first rows of ``df`` to the rows
+    appended after them. Only the new rows are factorized, against the
+    cached distinct values; when they bring new values the cached codes are
+    renumbered (which keeps their order), and the new rows are merged into
+    the existing order without re-sorting it.
+    """
+    n_old = len(state["permutation"])
+    if state["codes"] is None:
+        return sort_state(df, keys)
+    new = df.iloc[n_old:]
+    # Per key: (codes, distinct values, ascending) of the new rows, the
+    # merged distinct values and the renumbering of the cached ones
+    new_columns, uniques_after, mappings = [], [], []
+    for (col, ascending), uniques, as_text in zip(keys, state["uniques"], state["as_text"]):
+        values = new[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if values.cat.ordered:
+                return sort_state(df, keys)
+            values = values.astype(object)
+        if as_text:
+            values = _as_text(values)
+        missing = values.isna().to_numpy()
+        present = values[~missing].to_numpy()
+        if uniques.dtype == object:
+            present = present.astype(object)
+        mapping = None
+        try:
+            # The distinct values are sorted, so new rows are located by
+            # binary search rather than by hashing the whole column
+            positions = np.searchsorted(uniques, present)
+            found = np.zeros(len(present), dtype=bool)
+            if len(uniques):
+                found = (positions < len(uniques)) & (uniques[np.minimum(positions, len(uniques) - 1)] == present)
+            if not found.all():
+                added = np.sort(pd.unique(present[~found]))
+                mapping = np.arange(len(uniques)) + np.searchsorted(added, uniques)
+                uniques = np.insert(uniques, np.searchsorted(uniques, added), added)
+                positions = np.searchsorted(uniques, present)
+        except TypeError:
+            return sort_state(df, keys)
+        codes = np.full(len(values), -1, dtype=np.int64)
+        codes[~missing] = positions
+        new_columns.append((codes, len(uniques), ascending))
+        uniques_after.append(uniques)
+        mappings.append(mapping)
+    old_codes = state["codes"]
+    if any(mapping is not None for mapping in mappings):
+        # Decode the cached codes per key and renumber them into the merged values
+        spans = [len(uniques) + 1 for uniques in state["uniques"]]
+        per_key, rest = [], old_codes
+        for span in reversed(spans):
+            per_key.append(rest % span)
+            rest = rest // span
+        per_key.reverse()
+        columns = []
+        for key_codes, uniques, mapping, (_, n_after, ascending) in zip(
+                per_key, state["uniques"], mappings, new_columns):
+            n = len(uniques)
+            missing = key_codes == n
+            positions = key_codes if ascending else n - 1 - key_codes
+            # Without cached values every cached code is missing; nothing to renumber
+            if mapping is not None and n:
+                positions = mapping[np.where(missing, 0, positions)]
+            columns.append((np.where(missing, -1, positions), n_after, ascending))
+        old_codes = _composite(columns, len(old_codes))
+        if old_codes is None:
+            return sort_state(df, keys)
+    new_codes = _composite(new_columns, len(new))
+    if new_codes is None:
+        return sort_state(df, keys)
+    order = np.argsort(new_codes, kind="stable")
+    # Equal keys go after existing rows, keeping the merge stable
+    insert_at = np.searchsorted(old_codes, new_codes[order], side="right")
+    return {"permutation": np.insert(state["permutation"], insert_at, n_old + order),
+            "codes": np.insert(old_codes, insert_at, new_codes[order]),
+            "uniques": uniques_after, "as_text": state["as_text"]}
+
+
+class SortIndexCache:
+    """
+    Sort permutations cached per table and sort keys, keyed by table version.
+    Appending rows keeps cached permutations, which are extended on next use.
+    """
+
+    def __init__(self):
+        # {table_id: {"version": version, "sorts": {keys: sort_state}}}
+        self._entries: Dict[object, dict] = {}
+
+    def get(self, table_id, version, df: pd.DataFrame, keys: SortKeys) -> np.ndarray:
+        """
+        Permutation sorting ``df`` by ``keys`` at ``version``
+        """
+        keys = [(col, bool(asc)) for col, asc in keys]
+        cache_key = tuple(keys)
+        entry = self._entries.get(table_id)
+        if entry is None or entry["version"] != version:
+            entry = self._entries[table_id] = {"version": version, "sorts": {}}
+        sorts = entry["sorts"]
+        state = sorts.pop(cache_key, None)
+        if state is None or len(state["permutation"]) > len(df):
+            state = sort_state(df, keys)
+        elif len(state["permutation"]) < len(df):
+            state = extend_sort(df, keys, state)
+        # Most recently used last; drop the oldest beyond the limit
+        sorts[cache_key] = state
+        while len(sorts) > MAX_CACHED_SORTS:
+            sorts.pop(next(iter(sorts)))
+        return state["permutation"]
+
+    def invalidate(self, table_id):
+        self._entries.pop(table_id, None)
+
+    def on_change(self, table_id, old_version, new_version, delta: Optional[Delta]):
+        """
+        Carry permutations over a change where they stay valid
+        """
+        entry = self._entries.get(table_id)
+        if entry is None:
+            return
+        if entry["version"] != old_version or delta is None or not self._update(entry["sorts"], delta):
+            del self._entries[table_id]
+            return
+        entry["version"] = new_version
+
+    def _update(self, sorts: dict, delta: Delta) -> bool:
+        if isinstance(delta, CompositeDelta):
+            return all(self._update(sorts, inner) for inner in delta.deltas)
+        if isinstance(delta, RowsAppended):
+            return True
+        if isinstance(delta, (CellChanges, ColumnsAdded, ColumnsDropped)):
+            if isinstance(delta, CellChanges):
+                touched = set(delta.changes)
+            elif isinstance(delta, ColumnsAdded):
+                touched = set(delta.columns.columns)
+            else:
+                touched = set(delta.data.columns)
+            for cache_key in [key for key in sorts if touched & {col for col, _ in key}]:
+                del sorts[cache_key]
+            return True
+        return False
@@ -1,16 +1,48 @@
+import math
+import numpy as np
 import pandas as pd
 import streamlit as st
+from typing import Callable, List, Optional, Tuple
+
+from src.aggregation import AGGREGATIONS, Aggregations, NUMERIC_AGGREGATIONS, is_numeric_column
+from src.column_stats import ColumnStatsCache, is_range_column
+from src.filter_engine import FilterEngine, Filters, parse_row_ranges
+from src.sort_index import SortKeys, compute_permutation
+from src.undo_manager import CellChanges, CompositeDelta, Delta, RowsAppended, RowsDeleted, values_differ
+
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+DEFAULT_PAGE_SIZE = 100
+# Most frequent distinct values offered by a filter multiselect
+MAX_FILTER_OPTIONS = 200
+# {label: mode} of the operations offered against another table
+JOIN_MODES = {"Lookup fill": "lookup", "Left join": "left", "Inner join": "inner"}
 
 class TableOperations:
     @staticmethod
-    def advanced_filter_dataframe(df: pd.DataFrame, tab_id: str = "") -> pd.DataFrame:
+    def advanced_filter_dataframe(df: pd.DataFrame, tab_id: str = "",
+                                  stats: Optional[Callable[[str], dict]] = None) -> pd.DataFrame:
         """
-        Advanced DataFrame filtering with multiple options
+        Advanced DataFrame filtering with multiple options.
+        ``stats`` returns cached column statistics (see ColumnStatsCache);
+        without it they are computed on every call.
         """
         if df.empty:
             return df
             
         st.markdown("### 🔍 Filtering Options")
+        filters = TableOperations.filter_conditions(df, tab_id, stats)
+        
+        # Apply all filters as one combined mask
+        return FilterEngine.apply(df, filters)
+    
+    @staticmethod
+    def filter_conditions(df: pd.DataFrame, tab_id: str = "",
+                          stats: Optional[Callable[[str], dict]] = None) -> Filters:
+        """
+        Render a filter widget per column and return the active conditions
+        """
+        if stats is None:
+            stats = lambda col: ColumnStatsCache.compute(df[col])
         columns = df.columns.tolist()
         
         # Create filters for each column
@@ -19,67 +51,134 @@ class TableOperations:
         
         for i, col in enumerate(columns):
             with cols[i % 3]:
-                if df[col].dtype in ['object', 'category']:
-                    unique_values = df[col].unique()
+                if pd.api.types.is_object_dtype(df[col]) or isinstance(df[col].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                    value_counts = stats(col)["value_counts"]
+                    candidates = value_counts.index
+                    # Only the most frequent values are offered; search to find others
+                    if len(candidates) > MAX_FILTER_OPTIONS:
+                        search = st.text_input(
+                            f"Search {col}",
+                            placeholder=f"{len(candidates)} distinct values",
+                            key=f"search_{col}_{tab_id}"
+                        )
+                        if search:
+                            candidates = candidates[candidates.astype(str).str.contains(search, case=False, regex=False)]
+                    options = list(candidates[:MAX_FILTER_OPTIONS])
+                    # Keep current selections even when a new search changes the options
+                    selected_key = f"filter_selected_{col}_{tab_id}"
+                    previous = st.session_state.get(selected_key, [])
+                    shown = set(options)
+                    options += [value for value in previous if value not in shown]
                     selected_values = st.multiselect(
                         f"Filter {col}",
-                        unique_values,
-                        default=None,
+                        options,
+                        default=previous or None,
                         key=f"filter_{col}_{tab_id}"
                     )
+                    st.session_state[selected_key] = selected_values
                     if selected_values:
                         filters[col] = selected_values
-                elif df[col].dtype in ['int64', 'float64']:
-                    min_val = float(df[col].min())
-                    max_val = float(df[col].max())
+                elif is_range_column(df[col]):
+                    column_stats = stats(col)
+                    if column_stats["min"] is None or column_stats["min"] == column_stats["max"]:
+                        continue
+                    min_val = float(column_stats["min"])
+                    max_val = float(column_stats["max"])
                     values = st.slider(
                         f"Range for {col}",
                         min_val, max_val,
                         (min_val, max_val),
                         key=f"range_{col}_{tab_id}"
                     )
-                    filters[col] = values
-        
-        # Apply filters
-        filtered_df = df.copy()
-        for col, filter_val in filters.items():
-            if isinstance(filter_val, list) and filter_val:
-                filtered_df = filtered_df[filtered_df[col].isin(filter_val)]
-            elif isinstance(filter_val, tuple) and len(filter_val) == 2:
-                filtered_df = filtered_df[
-                    (filtered_df[col] >= filter_val[0]) &
-                    (filtered_df[col] <= filter_val[1])
-                ]
-        
-        return filtered_df
+                    # A slider left at its full range doesn't filter anything
+                    if values != (min_val, max_val):
+                        filters[col] = values
+        return filters
     
     @staticmethod
-    def sort_dataframe(df: pd.DataFrame, tab_id: str = "") -> pd.DataFrame:
+    def sort_keys(df: pd.DataFrame, tab_id: str = "") -> SortKeys:
         """
-        Sort DataFrame by selected columns
+        Render multi-column sort options and return the chosen
+        [(column, ascending), ...] in priority order
         """
         if df.empty:
-            return df
+            return []
             
         st.markdown("### 🔄 Sorting Options")
         columns = df.columns.tolist()
         
-        col1, col2 = st.columns(2)
+        sort_columns = st.multiselect("Sort by (in priority order)", columns, key=f"sort_cols_{tab_id}")
+        keys = []
+        for col in sort_columns:
+            sort_order = st.radio(
+                f"Order for {col}", ["Ascending", "Descending"],
+                horizontal=True, key=f"sort_order_{col}_{tab_id}"
+            )
+            keys.append((col, sort_order == "Ascending"))
+        return keys
+
+    @staticmethod
+    def sort_dataframe(df: pd.DataFrame, tab_id: str = "") -> pd.DataFrame:
+        """
+        Sort DataFrame by selected columns
+        """
+        keys = TableOperations.sort_keys(df, tab_id)
+        if not keys:
+            return df
+        return df.take(compute_permutation(df, keys))
+
+    @staticmethod
+    def paginate(df: pd.DataFrame, key: str, order: Optional[np.ndarray] = None) -> Tuple[pd.DataFrame, int]:
+        """
+        Render page controls and return only the visible page of the
+        DataFrame along with the position of its first row.
+        With ``order`` (row positions, e.g. a sort permutation or search
+        matches) pages are taken in that order without reordering the
+        whole frame. ``df`` may also be a ``ChunkedTable``, whose pages are
+        read from disk.
+        """
+        total = len(df) if order is None else len(order)
+        page_key = f"page_{key}"
+        jump_key = f"jump_{key}"
+        
+        col1, col2, col3 = st.columns(3)
         with col1:
-            sort_column = st.selectbox("Sort by", columns, key=f"sort_col_{tab_id}")
+            page_size = st.selectbox(
+                "Rows per page", PAGE_SIZES,
+                index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                key=f"page_size_{key}"
+            )
+        n_pages = max(1, math.ceil(total / page_size))
+        if st.session_state.get(page_key, 1) > n_pages:
+            st.session_state[page_key] = n_pages
         with col2:
-            sort_order = st.radio("Order", ["Ascending", "Descending"], key=f"sort_order_{tab_id}")
+            page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1, key=page_key)
+        with col3:
+            def jump_to_row():
+                st.session_state[page_key] = min(n_pages, st.session_state[jump_key] // page_size + 1)
+            st.number_input(
+                "Jump to row", min_value=0, max_value=max(total - 1, 0), step=1,
+                key=jump_key, on_change=jump_to_row
+            )
         
-        if sort_column:
-            ascending = sort_order == "Ascending"
-            df = df.sort_values(by=sort_column, ascending=ascending)
-        
-        return df
+        start = (int(page) - 1) * page_size
+        if order is None:
+            page_df = df.iloc[start:start + page_size] if isinstance(df, pd.DataFrame) else df.rows(start, start + page_size)
+        else:
+            page_df = df.take(order[start:start + page_size])
+        if total:
+            st.caption(f"Rows {start}–{start + len(page_df) - 1} of {total}")
+        else:
+            st.caption("No rows")
+        return page_df, start
 
     @staticmethod
-    def editable_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    def editable_dataframe(df: pd.DataFrame, key: Optional[str] = None,
+                           on_change: Optional[Callable] = None, args: tuple = ()) -> pd.DataFrame:
         """
-        Create an editable Streamlit DataFrame
+        Create an editable Streamlit DataFrame.
+        ``on_change`` receives ``args`` when the user edits the table; the
+        change set itself is in ``st.session_state[key]``.
         """
         if df.empty:
             st.info("No data to display. Add some data to get started.")
@@ -88,38 +187,175 @@ class TableOperations:
         return st.data_editor(
             df,
             num_rows="dynamic",  # Allow adding/deleting rows
-            column_config={col: st.column_config.Column() for col in df.columns},
-            height=400
+            # Categorical columns are edited as free text rather than picked
+            # from their existing values
+            column_config={
+                col: st.column_config.TextColumn() if isinstance(df[col].dtype, pd.CategoricalDtype)
+                else st.column_config.Column()
+                for col in df.columns
+            },
+            key=key,
+            on_change=on_change,
+            args=args,
+            height=400,
+            use_container_width=True
         )
+
+    @staticmethod
+    def apply_editor_changes(master: pd.DataFrame, changes: dict, start: int = 0) -> Tuple[pd.DataFrame, Optional[Delta]]:
+        """
+        Apply a data editor change set (``edited_rows``, ``added_rows`` and
+        ``deleted_rows``, with row positions relative to the displayed page
+        starting at ``start``) to the full table. Only the touched cells and
+        rows are read or written. Returns the updated table and the delta.
+        """
+        deltas = []
+        
+        # Group edited cells by column: {column: ([positions], [values])}
+        edits = {}
+        for row, row_changes in changes.get("edited_rows", {}).items():
+            for col, value in row_changes.items():
+                if col in master.columns:
+                    positions, values = edits.setdefault(col, ([], []))
+                    positions.append(start + int(row))
+                    values.append(value)
+        cell_changes = {}
+        for col, (positions, values) in edits.items():
+            positions = np.asarray(positions, dtype=np.int64)
+            if pd.api.types.is_datetime64_any_dtype(master[col]):
+                values = pd.to_datetime(pd.Series(values), errors="coerce")
+            old = master[col].iloc[positions].to_numpy(dtype=object)
+            new = np.asarray(values, dtype=object)
+            differs = values_differ(old, new)
+            if differs.any():
+                cell_changes[col] = (positions[differs], old[differs], new[differs])
+        if cell_changes:
+            delta = CellChanges(cell_changes)
+            master = delta.apply(master)
+            deltas.append(delta)
+        
+        deleted = [start + int(row) for row in changes.get("deleted_rows", [])]
+        if deleted:
+            keep = np.ones(len(master), dtype=bool)
+            keep[deleted] = False
+            delta = RowsDeleted.from_mask(master, keep)
+            master = delta.apply(master)
+            deltas.append(delta)
+        
+        added_rows = changes.get("added_rows", [])
+        if added_rows:
+            added = pd.DataFrame(
+                [{col: value for col, value in row.items() if col in master.columns} for row in added_rows],
+                columns=master.columns
+            ).infer_objects()
+            if not isinstance(master.index, pd.RangeIndex) and pd.api.types.is_integer_dtype(master.index):
+                # Give new rows fresh ids after the largest existing one
+                next_id = int(master.index.max()) + 1 if len(master) else 0
+                added.index = pd.RangeIndex(next_id, next_id + len(added))
+            delta = RowsAppended(added, master.dtypes)
+            master = delta.apply(master)
+            deltas.append(delta)
+        
+        if not deltas:
+            return master, None
+        return master, CompositeDelta(deltas, "edit cells")
     
     @staticmethod
-    def batch_delete_rows(df: pd.DataFrame) -> pd.DataFrame:
+    def join_settings(df: pd.DataFrame, other: pd.DataFrame, tab_id: str = "") -> Optional[dict]:
+        """
+        Render lookup/join options against another table. Returns
+        ``{"mode", "left_on", "right_on", "columns", "overwrite"}`` once key
+        columns and columns to bring in are chosen, else None.
         """
-        Allow users to select and delete multiple rows
+        mode = st.radio("Operation", list(JOIN_MODES), horizontal=True, key=f"join_mode_{tab_id}")
+        col1, col2 = st.columns(2)
+        with col1:
+            left_on = st.multiselect("Key columns in this table", df.columns.tolist(), key=f"join_left_on_{tab_id}")
+        with col2:
+            right_on = st.multiselect("Matching columns in the other table", other.columns.tolist(),
+                                      key=f"join_right_on_{tab_id}")
+        if not left_on or len(left_on) != len(right_on):
+            st.info("ℹ️ Choose the same number of key columns in both tables, in matching order.")
+            return None
+        columns = st.multiselect(
+            "Columns to bring in", [col for col in other.columns if col not in right_on],
+            key=f"join_columns_{tab_id}"
+        )
+        if not columns:
+            return None
+        overwrite = JOIN_MODES[mode] == "lookup" and st.checkbox(
+            "Overwrite existing values", key=f"join_overwrite_{tab_id}"
+        )
+        return {"mode": JOIN_MODES[mode], "left_on": left_on, "right_on": right_on,
+                "columns": columns, "overwrite": overwrite}
+    
+    @staticmethod
+    def aggregate_settings(df: pd.DataFrame, tab_id: str = "") -> Optional[Tuple[List[str], Aggregations]]:
+        """
+        Render group-by options and return ``(keys, {column: [aggregation]})``
+        once group and value columns are chosen, else None
         """
         if df.empty:
-            return df
+            return None
+        
+        st.markdown("### 📊 Aggregation Options")
+        columns = df.columns.tolist()
+        keys = st.multiselect("Group by", columns, key=f"agg_keys_{tab_id}")
+        values = st.multiselect("Aggregate columns", [col for col in columns if col not in keys],
+                                key=f"agg_values_{tab_id}")
+        labels = st.multiselect("Aggregations", list(AGGREGATIONS), default=["Sum", "Mean", "Count"],
+                                key=f"agg_funcs_{tab_id}")
+        if not keys or not values or not labels:
+            st.info("ℹ️ Choose columns to group by, columns to aggregate and aggregations.")
+            return None
+        funcs = [AGGREGATIONS[label] for label in labels]
+        aggregations = {}
+        for col in values:
+            # Sums, means and extremes only apply to numeric columns
+            aggregations[col] = funcs if is_numeric_column(df[col]) else \
+                [func for func in funcs if func not in NUMERIC_AGGREGATIONS]
+        return keys, aggregations
+    
+    @staticmethod
+    def batch_delete_rows(df: pd.DataFrame, tab_id: str = "",
+                          stats: Optional[Callable[[str], dict]] = None) -> Optional[np.ndarray]:
+        """
+        Let users delete rows matching filter conditions or within row
+        ranges. Returns the keep-mask once deletion is confirmed, else None.
+        """
+        if df.empty:
+            return None
             
         st.markdown("### 🗑️ Batch Delete Rows")
-        
-        # Create a checkbox column for selection
-        selection_col = "Select"
-        
-        # Show dataframe with selection checkboxes
-        st.dataframe(df, use_container_width=True)
-        
-        # Get row indices to delete
-        row_indices = st.multiselect(
-            "Select rows to delete (by index)",
-            options=df.index.tolist(),
-            help="Select the row indices you want to delete"
+        mode = st.radio(
+            "Delete rows", ["Matching conditions", "By row position"],
+            horizontal=True, key=f"delete_mode_{tab_id}"
         )
         
-        if row_indices:
-            if st.button("Delete Selected Rows"):
-                # Remove selected rows
-                new_df = df.drop(row_indices).reset_index(drop=True)
-                st.success(f"Deleted {len(row_indices)} rows!")
-                return new_df
+        delete = None
+        if mode == "Matching conditions":
+            filters = TableOperations.filter_conditions(df, f"delete_{tab_id}", stats)
+            delete = FilterEngine.compile_mask(df, filters)
+        else:
+            text = st.text_input(
+                "Row positions to delete",
+                placeholder=f"e.g. 0-99, 250, 1000- (0 to {len(df) - 1})",
+                key=f"delete_ranges_{tab_id}"
+            )
+            if text:
+                try:
+                    delete = FilterEngine.range_mask(len(df), parse_row_ranges(text))
+                except ValueError as e:
+                    st.error(str(e))
+        
+        count = int(delete.sum()) if delete is not None else 0
+        if not count:
+            st.info("ℹ️ Set conditions or row positions to choose rows to delete.")
+            return None
         
-        return df
\ No newline at end of file
+        # Preview the first matching rows without copying the rest
+        st.warning(f"⚠️ {count} of {len(df)} rows will be deleted")
+        st.dataframe(df.take(np.flatnonzero(delete)[:PAGE_SIZES[0]]), use_container_width=True)
+        if st.button(f"🗑️ Delete {count} Rows", key=f"delete_button_{tab_id}"):
+            return ~delete
+        return None
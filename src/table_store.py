@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src.data_handler import DataHandler
+
+# Sessions not seen for this long no longer hold their tables
+SESSION_IDLE_SECONDS = 30 * 60
+
+
+class SharedTableStore:
+    """
+    Process-wide tables shared by all sessions.
+
+    Each file is loaded once. ``acquire`` hands a session a shallow view of
+    the shared table; with pandas copy-on-write enabled
+    (``mode.copy_on_write``) a session's edits copy only the columns they
+    touch, leaving the shared table and other sessions untouched. Without
+    copy-on-write sessions get private deep copies instead.
+
+    Tables are reference counted by session. Sessions refresh their hold
+    with ``touch``; a table is evicted once no session has used it for
+    ``idle_seconds``.
+    """
+
+    def __init__(self, data_handler: DataHandler, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.data_handler = data_handler
+        self.idle_seconds = idle_seconds
+        # {filename: {"df": DataFrame, "loaded": time, "sessions": {session_id: last_seen}}}
+        self._tables: Dict[str, dict] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _view(df: pd.DataFrame) -> pd.DataFrame:
+        return df.copy(deep=not pd.get_option("mode.copy_on_write"))
+
+    def acquire(self, filename: str, session_id: str) -> pd.DataFrame:
+        """
+        A session's own view of the shared table, loading it on first use
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(filename, threading.Lock())
+        # Concurrent first requests wait for a single load
+        with load_lock:
+            with self._lock:
+                entry = self._tables.get(filename)
+                if entry is not None:
+                    entry["sessions"][session_id] = time.time()
+            if entry is None:
+                df = self.data_handler.read_file(filename)
+                if df.empty and len(df.columns) == 0:
+                    # Missing or unreadable files are not shared
+                    return df
+                entry = {"df": df, "loaded": time.time(), "sessions": {session_id: time.time()}}
+                with self._lock:
+                    self._tables[filename] = entry
+        self.evict_idle()
+        return self._view(entry["df"])
+
+    def acquire_many(self, filenames: List[str], session_id: str) -> Iterator[Tuple[str, pd.DataFrame, float]]:
+        """
+        ``acquire`` several tables, loading those not yet shared concurrently.
+        Yields ``(filename, df, seconds)`` as each table becomes available.
+        """
+        return self.data_handler.read_files(filenames, read_func=lambda filename: self.acquire(filename, session_id))
+
+    def release(self, filename: str, session_id: str):
+        """
+        Drop a session's hold on a table, evicting it if no session is left
+        """
+        with self._lock:
+            entry = self._tables.get(filename)
+            if entry is None:
+                return
+            entry["sessions"].pop(session_id, None)
+            if not entry["sessions"]:
+                del self._tables[filename]
+
+    def touch(self, session_id: str):
+        """
+        Mark every table a session holds as in use
+        """
+        now = time.time()
+        with self._lock:
+            for entry in self._tables.values():
+                if session_id in entry["sessions"]:
+                    entry["sessions"][session_id] = now
+
+    def invalidate(self, filename: str):
+        """
+        Forget the shared copy of a table, e.g. after it was saved; the next
+        ``acquire`` reloads it from disk. Views already handed out stay valid.
+        """
+        with self._lock:
+            self._tables.pop(filename, None)
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """
+        Drop idle sessions and the tables no session holds any more,
+        returning the evicted filenames
+        """
+        now = time.time() if now is None else now
+        evicted = []
+        with self._lock:
+            for filename, entry in list(self._tables.items()):
+                sessions = entry["sessions"]
+                for session_id in [s for s, seen in sessions.items() if now - seen > self.idle_seconds]:
+                    del sessions[session_id]
+                if not sessions:
+                    del self._tables[filename]
+                    evicted.append(filename)
+        return evicted
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Sessions holding each shared table and its resident size
+        """
+        with self._lock:
+            return {
+                filename: {
+                    "sessions": len(entry["sessions"]),
+                    "loaded": entry["loaded"],
+                    "nbytes": int(entry["df"].memory_usage(index=True, deep=False).sum()),
+                }
+                for filename, entry in self._tables.items()
+            }
@@ -0,0 +1,489 @@
+import itertools
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.schema import cast_lossless, match_dtypes
+
+
+def _frame_nbytes(obj) -> int:
+    """
+    Approximate resident size of a DataFrame, Series or Index
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.RangeIndex):
+        return 64
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=False))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    return 64
+
+
+def _coerce_for_column(df: pd.DataFrame, col: str, values: np.ndarray) -> np.ndarray:
+    """
+    Prepare values for writing into ``df[col]``, widening the column first
+    when the values do not fit its dtype (e.g. text typed into a numeric column)
+    """
+    series = df[col]
+    values = pd.Series(values, dtype=object).infer_objects()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        missing = pd.Index(values.dropna().unique()).difference(series.cat.categories)
+        if len(missing):
+            df[col] = series.cat.add_categories(missing)
+        return values.to_numpy()
+    if values.dtype == series.dtype or values.isna().all():
+        return values.to_numpy()
+    # Values that fit the column's compact dtype keep it (e.g. 36 into int16)
+    converted = cast_lossless(values, series.dtype)
+    if converted.dtype == series.dtype:
+        return converted.to_numpy()
+    if isinstance(series.dtype, np.dtype) and isinstance(values.dtype, np.dtype):
+        target = np.result_type(series.dtype, values.dtype)
+    else:
+        try:
+            return pd.array(values, dtype=series.dtype)
+        except (TypeError, ValueError):
+            target = np.dtype(object)
+    if target != series.dtype:
+        df[col] = series.astype(target)
+    return values.to_numpy(dtype=target)
+
+
+class Delta:
+    """
+    A reversible change to a single table.
+
+    ``apply`` replays the change (redo) and ``revert`` undoes it. Both take the
+    current DataFrame and return the resulting one, which may be the same
+    object when the change can be made in place.
+    """
+    label = "change"
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        raise NotImplementedError
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+
+class CellChanges(Delta):
+    """
+    Changed cell values, stored per column as row positions plus old/new values
+    """
+    label = "edit cells"
+
+    def __init__(self, changes: Dict[str, tuple], added_categories: Optional[Dict[str, list]] = None):
+        # {column: (positions, old_values, new_values)}
+        self.changes = {
+            col: (np.asarray(pos, dtype=np.int64), np.asarray(old, dtype=object), np.asarray(new, dtype=object))
+            for col, (pos, old, new) in changes.items()
+        }
+        # {column: categories the new values added}, removed again on revert
+        self.added_categories = dict(added_categories or {})
+
+    def _write(self, df: pd.DataFrame, use_old: bool) -> pd.DataFrame:
+        for col, (pos, old, new) in self.changes.items():
+            col_idx = df.columns.get_loc(col)
+            categorical = isinstance(df[col].dtype, pd.CategoricalDtype)
+            categories = df[col].cat.categories if categorical else None
+            values = _coerce_for_column(df, col, old if use_old else new)
+            df.iloc[pos, col_idx] = values
+            if categorical and not use_old:
+                added = df[col].cat.categories.difference(categories, sort=False)
+                if len(added):
+                    self.added_categories[col] = list(added)
+            elif categorical and self.added_categories.get(col):
+                self._remove_categories(df, col, self.added_categories[col])
+        return df
+
+    @staticmethod
+    def _remove_categories(df: pd.DataFrame, col: str, added: list):
+        series = df[col]
+        unused = [value for value in added if value in series.cat.categories]
+        if unused and not series.isin(unused).any():
+            df[col] = series.cat.remove_categories(unused)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._write(df, use_old=False)
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._write(df, use_old=True)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(pos.nbytes + 16 * (len(old) + len(new)) for pos, old, new in self.changes.values())
+
+
+class RowsAppended(Delta):
+    """
+    Rows added to the end of a table
+    """
+    label = "append rows"
+
+    def __init__(self, rows: pd.DataFrame, dtypes_before: Optional[pd.Series] = None):
+        self.rows = rows
+        self.dtypes_before = dtypes_before
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        df, rows = match_dtypes(df, self.rows)
+        return pd.concat([df, rows], ignore_index=isinstance(df.index, pd.RangeIndex))
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.iloc[:len(df) - len(self.rows)]
+        if self.dtypes_before is not None:
+            # Appending may have widened column dtypes; narrow them back
+            changed = {col: dtype for col, dtype in self.dtypes_before.items()
+                       if col in df.columns and df[col].dtype != dtype}
+            if changed:
+                df = df.astype(changed)
+        return df
+
+    @property
+    def nbytes(self) -> int:
+        return _frame_nbytes(self.rows)
+
+
+class RowsDeleted(Delta):
+    """
+    Rows removed from a table, stored as their former positions and values
+    """
+    label = "delete rows"
+
+    def __init__(self, positions: Sequence[int], rows: pd.DataFrame,
+                 index_before: pd.Index, index_after: pd.Index):
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.rows = rows
+        self.index_before = index_before
+        self.index_after = index_after
+
+    @classmethod
+    def from_mask(cls, df: pd.DataFrame, keep: np.ndarray, reset_index: bool = False) -> "RowsDeleted":
+        keep = np.asarray(keep, dtype=bool)
+        positions = np.flatnonzero(~keep)
+        index_after = pd.RangeIndex(int(keep.sum())) if reset_index else df.index[keep]
+        return cls(positions, df.iloc[positions], df.index, index_after)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        keep = np.ones(len(df), dtype=bool)
+        keep[self.positions] = False
+        result = df.iloc[keep]
+        result.index = self.index_after
+        return result
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        total = len(df) + len(self.positions)
+        kept_positions = np.setdiff1d(np.arange(total), self.positions, assume_unique=True)
+        combined = pd.concat([df, self.rows[df.columns]], ignore_index=True)
+        order = np.argsort(np.concatenate([kept_positions, self.positions]), kind="stable")
+        result = combined.iloc[order]
+        result.index = self.index_before
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return (self.positions.nbytes + _frame_nbytes(self.rows)
+                + _frame_nbytes(self.index_before) + _frame_nbytes(self.index_after))
+
+
+class ColumnsAdded(Delta):
+    """
+    Columns appended to the right of a table
+    """
+    label = "add columns"
+
+    def __init__(self, columns: pd.DataFrame):
+        self.columns = columns
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        for col in self.columns.columns:
+            df[col] = self.columns[col].values
+        return df
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.drop(columns=list(self.columns.columns))
+
+    @property
+    def nbytes(self) -> int:
+        return _frame_nbytes(self.columns)
+
+
+class ColumnsDropped(Delta):
+    """
+    Columns removed from a table, stored with their former positions
+    """
+    label = "delete columns"
+
+    def __init__(self, df: pd.DataFrame, columns: List[str]):
+        self.positions = [df.columns.get_loc(col) for col in columns]
+        self.data = df[columns]
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.drop(columns=list(self.data.columns))
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        for pos, col in sorted(zip(self.positions, self.data.columns)):
+            df.insert(min(pos, len(df.columns)), col, self.data[col].values)
+        return df
+
+    @property
+    def nbytes(self) -> int:
+        return _frame_nbytes(self.data)
+
+
+class RowPermutation(Delta):
+    """
+    Rows reordered (e.g. by a sort), stored as a permutation of positions
+    """
+    label = "reorder rows"
+
+    def __init__(self, permutation: Sequence[int]):
+        self.permutation = np.asarray(permutation, dtype=np.int64)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.take(self.permutation)
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.take(np.argsort(self.permutation, kind="stable"))
+
+    @property
+    def nbytes(self) -> int:
+        return self.permutation.nbytes
+
+
+class ColumnReorder(Delta):
+    """
+    Columns reordered without changing their values
+    """
+    label = "reorder columns"
+
+    def __init__(self, before: List[str], after: List[str]):
+        self.before = list(before)
+        self.after = list(after)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[self.after]
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[self.before]
+
+
+class Snapshot(Delta):
+    """
+    Fallback for changes that cannot be expressed as a compact delta
+    """
+    label = "replace table"
+
+    def __init__(self, before: pd.DataFrame, after: pd.DataFrame):
+        self.before = before
+        self.after = after
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.after.copy()
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.before.copy()
+
+    @property
+    def nbytes(self) -> int:
+        return _frame_nbytes(self.before) + _frame_nbytes(self.after)
+
+
+class CompositeDelta(Delta):
+    """
+    Several deltas recorded as one undo step
+    """
+
+    def __init__(self, deltas: List[Delta], label: str = "change"):
+        self.deltas = deltas
+        self.label = label
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        for delta in self.deltas:
+            df = delta.apply(df)
+        return df
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        for delta in reversed(self.deltas):
+            df = delta.revert(df)
+        return df
+
+    @property
+    def nbytes(self) -> int:
+        return sum(delta.nbytes for delta in self.deltas)
+
+
+def values_differ(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """
+    Element-wise "value changed" mask for two object arrays, treating
+    missing values as equal to each other
+    """
+    old_na = pd.isna(old)
+    new_na = pd.isna(new)
+    # Only compare present values; comparisons with pd.NA are ambiguous
+    both = ~(old_na | new_na)
+    equal = np.zeros(len(old), dtype=bool)
+    equal[both] = old[both] == new[both]
+    return ~(equal | (old_na & new_na))
+
+
+def diff_frames(before: pd.DataFrame, after: pd.DataFrame) -> Delta:
+    """
+    Build the most compact delta that turns ``before`` into ``after``
+    """
+    if list(before.columns) != list(after.columns):
+        if set(before.columns) == set(after.columns) and before.index.equals(after.index):
+            reorder = ColumnReorder(before.columns, after.columns)
+            inner = diff_frames(before[list(after.columns)], after)
+            if isinstance(inner, CompositeDelta) and not inner.deltas:
+                return reorder
+            return CompositeDelta([reorder, inner], "edit table")
+        return Snapshot(before, after)
+
+    deltas: List[Delta] = []
+    if not before.index.equals(after.index):
+        n_common = min(len(before), len(after))
+        if len(after) > len(before) and before.index.equals(after.index[:n_common]):
+            deltas.append(RowsAppended(after.iloc[n_common:], before.dtypes))
+        elif after.index.isin(before.index).all() and after.index.is_unique and before.index.is_unique:
+            keep = before.index.isin(after.index)
+            if not before.index[keep].equals(after.index):
+                return Snapshot(before, after)
+            deltas.append(RowsDeleted.from_mask(before, keep))
+        else:
+            return Snapshot(before, after)
+
+    # Compare the rows both frames share, column by column
+    common = before.index.intersection(after.index, sort=False) if deltas else before.index
+    changes = {}
+    if len(common):
+        positions_after = after.index.get_indexer(common)
+        for col in before.columns:
+            old = (before.loc[common, col] if deltas else before[col]).to_numpy(dtype=object)
+            new = (after[col].iloc[positions_after] if deltas else after[col]).to_numpy(dtype=object)
+            differs = values_differ(old, new)
+            if differs.any():
+                rel = np.flatnonzero(differs)
+                changes[col] = (positions_after[rel], old[rel], new[rel])
+    if changes:
+        added_categories = {}
+        for col in changes:
+            if isinstance(before[col].dtype, pd.CategoricalDtype) and isinstance(after[col].dtype, pd.CategoricalDtype):
+                added = after[col].cat.categories.difference(before[col].cat.categories, sort=False)
+                if len(added):
+                    added_categories[col] = list(added)
+        # Cell edits are addressed against the post-structure frame, so they
+        # must be applied after (and reverted before) the structural change
+        deltas.append(CellChanges(changes, added_categories))
+
+    if len(deltas) == 1:
+        return deltas[0]
+    return CompositeDelta(deltas, "edit table")
+
+
+class UndoManager:
+    """
+    Per-table undo/redo history of compact deltas with a shared memory budget.
+
+    When the recorded history exceeds ``max_bytes`` the oldest entries across
+    all tables are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 100):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._undo: Dict[object, deque] = {}
+        self._redo: Dict[object, deque] = {}
+        self._counter = itertools.count()
+
+    def record(self, table_id, delta: Optional[Delta]):
+        """
+        Record a change that has already been applied to the table
+        """
+        if delta is None or (isinstance(delta, CompositeDelta) and not delta.deltas):
+            return
+        stack = self._undo.setdefault(table_id, deque())
+        stack.append((next(self._counter), delta))
+        self._redo[table_id] = deque()
+        while len(stack) > self.max_entries:
+            stack.popleft()
+        self._evict()
+
+    def undo(self, table_id, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Revert the latest change to a table and return the restored frame
+        """
+        if not self.can_undo(table_id):
+            return df
+        seq, delta = self._undo[table_id].pop()
+        df = delta.revert(df)
+        self._redo.setdefault(table_id, deque()).append((seq, delta))
+        return df
+
+    def redo(self, table_id, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Re-apply the latest undone change to a table
+        """
+        if not self.can_redo(table_id):
+            return df
+        seq, delta = self._redo[table_id].pop()
+        df = delta.apply(df)
+        self._undo[table_id].append((seq, delta))
+        return df
+
+    def peek(self, table_id, redo: bool = False) -> Optional[Delta]:
+        """
+        The delta the next ``undo`` would revert (or ``redo`` re-apply)
+        """
+        stack = (self._redo if redo else self._undo).get(table_id)
+        return stack[-1][1] if stack else None
+
+    def can_undo(self, table_id) -> bool:
+        return bool(self._undo.get(table_id))
+
+    def can_redo(self, table_id) -> bool:
+        return bool(self._redo.get(table_id))
+
+    def last_label(self, table_id) -> Optional[str]:
+        if not self.can_undo(table_id):
+            return None
+        return self._undo[table_id][-1][1].label
+
+    def clear(self, table_id=None):
+        if table_id is None:
+            self._undo.clear()
+            self._redo.clear()
+        else:
+            self._undo.pop(table_id, None)
+            self._redo.pop(table_id, None)
+
+    def memory_usage(self, table_id=None) -> int:
+        """
+        Approximate bytes held by the history of one or all tables
+        """
+        stacks = [self._undo, self._redo]
+        ids = [table_id] if table_id is not None else set(self._undo) | set(self._redo)
+        return sum(delta.nbytes for stack in stacks for tid in ids for _, delta in stack.get(tid, ()))
+
+    def _evict(self):
+        total = self.memory_usage()
+        while total > self.max_bytes:
+            # Find the oldest entry across every table's undo and redo stacks
+            oldest = None
+            for stacks in (self._undo, self._redo):
+                for tid, stack in stacks.items():
+                    if stack and (oldest is None or stack[0][0] < oldest[0]):
+                        oldest = (stack[0][0], stack)
+            if oldest is None:
+                break
+            _, delta = oldest[1].popleft()
+            total -= delta.nbytes
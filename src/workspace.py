@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.data_handler import CACHE_DIR, COLUMNAR_EXTENSION, DataHandler
+
+# Optional file in base_path setting the order and labels of tables:
+# {"tables": [{"file": "table1.csv", "label": "Customers"}, ...]}
+MANIFEST_NAME = "workspace.json"
+TABLE_EXTENSIONS = ('.csv', '.xls', '.xlsx', COLUMNAR_EXTENSION)
+# Temporary files left by interrupted atomic writes
+_TEMP_NAME = re.compile(r"\.[0-9a-f]{32}\.tmp")
+DEFAULT_COLUMNS = ["Column1", "Column2", "Column3"]
+
+
+class Workspace:
+    """
+    The tables available in ``DataHandler.base_path``.
+
+    Tables are discovered by listing the directory, which is only re-read
+    when its modification time changes, so the cost of a rerun does not
+    depend on the number of tables. A ``workspace.json`` manifest may order
+    and label them; tables it doesn't mention follow in name order.
+    """
+
+    def __init__(self, data_handler: DataHandler):
+        self.data_handler = data_handler
+        self._lock = threading.Lock()
+        self._listing_key = None
+        self._tables: List[dict] = []
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.data_handler.base_path, MANIFEST_NAME)
+
+    @staticmethod
+    def is_table_file(name: str) -> bool:
+        return name.endswith(TABLE_EXTENSIONS) and not name.startswith('.') and not _TEMP_NAME.search(name)
+
+    def _read_manifest(self) -> List[dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("tables", [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    def tables(self) -> List[dict]:
+        """
+        ``[{"file": filename, "label": label}, ...]`` in display order
+        """
+        base_path = self.data_handler.base_path
+        try:
+            listing_key = (os.stat(base_path).st_mtime_ns,
+                           os.stat(self.manifest_path).st_mtime_ns if os.path.exists(self.manifest_path) else None)
+        except OSError:
+            return []
+        with self._lock:
+            if listing_key != self._listing_key:
+                files = sorted(entry.name for entry in os.scandir(base_path)
+                               if entry.name != CACHE_DIR and self.is_table_file(entry.name))
+                present = set(files)
+                tables, listed = [], set()
+                for entry in self._read_manifest():
+                    filename = entry.get("file")
+                    if filename in present and filename not in listed:
+                        tables.append({"file": filename, "label": entry.get("label") or self.default_label(filename)})
+                        listed.add(filename)
+                tables += [{"file": filename, "label": self.default_label(filename)}
+                           for filename in files if filename not in listed]
+                # Labels identify tables in the UI, so keep them unique
+                seen = set()
+                for table in tables:
+                    if table["label"] in seen:
+                        table["label"] = table["file"]
+                    seen.add(table["label"])
+                self._tables = tables
+                self._listing_key = listing_key
+            return list(self._tables)
+
+    def labels(self) -> Dict[str, str]:
+        """
+        ``{filename: label}`` for every table
+        """
+        return {table["file"]: table["label"] for table in self.tables()}
+
+    @staticmethod
+    def default_label(filename: str) -> str:
+        return os.path.splitext(filename)[0]
+
+    def create_table(self, name: str, columns: Optional[List[str]] = None,
+                     data: Optional[pd.DataFrame] = None) -> Optional[str]:
+        """
+        Create a CSV table holding ``data`` (empty by default), returning its
+        filename (None if it exists or could not be written). Names that
+        would leave the data directory raise ValueError.
+        """
+        if not name.strip():
+            raise ValueError("Table name is empty")
+        if any(part in name for part in ("/", "\\", "..")) or name.startswith("."):
+            raise ValueError(f"Table name '{name}' can't contain '/', '\\', '..' or start with '.'")
+        filename = name if name.endswith(TABLE_EXTENSIONS) else f"{name}.csv"
+        if os.path.exists(os.path.join(self.data_handler.base_path, filename)):
+            return None
+        df = data if data is not None else pd.DataFrame(columns=columns or DEFAULT_COLUMNS)
+        return filename if self.data_handler.write_file(df, filename) else None
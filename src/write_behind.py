@@ -0,0 +1,115 @@
+import atexit
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+# Completed job records kept for status polling
+MAX_FINISHED_JOBS = 1000
+
+
+class WriteBehindWriter:
+    """
+    Dedicated writer thread that persists DataFrame snapshots in the background.
+
+    Submitting a file that already has a queued (not yet started) write
+    from the same owner (e.g. a session) replaces that write, so repeated
+    saves of the same table are coalesced into one. Writes from different
+    owners are all made, in order. Job status can be polled with ``status``.
+    """
+
+    def __init__(self, write_func: Callable[..., bool]):
+        # write_func(df, filename, columns=None, progress=None, **options) -> bool
+        self._write_func = write_func
+        # {(owner, filename): job} in submission order
+        self._pending: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._jobs: "OrderedDict[int, dict]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, df: pd.DataFrame, filename: str, columns: Optional[List[str]] = None,
+               owner=None, **options) -> int:
+        """
+        Queue a snapshot of ``df`` for writing and return its job id;
+        ``options`` are passed on to the write function
+        """
+        # Under copy-on-write a shallow copy is already an immutable snapshot
+        snapshot = df.copy(deep=not pd.get_option("mode.copy_on_write"))
+        with self._cond:
+            job_id = next(self._ids)
+            job = {"id": job_id, "filename": filename, "state": "pending", "progress": 0.0,
+                   "submitted": time.time(), "started": None, "finished": None, "df": snapshot, "columns": columns, "options": options}
+            replaced = self._pending.pop((owner, filename), None)
+            if replaced is not None:
+                # The newer snapshot supersedes the queued one
+                replaced.update(state="superseded", df=None, superseded_by=job_id)
+            self._pending[(owner, filename)] = job
+            self._jobs[job_id] = job
+            self._cond.notify()
+        return job_id
+
+    def status(self, job_id: int) -> Optional[dict]:
+        """
+        Current state of a job: pending, writing, done, failed or superseded
+        (in which case ``superseded_by`` names the job that replaced it)
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key not in ("df", "columns", "options")}
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending) + (1 if self._busy else 0)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every queued write has finished
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                _, job = self._pending.popitem(last=False)
+                job.update(state="writing", started=time.time())
+                self._busy = True
+
+            def report(fraction, job=job):
+                job["progress"] = fraction
+
+            try:
+                ok = self._write_func(job["df"], job["filename"], columns=job["columns"], progress=report,
+                                      **job["options"])
+            except Exception as e:
+                print(f"Background write of {job['filename']} failed: {e}")
+                ok = False
+
+            with self._cond:
+                job.update(state="done" if ok else "failed", progress=1.0 if ok else job["progress"],
+                           finished=time.time(), df=None, columns=None, options=None)
+                self._busy = False
+                self._trim_jobs()
+                self._cond.notify_all()
+
+    def _trim_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["state"] not in ("pending", "writing")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.aggregation import AggregationCache, aggregate
+from src.operations import append_rows
+from src.schema import optimize_dtypes
+from src.undo_manager import RowPermutation
+
+AGGREGATIONS = {"price": ["sum", "mean", "min", "max", "count"], "name": ["count", "nunique"]}
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table(n, seed):
+    rng = np.random.default_rng(seed)
+    price = rng.integers(0, 100, n).astype(float)
+    price[::9] = np.nan
+    city = rng.choice(["Boston", "Chicago", "Denver", "Austin"], n)
+    # Each city has only some kinds, so most key combinations never occur
+    kind = np.where(np.isin(city, ["Boston", "Chicago"]), rng.choice(["a", "b"], n), "c")
+    return pd.DataFrame({
+        "city": city,
+        "kind": kind,
+        "name": rng.choice(["Jane", "Bob", "Alice", "Tom"], n),
+        "price": price,
+    })
+
+
+def by_keys(result, keys):
+    result = result.astype({key: object for key in keys})
+    return result.sort_values(keys).reset_index(drop=True)
+
+
+def assert_same_groups(result, expected, keys):
+    pd.testing.assert_frame_equal(by_keys(result, keys), by_keys(expected, keys), check_dtype=False)
+
+
+@pytest.mark.parametrize("keys", [["city"], ["city", "kind"]])
+def test_incremental_aggregates_equal_a_recompute_after_appends(keys):
+    # Text keys become categorical, as when a table is loaded
+    df, _ = optimize_dtypes(make_table(200, 0))
+    assert isinstance(df["city"].dtype, pd.CategoricalDtype)
+    cache = AggregationCache()
+    cache.get("t", 0, df, keys, AGGREGATIONS)
+    for version, rows in enumerate([make_table(5, 1), make_table(40, 2)], start=1):
+        # Appended as uploads are, keeping the categorical keys
+        df, delta = append_rows(df, [rows])
+        cache.on_change("t", version - 1, version, delta)
+        result = cache.get("t", version, df, keys, AGGREGATIONS)
+        assert (result["rows"] > 0).all()
+        assert_same_groups(result, aggregate(df, keys, AGGREGATIONS), keys)
+
+
+def test_aggregates_survive_a_row_permutation():
+    df, _ = optimize_dtypes(make_table(100, 3))
+    cache = AggregationCache()
+    keys = ["kind"]
+    expected = cache.get("t", 0, df, keys, AGGREGATIONS)
+    delta = RowPermutation(np.random.default_rng(4).permutation(len(df)))
+    df = delta.apply(df)
+    cache.on_change("t", 0, 1, delta)
+    assert_same_groups(cache.get("t", 1, df, keys, AGGREGATIONS), expected, keys)
@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.change_log import APPLY, REVERT, ChangeLog, replay
+from src.data_handler import DataHandler
+from src.undo_manager import CellChanges, RowPermutation, RowsAppended
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table():
+    return pd.DataFrame({"name": ["Jane", "Bob", "Alice"], "age": [30, 35, 28]})
+
+
+def edit(name_from, name_to, position):
+    return CellChanges({"name": ([position], [name_from], [name_to])})
+
+
+def test_replay_applies_and_reverts_in_order(tmp_path):
+    log = ChangeLog(str(tmp_path / "t.log"))
+    log.create({"file": 1})
+    log.append(APPLY, edit("Jane", "Janet", 0))
+    log.append(APPLY, RowPermutation([2, 1, 0]))
+    log.append(REVERT, RowPermutation([2, 1, 0]))
+    log.append(APPLY, RowsAppended(pd.DataFrame({"name": ["Tom"], "age": [41]})))
+    assert log.position() == 4 and log.entry_count() == 4
+    result = replay(make_table(), ChangeLog(log.path).entries())
+    assert list(result["name"]) == ["Janet", "Bob", "Alice", "Tom"]
+
+
+def test_truncated_trailing_record_is_dropped_and_overwritten(tmp_path):
+    log = ChangeLog(str(tmp_path / "t.log"))
+    log.create({"file": 1})
+    log.append(APPLY, edit("Jane", "Janet", 0))
+    log.append(APPLY, edit("Bob", "Rob", 1))
+    # A crash in the middle of writing the last record
+    size = os.path.getsize(log.path)
+    with open(log.path, "r+b") as f:
+        f.truncate(size - 5)
+    reopened = ChangeLog(log.path)
+    assert reopened.entry_count() == 1
+    assert list(replay(make_table(), reopened.entries())["name"]) == ["Janet", "Bob", "Alice"]
+    # The next entry replaces the torn record
+    reopened.append(APPLY, edit("Alice", "Ali", 2))
+    assert list(replay(make_table(), ChangeLog(log.path).entries())["name"]) == ["Janet", "Bob", "Ali"]
+
+
+def test_crc_mismatch_stops_at_the_corrupt_record(tmp_path):
+    log = ChangeLog(str(tmp_path / "t.log"))
+    log.create({"file": 1})
+    log.append(APPLY, edit("Jane", "Janet", 0))
+    log.append(APPLY, edit("Bob", "Rob", 1))
+    with open(log.path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    reopened = ChangeLog(log.path)
+    assert reopened.entry_count() == 1
+    assert list(replay(make_table(), reopened.entries())["name"]) == ["Janet", "Bob", "Alice"]
+
+
+def load(handler, filename):
+    df = handler.read_file(filename)
+    return df, DataHandler.pop_log_token(df)
+
+
+def test_read_after_crash_replays_logged_changes(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True)
+    handler.write_file(make_table(), "t.csv")
+    df, token = load(handler, "t.csv")
+    delta = edit("Jane", "Janet", 0)
+    df = delta.apply(df)
+    token = handler.log_change("t.csv", APPLY, delta, df, token)
+    delta = RowPermutation([2, 1, 0])
+    df = delta.apply(df)
+    handler.log_change("t.csv", APPLY, delta, df, token)
+    # A new process after a crash: the file was never rewritten
+    reloaded, _ = load(DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True), "t.csv")
+    assert list(reloaded["name"]) == ["Alice", "Bob", "Janet"]
+    assert list(pd.read_csv(tmp_path / "t.csv")["name"]) == ["Jane", "Bob", "Alice"]
+
+
+def test_save_keeps_entries_logged_after_its_snapshot(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True)
+    handler.write_file(make_table(), "t.csv")
+    df, token = load(handler, "t.csv")
+    delta = edit("Jane", "Janet", 0)
+    df = delta.apply(df)
+    token = handler.log_change("t.csv", APPLY, delta, df, token)
+    # A save is taken here, while a change is logged before it is written
+    snapshot, snapshot_token = df.copy(deep=False), token
+    delta = edit("Bob", "Rob", 1)
+    df = delta.apply(df)
+    token = handler.log_change("t.csv", APPLY, delta, df, token)
+    assert handler.write_file(snapshot, "t.csv", log_token=snapshot_token)
+    assert list(pd.read_csv(tmp_path / "t.csv")["name"]) == ["Janet", "Bob", "Alice"]
+    assert handler.log_status("t.csv")["entries"] == 1
+    reloaded, _ = load(DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True), "t.csv")
+    assert list(reloaded["name"]) == ["Janet", "Rob", "Alice"]
+    # The session's token stays valid for its next change
+    delta = edit("Alice", "Ali", 2)
+    df = delta.apply(df)
+    new_token = handler.log_change("t.csv", APPLY, delta, df, token)
+    assert new_token["log"] == token["log"] and handler.log_status("t.csv")["entries"] == 2
+
+
+def test_save_of_a_snapshot_older_than_a_replaced_log_is_skipped(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True)
+    handler.write_file(make_table(), "t.csv")
+    df, token = load(handler, "t.csv")
+    stale_token = {**token, "log": "another-log"}
+    delta = edit("Jane", "Janet", 0)
+    handler.log_change("t.csv", APPLY, delta, delta.apply(df), token)
+    assert not handler.write_file(make_table(), "t.csv", log_token=stale_token)
+    reloaded, _ = load(handler, "t.csv")
+    assert list(reloaded["name"]) == ["Janet", "Bob", "Alice"]
+
+
+def test_save_without_token_clears_the_log(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False, change_log=True)
+    handler.write_file(make_table(), "t.csv")
+    df, token = load(handler, "t.csv")
+    delta = edit("Jane", "Janet", 0)
+    df = delta.apply(df)
+    handler.log_change("t.csv", APPLY, delta, df, token)
+    assert handler.write_file(df, "t.csv")
+    assert handler.log_status("t.csv") is None
+    assert list(load(handler, "t.csv")[0]["name"]) == ["Janet", "Bob", "Alice"]
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.aggregation import aggregate
+from src.chunked_table import ChunkedTable
+from src.column_stats import ColumnStatsCache
+from src.columnar_store import ColumnarStore
+from src.filter_engine import FilterEngine
+from src.schema import optimize_dtypes
+from src.sort_index import compute_permutation
+
+AGGREGATIONS = {"price": ["sum", "mean", "min", "max", "count"], "name": ["count", "nunique"]}
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table(n, seed):
+    rng = np.random.default_rng(seed)
+    city = rng.choice(["Boston", "Chicago", "Denver", "Austin"], n)
+    price = rng.integers(0, 100, n).astype(float)
+    price[::9] = np.nan
+    return pd.DataFrame({
+        "city": city,
+        # Each city has only some kinds, so most key combinations never occur
+        "kind": np.where(np.isin(city, ["Boston", "Chicago"]), rng.choice(["a", "b"], n), "c"),
+        "name": rng.choice(["Jane", "Bob", "Alice", "Tom"], n),
+        "price": price,
+    })
+
+
+@pytest.fixture
+def tables(tmp_path):
+    """The same rows in memory and as a store of several categorical parts"""
+    chunks = [optimize_dtypes(make_table(n, seed))[0] for seed, n in enumerate([300, 120, 7])]
+    store = ColumnarStore(str(tmp_path / "t.columnar"))
+    store.write_parts(chunks)
+    df = pd.concat([chunk.astype({"city": object, "kind": object, "name": object}) for chunk in chunks],
+                   ignore_index=True)
+    return df, ChunkedTable(store)
+
+
+def by_keys(result, keys):
+    result = result.astype({key: object for key in keys})
+    return result.sort_values(keys).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("keys", [["city"], ["city", "kind"]])
+def test_aggregate_equals_in_memory(tables, keys):
+    df, table = tables
+    result = table.aggregate(keys, AGGREGATIONS)
+    assert (result["rows"] > 0).all()
+    pd.testing.assert_frame_equal(by_keys(result, keys), by_keys(aggregate(df, keys, AGGREGATIONS), keys),
+                                  check_dtype=False)
+
+
+def test_filter_sort_and_stats_equal_in_memory(tables):
+    df, table = tables
+    filters = {"city": ["Boston", "Denver"], "price": (10, 60)}
+    assert np.array_equal(table.filter_positions(filters), np.flatnonzero(FilterEngine.compile_mask(df, filters)))
+    keys = [("kind", True), ("price", False)]
+    assert np.array_equal(table.sort_permutation(keys), compute_permutation(df, keys))
+    stats = table.column_stats("city")
+    assert stats["count"] == len(df)
+    assert stats["value_counts"].sort_index().to_dict() == df["city"].value_counts().sort_index().to_dict()
+    stats = table.column_stats("price")
+    assert (stats["min"], stats["max"], stats["null_count"]) == (df["price"].min(), df["price"].max(),
+                                                                 df["price"].isna().sum())
+    page = table.rows(295, 305)
+    assert list(page["name"].astype(object)) == list(df["name"].iloc[295:305])
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.column_stats import ColumnStatsCache
+from src.operations import append_rows
+from src.schema import optimize_dtypes
+from src.undo_manager import CellChanges, CompositeDelta, RowPermutation, RowsAppended
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table(n, seed):
+    rng = np.random.default_rng(seed)
+    price = rng.integers(0, 100, n).astype(float)
+    price[::7] = np.nan
+    return pd.DataFrame({
+        "city": rng.choice(["Boston", "Chicago", "Denver"], n),
+        "price": price,
+        "name": pd.Series(rng.choice(["Jane", "Bob", None], n), dtype=object),
+    })
+
+
+def assert_stats_equal(stats, expected):
+    assert {key: value for key, value in stats.items() if key != "value_counts"} == \
+        {key: value for key, value in expected.items() if key != "value_counts"}
+    if expected["value_counts"] is None:
+        assert stats["value_counts"] is None
+    else:
+        assert stats["value_counts"].to_dict() == expected["value_counts"].to_dict()
+
+
+def change(cache, df, version, delta):
+    df = delta.apply(df)
+    cache.on_change("t", version, version + 1, delta)
+    return df, version + 1
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_stats_after_appends_equal_a_recompute(optimize):
+    df = make_table(100, 0)
+    if optimize:
+        df, _ = optimize_dtypes(df)
+    cache = ColumnStatsCache()
+    for col in df.columns:
+        cache.get("t", 0, df, col)
+    version = 0
+    for seed in (1, 2):
+        rows = make_table(20, seed)
+        rows.loc[0, "city"] = "Austin"
+        rows.loc[1, "price"] = 250.0
+        if optimize:
+            # Appended as uploads are, keeping the compact dtypes
+            df, delta = append_rows(df, [rows])
+            cache.on_change("t", version, version + 1, delta)
+            version += 1
+        else:
+            df, version = change(cache, df, version, RowsAppended(rows, df.dtypes))
+        for col in df.columns:
+            assert_stats_equal(cache.get("t", version, df, col), ColumnStatsCache.compute(df[col]))
+
+
+def test_cell_changes_drop_only_the_edited_columns():
+    df = make_table(50, 3)
+    cache = ColumnStatsCache()
+    city_stats = cache.get("t", 0, df, "city")
+    cache.get("t", 0, df, "price")
+    delta = CompositeDelta([
+        CellChanges({"price": ([0, 3], df["price"].to_numpy()[[0, 3]], [-5.0, 500.0])}),
+        RowPermutation(np.arange(len(df))[::-1]),
+    ])
+    df, version = change(cache, df, 0, delta)
+    assert cache.get("t", version, df, "city") is city_stats
+    stats = cache.get("t", version, df, "price")
+    assert (stats["min"], stats["max"]) == (-5.0, 500.0)
+    assert_stats_equal(stats, ColumnStatsCache.compute(df["price"]))
+
+
+def test_append_changing_the_column_kind_recomputes():
+    df = pd.DataFrame({"v": [1.0, 2.0, np.nan]})
+    cache = ColumnStatsCache()
+    cache.get("t", 0, df, "v")
+    df, version = change(cache, df, 0, RowsAppended(pd.DataFrame({"v": ["x"]})))
+    stats = cache.get("t", version, df, "v")
+    assert_stats_equal(stats, ColumnStatsCache.compute(df["v"]))
+    assert stats["value_counts"] is not None
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.columnar_store import ColumnarStore
+from src.data_handler import DataHandler
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table(n, start=0):
+    return pd.DataFrame({
+        "id": np.arange(start, start + n, dtype=np.int64),
+        "price": np.linspace(0, 1, n),
+        "city": pd.Categorical(np.where(np.arange(n) % 2, "Boston", "Chicago")),
+        "name": [f"row {i}" for i in range(start, start + n)],
+    })
+
+
+def test_parts_append_and_reload(tmp_path):
+    store = ColumnarStore(str(tmp_path / "t.arrow"))
+    assert not store.exists() and store.num_rows == 0
+    store.write(make_table(100), {"note": "first"})
+    store.append(make_table(50, start=100))
+    manifest = store.read_manifest()
+    assert [part["rows"] for part in manifest["parts"]] == [100, 50]
+    assert manifest["metadata"] == {"note": "first"}
+    # A fresh store over the same directory sees both parts
+    reopened = ColumnarStore(store.path)
+    expected = pd.concat([make_table(100), make_table(50, start=100)], ignore_index=True)
+    pd.testing.assert_frame_equal(reopened.read(), expected)
+    assert reopened.num_rows == 150 and reopened.nbytes > 0
+    pd.testing.assert_frame_equal(reopened.read(["price", "id"]), expected[["price", "id"]])
+    assert sum(len(batch) for batch in reopened.iter_batches(["id"])) == 150
+
+
+def test_take_gathers_rows_across_parts_in_order(tmp_path):
+    store = ColumnarStore(str(tmp_path / "t.arrow"))
+    store.write_parts([make_table(10), make_table(10, start=10), make_table(10, start=20)])
+    positions = np.array([25, 3, 14, 3, 29])
+    taken = store.take(positions, ["id", "name"])
+    assert list(taken.index) == list(positions)
+    assert list(taken["id"]) == list(positions)
+    assert list(taken["name"]) == [f"row {i}" for i in positions]
+
+
+def test_numeric_batches_are_read_from_the_memory_map(tmp_path):
+    store = ColumnarStore(str(tmp_path / "t.arrow"))
+    store.write(make_table(200_000))
+    before = pa.total_allocated_bytes()
+    total = 0.0
+    for batch in store.iter_batches(["id", "price"]):
+        total += batch["price"].sum()
+        # Zero-copy: nothing is allocated for the batch's columns
+        assert pa.total_allocated_bytes() == before
+    assert total == pytest.approx(make_table(200_000)["price"].sum())
+
+
+def test_append_with_other_columns_is_rejected(tmp_path):
+    store = ColumnarStore(str(tmp_path / "t.arrow"))
+    store.write(make_table(5))
+    with pytest.raises(ValueError):
+        store.append(make_table(5).drop(columns=["name"]))
+    assert store.num_rows == 5
+
+
+def test_rewrite_replaces_the_parts(tmp_path):
+    store = ColumnarStore(str(tmp_path / "t.arrow"))
+    store.write_parts([make_table(5), make_table(5, start=5)])
+    store.write(make_table(3))
+    assert [part["rows"] for part in store.read_manifest()["parts"]] == [3]
+    assert len(list((tmp_path / "t.arrow").glob("*.feather"))) == 1
+    store.clear()
+    assert not store.exists() and store.read().empty
+
+
+def test_data_handler_round_trip(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False)
+    df = make_table(20)
+    assert handler.write_file(df, "t.arrow", columns=["name", "id"])
+    pd.testing.assert_frame_equal(handler.read_file("t.arrow"), df[["name", "id"]])
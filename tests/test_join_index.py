@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.join_index import KeyIndex, KeyIndexCache, join_positions, lookup_positions
+from src.undo_manager import RowPermutation, RowsAppended, RowsDeleted
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "product": pd.Series(rng.choice(["Laptop", "Phone", "Desk", None], n), dtype=object),
+        "region": pd.Categorical(rng.choice(["north", "south"], n)),
+        "price": rng.integers(0, 100, n),
+    })
+
+
+def expected_pairs(left, right, columns, how):
+    """Join pairs from a brute-force scan, in probe order"""
+    left_keys = list(zip(*(left[col].astype(object) for col in columns)))
+    right_keys = list(zip(*(right[col].astype(object) for col in columns)))
+    pairs = []
+    for i, key in enumerate(left_keys):
+        matches = [] if any(pd.isna(value) for value in key) else [
+            j for j, other in enumerate(right_keys) if other == key
+        ]
+        if not matches and how == "left":
+            matches = [-1]
+        pairs.extend((i, j) for j in matches)
+    return pairs
+
+
+def assert_join(probe, build, left, right, columns):
+    for how in ("inner", "left"):
+        probe_positions, build_positions = join_positions(probe, build, how)
+        assert list(zip(probe_positions, build_positions)) == expected_pairs(left, right, columns, how)
+    first = [matches[0][1] if matches else -1 for matches in (
+        [pair for pair in expected_pairs(left, right, columns, "inner") if pair[0] == i] for i in range(len(left))
+    )]
+    assert list(lookup_positions(probe, build)) == first
+
+
+@pytest.mark.parametrize("columns", [["product"], ["product", "region"]])
+def test_join_and_lookup_match_a_brute_force_scan(columns):
+    left, right = make_table(60, 0), make_table(40, 1)
+    assert_join(KeyIndex.build(left, columns), KeyIndex.build(right, columns), left, right, columns)
+
+
+def test_entirely_missing_keys_match_nothing():
+    blank = pd.DataFrame({"product": [np.nan] * 3, "price": [1.0, 2.0, 3.0]})
+    other = pd.DataFrame({"product": ["Laptop", "Phone"], "price": [1200, 800]})
+    for left, right in ((blank, other), (other, blank), (blank, blank)):
+        probe, build = KeyIndex.build(left, ["product"]), KeyIndex.build(right, ["product"])
+        assert list(lookup_positions(probe, build)) == [-1] * len(left)
+        probe_positions, build_positions = join_positions(probe, build, "left")
+        assert list(probe_positions) == list(range(len(left))) and list(build_positions) == [-1] * len(left)
+        assert len(join_positions(probe, build, "inner")[0]) == 0
+
+
+def test_cached_index_follows_append_delete_and_permute():
+    cache = KeyIndexCache()
+    columns = ["product", "region"]
+    df, right = make_table(50, 2), make_table(30, 3)
+    build = KeyIndex.build(right, columns)
+    cache.get("t", 0, df, columns)
+    new_rows = make_table(10, 4)
+    new_rows.loc[0, "product"] = "Lamp"
+    delta = RowsAppended(new_rows)
+    df = delta.apply(df)
+    cache.on_change("t", 0, 1, delta)
+    delta = RowsDeleted.from_mask(df, np.arange(len(df)) % 4 != 0, reset_index=True)
+    df = delta.apply(df)
+    cache.on_change("t", 1, 2, delta)
+    delta = RowPermutation(np.random.default_rng(5).permutation(len(df)))
+    df = delta.apply(df)
+    cache.on_change("t", 2, 3, delta)
+    index = cache.get("t", 3, df, columns)
+    assert np.array_equal(index.codes >= 0, KeyIndex.build(df, columns).codes >= 0)
+    assert_join(index, build, df, right, columns)
+    # And as the build side
+    assert_join(build, index, right, df, columns)
@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import operations
+from src.data_handler import DataHandler
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table():
+    return pd.DataFrame({
+        "city": pd.Categorical(["Boston", "Chicago"]),
+        "age": np.array([30, 35], dtype=np.int16),
+        "name": ["Jane", "Bob"],
+    })
+
+
+def test_append_rows_single_copy_with_compact_dtypes():
+    df = make_table()
+    chunks = [
+        pd.DataFrame({"city": ["Boston", "Denver"], "age": [40, 41], "name": ["Ann", "Tom"]}),
+        pd.DataFrame({"city": ["Austin", None], "age": [50, np.nan], "name": ["Sue", "Joe"]}),
+    ]
+    result, delta = operations.append_rows(df, chunks)
+    assert list(result["city"].astype(object).fillna("")) == ["Boston", "Chicago", "Boston", "Denver", "Austin", ""]
+    assert isinstance(result["city"].dtype, pd.CategoricalDtype)
+    assert result["age"].dtype == "Int16"
+    # The delta's rows are a slice of the result, not another copy
+    appended = delta.deltas[-1].rows
+    assert np.shares_memory(appended["name"].to_numpy(), result["name"].to_numpy())
+    reverted = delta.revert(result)
+    assert reverted.equals(df) and reverted.dtypes.equals(df.dtypes)
+    assert delta.apply(df).equals(result)
+
+
+def test_append_file_from_path_and_upload_agree(tmp_path):
+    csv = "name,age,country\nAnn,40,US\nTom,,UK\n"
+    path = tmp_path / "rows.csv"
+    path.write_text(csv)
+    upload = io.BytesIO(csv.encode())
+    upload.name = "rows.csv"
+    from_path, _ = operations.append_file(make_table(), str(path), mode="extend")
+    from_upload, delta = operations.append_file(make_table(), upload, mode="extend")
+    assert from_path.equals(from_upload)
+    assert list(from_path.columns) == ["city", "age", "name", "country"]
+    assert len(from_path) == 4
+    assert delta.revert(from_upload).equals(make_table())
+
+
+def test_reordered_columns_are_kept_when_saving(tmp_path):
+    df = make_table()
+    assert operations.ordered_columns(df, ["name", "missing", "city"]) == ["name", "city", "age"]
+    reordered, delta = operations.reorder_columns(df, ["name", "city"])
+    assert list(reordered.columns) == ["name", "city", "age"]
+    assert list(delta.revert(reordered).columns) == list(df.columns)
+    assert operations.reorder_columns(reordered, ["name"]) == (reordered, None)
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False)
+    # A column added after the order was chosen follows the chosen ones
+    df = df.assign(country=["US", "UK"])
+    operations.save_table(handler, df, "t.csv", list(reordered.columns))
+    assert list(pd.read_csv(tmp_path / "t.csv").columns) == ["name", "city", "age", "country"]
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_handler import DataHandler
+from src.schema import (apply_schema, frame_schema, match_dtypes, optimize_dtypes, read_schema, schema_path,
+                        write_schema)
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table():
+    return pd.DataFrame({
+        "city": ["Boston", "Chicago", "Boston", "Boston", None, "Chicago"],
+        "name": ["Jane", "Bob", "Alice", "Tom", "Sue", "Joe"],
+        "age": [30, 35, 28, 41, 50, 33],
+        "score": [1.0, np.nan, 3.0, 4.0, 5.0, 6.0],
+        "price": [1.5, 2.25, 3.0, 4.5, 5.0, 6.0],
+        "big": [10 ** 12, 0, 1, 2, 3, 4],
+    })
+
+
+def test_optimize_dtypes_picks_compact_lossless_dtypes():
+    df = make_table()
+    optimized, schema = optimize_dtypes(df)
+    assert schema == {"city": "category", "name": "string[pyarrow]", "age": "int8", "score": "Int8",
+                      "price": "float32", "big": "int64"}
+    assert frame_schema(optimized) == schema
+    for col in df.columns:
+        assert list(optimized[col].astype(object).where(optimized[col].notna(), None)) == \
+            list(df[col].astype(object).where(df[col].notna(), None))
+    assert optimized.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+
+
+def test_recorded_schema_is_used_and_values_that_no_longer_fit_keep_their_dtype():
+    df = make_table()
+    df.loc[0, "age"] = 1000
+    optimized, schema = optimize_dtypes(df, {"age": "int8", "price": "float64"})
+    assert schema["age"] == "int8" and optimized["age"].dtype == np.int64
+    assert optimized["price"].dtype == np.float64
+    assert apply_schema(optimized, frame_schema(optimized)) is optimized
+
+
+def test_schema_sidecar_round_trip(tmp_path):
+    file_path = str(tmp_path / "t.csv")
+    assert read_schema(file_path) is None
+    write_schema(file_path, {"age": "Int16", "city": "category"})
+    assert read_schema(file_path) == {"age": "Int16", "city": "category"}
+    with open(schema_path(file_path), "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert read_schema(file_path) is None
+
+
+def test_tables_reload_with_their_recorded_dtypes(tmp_path):
+    handler = DataHandler(base_path=str(tmp_path), use_cache=False, optimize_dtypes=True)
+    df, _ = optimize_dtypes(make_table())
+    # Dtypes chosen in the app, not the ones inference would pick
+    df = df.astype({"age": "int32", "name": object}).astype({"name": "category"})
+    assert handler.write_file(df, "t.csv")
+    assert read_schema(str(tmp_path / "t.csv")) == frame_schema(df)
+    for reader in (handler, DataHandler(base_path=str(tmp_path), use_cache=True, optimize_dtypes=True)):
+        reloaded = reader.read_file("t.csv")
+        assert frame_schema(reloaded) == frame_schema(df)
+        pd.testing.assert_frame_equal(reloaded, df)
+    # Served from the columnar cache on the next read
+    cached = DataHandler(base_path=str(tmp_path), use_cache=True, optimize_dtypes=True).read_file("t.csv")
+    assert frame_schema(cached) == frame_schema(df)
+
+
+def test_match_dtypes_keeps_compact_dtypes_of_the_table():
+    df, _ = optimize_dtypes(make_table())
+    rows = pd.DataFrame({"city": ["Denver"], "name": ["Ann"], "age": [np.nan], "score": [7.0],
+                         "price": [8.5], "big": [5]})
+    matched_df, matched_rows = match_dtypes(df, rows)
+    assert "Denver" in matched_df["city"].cat.categories
+    assert matched_df["age"].dtype == "Int8" and matched_rows["age"].dtype == "Int8"
+    assert matched_rows["price"].dtype == np.float32
+    # Neither input is modified
+    assert "Denver" not in df["city"].cat.categories and rows["age"].dtype == np.float64
+    combined = pd.concat([matched_df, matched_rows], ignore_index=True)
+    assert combined["city"].dtype == matched_df["city"].dtype
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import search_index
+from src.search_index import SearchIndex
+
+
+def brute_force(df, query, mode):
+    mask = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        text = df[col].dropna().astype(str).str.lower()
+        if mode == "substring":
+            hits = text.str.contains(query.lower(), regex=False)
+        else:
+            hits = text.str.startswith(query.lower()) | text.str.contains(" " + query.lower(), regex=False)
+        mask[df.index.get_indexer(hits.index[hits])] = True
+    return np.flatnonzero(mask)
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    words = np.array(["alpha", "Beta", "gamma ray", "delta", "épsilon", "zeta function", "eta", "theta"])
+    n = 5_000
+    name = pd.Series([f"{a} {b}{i}" for i, (a, b) in enumerate(zip(rng.choice(words, n), rng.choice(words, n)))],
+                     dtype=object)
+    name[rng.choice(n, 100, replace=False)] = None
+    return pd.DataFrame({"name": name, "tag": rng.choice(words, n), "n": np.arange(n)})
+
+
+@pytest.mark.parametrize("query,mode", [
+    ("amm", "substring"), ("ta f", "substring"), ("BETA4", "substring"), ("ps", "substring"),
+    ("ze", "prefix"), ("ray", "prefix"), ("a", "substring"), ("nothing here", "substring"),
+])
+def test_search_over_several_blocks_matches_brute_force(monkeypatch, table, query, mode):
+    # Small blocks so that n-grams are extracted over many blocks
+    monkeypatch.setattr(search_index, "BLOCK_CHARS", 1_000)
+    index = SearchIndex.build(table)
+    assert np.array_equal(index.search(query, mode), brute_force(table[["name", "tag"]], query, mode))
+
+
+def test_search_after_append_and_delete(table):
+    index = SearchIndex.build(table.iloc[:3_000])
+    index.append(table.iloc[3_000:])
+    index.delete(np.arange(0, 5_000, 7))
+    expected = table.drop(index=np.arange(0, 5_000, 7)).reset_index(drop=True)
+    assert np.array_equal(index.search("lta t"), brute_force(expected[["name", "tag"]], "lta t", "substring"))
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sort_index import SortIndexCache, compute_permutation, extend_sort, sort_state
+from src.undo_manager import RowsAppended
+
+
+def make_table(n, seed):
+    rng = np.random.default_rng(seed)
+    city = pd.Series(rng.choice(["Boston", "Chicago", "Denver", "Austin", None], n), dtype=object)
+    return pd.DataFrame({
+        "city": city,
+        "category": pd.Categorical(rng.choice(["b", "a", "c"], n)),
+        "price": np.round(rng.normal(size=n), 1),
+        "qty": rng.integers(0, 5, n),
+    })
+
+
+@pytest.mark.parametrize("keys", [
+    [("price", True)],
+    [("city", True), ("price", False)],
+    [("category", False), ("qty", True), ("city", False)],
+])
+def test_extended_sort_equals_full_recompute(keys):
+    old = make_table(2_000, 0)
+    # New rows bring values the cached distinct values don't have
+    new = make_table(500, 1)
+    new.loc[::7, "city"] = "Zurich"
+    new.loc[::5, "price"] = 99.9
+    new["category"] = pd.Categorical(np.where(np.arange(500) % 3, "a", "0"))
+    df = pd.concat([old, new], ignore_index=True)
+    df["category"] = df["category"].astype("category")
+    state = extend_sort(df, keys, sort_state(old, keys))
+    assert np.array_equal(state["permutation"], compute_permutation(df, keys))
+    # And again on top of the extended state
+    more = pd.concat([df, make_table(300, 2)], ignore_index=True)
+    more["category"] = more["category"].astype("category")
+    state = extend_sort(more, keys, state)
+    assert np.array_equal(state["permutation"], compute_permutation(more, keys))
+
+
+def test_mixed_types_fall_back_to_a_full_sort():
+    old = pd.DataFrame({"v": [3, 1, 2]})
+    df = pd.DataFrame({"v": pd.Series([3, 1, 2, "x", 0], dtype=object)})
+    state = extend_sort(df, [("v", True)], sort_state(old, [("v", True)]))
+    assert np.array_equal(state["permutation"], compute_permutation(df, [("v", True)]))
+
+
+def test_cache_extends_after_append():
+    cache = SortIndexCache()
+    df = make_table(1_000, 0)
+    keys = [("city", True), ("qty", False)]
+    cache.get("t", 0, df, keys)
+    grown = pd.concat([df, make_table(100, 3)], ignore_index=True)
+    assert np.array_equal(cache.get("t", 0, grown, keys), compute_permutation(grown, keys))
+
+
+def test_cache_extends_a_key_that_had_only_missing_values():
+    cache = SortIndexCache()
+    df = pd.DataFrame({"k": [np.nan, np.nan], "v": [1.0, np.nan]})
+    keys = [("k", True), ("v", False)]
+    cache.get("t", 0, df, keys)
+    delta = RowsAppended(pd.DataFrame({"k": [3.0], "v": [2.0]}))
+    df = delta.apply(df)
+    cache.on_change("t", 0, 1, delta)
+    assert np.array_equal(cache.get("t", 1, df, keys), compute_permutation(df, keys))
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.undo_manager import (CellChanges, ColumnReorder, ColumnsAdded, ColumnsDropped, CompositeDelta,
+                              RowPermutation, RowsAppended, RowsDeleted, Snapshot, UndoManager, diff_frames)
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # The app runs with copy-on-write enabled (see main.py)
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def make_table():
+    return pd.DataFrame({
+        "name": ["Jane", "Bob", "Alice", "Tom", "Sue"],
+        "age": np.array([30, 35, 28, 41, 52], dtype=np.int16),
+        "city": pd.Categorical(["Boston", "Chicago", "Boston", "Denver", "Chicago"]),
+        "score": [1.5, np.nan, 3.0, 4.25, 0.0],
+    })
+
+
+def assert_round_trip(delta, df):
+    """
+    apply -> revert -> apply gives the changed table, then the original, then
+    the changed table again, with the same dtypes each time
+    """
+    after = delta.apply(df.copy())
+    reverted = delta.revert(after.copy())
+    pd.testing.assert_frame_equal(reverted, df)
+    pd.testing.assert_frame_equal(delta.apply(reverted.copy()), after)
+    return after
+
+
+def test_cell_changes_round_trip():
+    df = make_table()
+    delta = CellChanges({
+        "name": ([0, 3], ["Jane", "Tom"], ["Janet", "Tim"]),
+        "age": ([1], [35], [36]),
+        "score": ([1, 2], [np.nan, 3.0], [2.0, np.nan]),
+    })
+    after = assert_round_trip(delta, df)
+    assert list(after["name"]) == ["Janet", "Bob", "Alice", "Tim", "Sue"]
+    assert after["age"].iloc[1] == 36
+
+
+def test_cell_changes_revert_removes_added_category():
+    df = make_table()
+    delta = CellChanges({"city": ([1, 4], ["Chicago", "Chicago"], ["Austin", "Boston"])})
+    after = assert_round_trip(delta, df)
+    assert "Austin" in after["city"].cat.categories
+    assert list(delta.revert(after)["city"].cat.categories) == ["Boston", "Chicago", "Denver"]
+
+
+def test_diff_frames_revert_removes_added_category():
+    df = make_table()
+    after = df.copy()
+    after["city"] = after["city"].cat.add_categories(["Austin"])
+    after.loc[0, "city"] = "Austin"
+    delta = diff_frames(df, after)
+    pd.testing.assert_frame_equal(delta.revert(after.copy()), df)
+
+
+def test_rows_appended_round_trip():
+    df = make_table()
+    rows = pd.DataFrame({"name": ["Ann"], "age": [60], "city": ["Boston"], "score": [9.0]})
+    after = assert_round_trip(RowsAppended(rows, df.dtypes), df)
+    assert len(after) == 6 and after["name"].iloc[-1] == "Ann"
+
+
+@pytest.mark.parametrize("reset_index", [False, True])
+def test_rows_deleted_round_trip(reset_index):
+    df = make_table()
+    df.index = pd.Index([10, 11, 12, 13, 14])
+    keep = np.array([True, False, True, False, True])
+    after = assert_round_trip(RowsDeleted.from_mask(df, keep, reset_index=reset_index), df)
+    assert list(after["name"]) == ["Jane", "Alice", "Sue"]
+    assert list(after.index) == ([0, 1, 2] if reset_index else [10, 12, 14])
+
+
+def test_row_permutation_round_trip():
+    df = make_table()
+    after = assert_round_trip(RowPermutation([4, 2, 0, 3, 1]), df)
+    assert list(after["name"]) == ["Sue", "Alice", "Jane", "Tom", "Bob"]
+
+
+def test_column_deltas_round_trip():
+    df = make_table()
+    assert list(assert_round_trip(ColumnsAdded(pd.DataFrame({"note": [""] * 5})), df).columns)[-1] == "note"
+    assert "age" not in assert_round_trip(ColumnsDropped(df, ["age", "city"]), df).columns
+    order = ["score", "name", "city", "age"]
+    assert list(assert_round_trip(ColumnReorder(df.columns, order), df).columns) == order
+
+
+def test_snapshot_round_trip():
+    df = make_table()
+    assert_round_trip(Snapshot(df, df.iloc[::-1].reset_index(drop=True)), df)
+
+
+def test_composite_delta_round_trip():
+    df = make_table()
+    delta = CompositeDelta([
+        RowPermutation([4, 3, 2, 1, 0]),
+        RowsDeleted.from_mask(df.take([4, 3, 2, 1, 0]), np.array([True, True, False, True, True])),
+        CellChanges({"city": ([0], ["Chicago"], ["Austin"]), "age": ([1], [41], [42])}),
+        ColumnsAdded(pd.DataFrame({"note": ["x"] * 4})),
+    ], "edit table")
+    after = assert_round_trip(delta, df)
+    assert list(after["name"]) == ["Sue", "Tom", "Bob", "Jane"]
+    assert after["city"].iloc[0] == "Austin"
+
+
+def test_undo_redo_and_new_change_clears_redo():
+    manager = UndoManager()
+    df = make_table()
+    delta = RowPermutation([1, 0, 2, 3, 4])
+    changed = delta.apply(df)
+    manager.record("t", delta)
+    pd.testing.assert_frame_equal(manager.undo("t", changed), df)
+    assert manager.can_redo("t")
+    pd.testing.assert_frame_equal(manager.redo("t", df), changed)
+    manager.undo("t", changed)
+    manager.record("t", RowPermutation([0, 1, 2, 4, 3]))
+    assert not manager.can_redo("t")
+
+
+def test_budget_evicts_oldest_entries_across_tables():
+    permutation = np.arange(1_000)
+    size = RowPermutation(permutation).nbytes
+    manager = UndoManager(max_bytes=3 * size)
+    for table_id in ["a", "b", "a", "b"]:
+        manager.record(table_id, RowPermutation(permutation))
+    # The oldest entry (the first one for "a") went first
+    assert manager.memory_usage() <= 3 * size
+    assert len(manager._undo["a"]) == 1 and len(manager._undo["b"]) == 2
+    manager.record("c", RowPermutation(np.arange(10_000)))
+    assert manager.memory_usage() <= 3 * size
+    assert not manager.can_undo("a") and not manager.can_undo("b")
+
+
+def test_max_entries_per_table():
+    manager = UndoManager(max_entries=2)
+    for _ in range(5):
+        manager.record("t", RowPermutation([0]))
+    assert len(manager._undo["t"]) == 2
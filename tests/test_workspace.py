@@ -0,0 +1,27 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.data_handler import DataHandler
+from src.workspace import Workspace
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    return Workspace(DataHandler(base_path=str(tmp_path / "data"), use_cache=False))
+
+
+def test_create_table_lists_it_and_refuses_duplicates(workspace):
+    assert workspace.create_table("orders") == "orders.csv"
+    assert workspace.create_table("orders") is None
+    assert workspace.create_table("joined.csv", data=pd.DataFrame({"a": [1]})) == "joined.csv"
+    assert [table["file"] for table in workspace.tables()] == ["joined.csv", "orders.csv"]
+
+
+@pytest.mark.parametrize("name", ["", "  ", "../outside", "..", "a/b", "a\\b", "sub/../../x", ".hidden"])
+def test_create_table_rejects_names_leaving_the_data_directory(workspace, tmp_path, name):
+    with pytest.raises(ValueError):
+        workspace.create_table(name)
+    assert sorted(os.listdir(tmp_path)) == ["data"]
+    assert os.listdir(tmp_path / "data") == []
@@ -0,0 +1,49 @@
+import threading
+
+import pandas as pd
+
+from src.write_behind import WriteBehindWriter
+
+
+def blocked_writer():
+    """
+    Writer whose first write waits for ``release``, so later submissions
+    stay queued; returns (writer, written, release)
+    """
+    written, release = [], threading.Event()
+
+    def write(df, filename, columns=None, progress=None, **options):
+        release.wait(5)
+        written.append((filename, df["v"].iloc[0], options))
+        return True
+
+    return WriteBehindWriter(write), written, release
+
+
+def table(value):
+    return pd.DataFrame({"v": [value]})
+
+
+def test_queued_writes_from_one_owner_are_coalesced():
+    writer, written, release = blocked_writer()
+    writer.submit(table(0), "other.csv", owner="a")
+    first = writer.submit(table(1), "t.csv", owner="a")
+    second = writer.submit(table(2), "t.csv", owner="a", log_token={"log": "x"})
+    release.set()
+    assert writer.flush(5)
+    assert writer.status(first)["state"] == "superseded"
+    assert writer.status(first)["superseded_by"] == second
+    assert writer.status(second)["state"] == "done"
+    assert written[1:] == [("t.csv", 2, {"log_token": {"log": "x"}})]
+
+
+def test_writes_from_different_owners_are_all_made_in_order():
+    writer, written, release = blocked_writer()
+    writer.submit(table(0), "other.csv", owner="a")
+    from_a = writer.submit(table(1), "t.csv", owner="a")
+    from_b = writer.submit(table(2), "t.csv", owner="b")
+    release.set()
+    assert writer.flush(5)
+    assert writer.status(from_a)["state"] == "done"
+    assert writer.status(from_b)["state"] == "done"
+    assert [value for filename, value, _ in written if filename == "t.csv"] == [1, 2]